@@ -23,6 +23,8 @@ __all__ = [
 
 import matplotlib.pyplot as plt
 import numpy as np
+
+from nenupytf.other import to_unix
  
 
 def plot(specdata, savefile=None, **kwargs):
@@ -36,7 +38,7 @@ def plot(specdata, savefile=None, **kwargs):
         kwargs['cmap'] = 'YlGnBu_r'
 
     pcm = plt.pcolormesh(
-        (specdata.time - specdata.time[0]).sec,
+        specdata.unix - specdata.taxis[0],
         specdata.freq,
         specdata.amp.T,
         **kwargs
@@ -46,7 +48,7 @@ def plot(specdata, savefile=None, **kwargs):
     
     cbar.set_label('Stokes {} (amp)'.format(specdata.meta['stokes']))
     plt.ylabel('Frequency (MHz)')
-    plt.xlabel('Time (sec since {})'.format(specdata.time[0].isot))
+    plt.xlabel('Time (sec since {})'.format(to_unix(specdata.taxis[0]).isot))
     
     if savefile is None:
         plt.show()
@@ -66,7 +68,7 @@ def plotdb(specdata, savefile=None, **kwargs):
         kwargs['cmap'] = 'YlGnBu_r'
 
     pcm = plt.pcolormesh(
-        (specdata.time - specdata.time[0]).sec,
+        specdata.unix - specdata.taxis[0],
         specdata.freq,
         specdata.db.T,
         **kwargs
@@ -76,7 +78,7 @@ def plotdb(specdata, savefile=None, **kwargs):
     
     cbar.set_label('Stokes {} (dB)'.format(specdata.meta['stokes']))
     plt.ylabel('Frequency (MHz)')
-    plt.xlabel('Time (sec since {})'.format(specdata.time[0].isot))
+    plt.xlabel('Time (sec since {})'.format(to_unix(specdata.taxis[0]).isot))
     
     if savefile is None:
         plt.show()
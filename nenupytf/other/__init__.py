@@ -2,4 +2,6 @@
 # -*- coding: utf-8 -*-
 
 from .const import *
-from .tools import *
\ No newline at end of file
+from .tools import *
+from .timeaxis import *
+from .memory import *
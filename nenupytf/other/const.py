@@ -19,7 +19,9 @@ __all__ = [
     'max_bsn',
     'allowed_stokes',
     'header_struct',
+    'block_struct',
     'bst_exts',
+    'chunk_bytes',
     'compute_bandpass'
     ]
 
@@ -58,6 +60,22 @@ header_struct = [
     ('nbchan', 'int32')
     ]
 
+# Structure of a time block for each lane file
+def block_struct(nffte, fftlen, nbchan):
+    """ Numpy structure of a time block (header followed by
+        `nbchan` beamlets) of a '*.spectra' file.
+    """
+    beamlet_struct = np.dtype(
+        [('lane', 'int32'),
+        ('beam', 'int32'),
+        ('channel', 'int32'),
+        ('fft0', 'float32', (nffte, fftlen, 2)),
+        ('fft1', 'float32', (nffte, fftlen, 2))]
+        )
+    return np.dtype(
+        header_struct + [('data', beamlet_struct, (nbchan))]
+        )
+
 # BST extensions, name and HDU index
 bst_exts = [
         ('intsr', 1),
@@ -68,6 +86,9 @@ bst_exts = [
         ('pointing_b', 6)
     ]
 
+# Size (in bytes) of raw data read at once by chunked engines
+chunk_bytes = 128 * 1024**2
+
 # Bandpass coefficients
 @lru_cache(maxsize=1) # keep the output in cache
 def compute_bandpass(fftlen):
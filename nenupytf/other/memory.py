@@ -0,0 +1,183 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ******
+    memory
+    ******
+
+    Memory planning of the selections. Rather than refusing a
+    selection whose estimated size exceeds the available memory,
+    the reading engines size their working set against a memory
+    budget:
+
+    * transient arrays (e.g. raw blocks read by a
+      :class:`.PreadBackend`, FFT buffers) are bounded by
+      processing the selection by chunks of time samples
+      (:func:`plan_chunks`),
+    * output arrays which do not fit in the budget are backed by
+      an anonymous temporary file (:func:`allocate`) and paged
+      in and out by the kernel.
+
+    The budget defaults to a fraction of the available memory,
+    it may be set with :func:`set_memory_budget`:
+
+    >>> from nenupytf.other import set_memory_budget
+    >>> set_memory_budget(nbytes=4 * 1024**3, directory='/scratch')
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'set_memory_budget',
+    'memory_budget',
+    'plan_chunks',
+    'allocate',
+    'reserved_bytes'
+    ]
+
+
+import tempfile
+import psutil
+import numpy as np
+
+
+# Memory budget configuration, see `set_memory_budget`
+_budget = {
+    'nbytes': None,
+    'fraction': 0.8,
+    'directory': None
+    }
+
+
+# ============================================================= #
+# --------------------- set_memory_budget --------------------- #
+# ============================================================= #
+def set_memory_budget(nbytes=None, fraction=0.8, directory=None):
+    """ Configure the memory budget of the selections.
+
+        Parameters
+        ----------
+        nbytes : int
+            Memory budget in bytes. Default: `None`, only bound
+            by `fraction` of the available memory.
+        fraction : float
+            Maximal fraction of the available memory used.
+            Default: `0.8`.
+        directory : str
+            Directory of the temporary files backing outputs
+            larger than the budget. Default: `None`, the system
+            temporary directory.
+    """
+    if not 0. < fraction <= 1.:
+        raise ValueError(
+            '`fraction` should be within ]0, 1].'
+            )
+    _budget['nbytes'] = nbytes
+    _budget['fraction'] = fraction
+    _budget['directory'] = directory
+    return
+
+
+def memory_budget():
+    """ Number of bytes a selection may use.
+    """
+    available = psutil.virtual_memory().available * _budget['fraction']
+    if _budget['nbytes'] is None:
+        return int(available)
+    return int(min(_budget['nbytes'], available))
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ plan_chunks ------------------------ #
+# ============================================================= #
+def plan_chunks(nsamples, sample_bytes, reserved=0, align=1):
+    """ Number of time samples to process at once so that their
+        transient working set fits in the memory budget.
+
+        Parameters
+        ----------
+        nsamples : int
+            Total number of time samples.
+        sample_bytes : float
+            Transient memory needed per time sample (bytes).
+        reserved : int
+            Memory already used by the outputs (bytes).
+        align : int
+            Chunks are a multiple of `align` samples (e.g. the
+            number of samples per time block).
+
+        Returns
+        -------
+        chunk : int
+            Number of samples per chunk, `nsamples` if the
+            whole selection fits at once.
+    """
+    if sample_bytes <= 0:
+        return nsamples
+    free = memory_budget() - reserved
+    chunk = int(free // sample_bytes) // align * align
+    return int(min(nsamples, max(align, chunk)))
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- allocate -------------------------- #
+# ============================================================= #
+def allocate(names, shape, dtype='float32', zeros=False, reserved=0):
+    """ Allocate one output array per name, in memory if they
+        fit together, along with the `reserved` bytes already
+        allocated, in the memory budget, otherwise backed by
+        anonymous temporary files.
+
+        Parameters
+        ----------
+        names : list
+            Keys of the arrays (e.g. Stokes parameters).
+        shape : tuple
+            Shape of each array.
+        dtype : str
+            Data type of the arrays.
+        zeros : bool
+            Initialize the arrays to zero (temporary files are
+            always zero-filled).
+        reserved : int
+            Bytes of the working set already allocated, e.g.
+            :func:`reserved_bytes` of previous outputs.
+            Default: `0`.
+
+        Returns
+        -------
+        arrays : dict
+            `np.ndarray` (or `np.memmap`) per name.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = len(names) * int(np.prod(shape)) * dtype.itemsize
+    if nbytes + reserved <= memory_budget():
+        init = np.zeros if zeros else np.empty
+        return {name: init(shape, dtype=dtype) for name in names}
+    arrays = {}
+    for name in names:
+        # The file is unlinked but stays mapped
+        with tempfile.TemporaryFile(dir=_budget['directory']) as tmp:
+            arrays[name] = np.memmap(tmp, dtype=dtype, mode='w+', shape=shape)
+    return arrays
+
+
+def reserved_bytes(arrays):
+    """ Memory used by in-memory arrays of a dictionary, arrays
+        backed by files are not counted.
+    """
+    return sum(
+        a.nbytes for a in arrays.values()
+        if not isinstance(a, np.memmap)
+        )
+# ============================================================= #
+
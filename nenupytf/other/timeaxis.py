@@ -0,0 +1,256 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ********
+    timeaxis
+    ********
+
+    Dynamic spectra may contain millions of time samples.
+    Rather than materializing an `astropy.time.Time` array,
+    :class:`TimeAxis` stores a regular time axis as a start
+    epoch, a step and a number of samples (float64 unix
+    seconds), with a fallback to an explicit array of unix
+    times for irregular axes. The conversion to
+    `astropy.time.Time` only happens when it is required.
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'TimeAxis'
+    ]
+
+
+import numpy as np
+from astropy.time import Time
+
+
+# Tolerance (in seconds) for a time axis to be considered regular
+regular_atol = 1e-6
+
+
+# ============================================================= #
+# ------------------------- TimeAxis -------------------------- #
+# ============================================================= #
+class TimeAxis(object):
+    """ Compact time axis.
+
+        Parameters
+        ----------
+        start : float
+            Unix time of the first sample (regular axis).
+        step : float
+            Time step in seconds (regular axis).
+        size : int
+            Number of samples (regular axis).
+        unix : np.ndarray
+            Unix times of an irregular axis, overrides the
+            other parameters.
+
+        Attributes
+        ----------
+        regular : bool
+            Whether the axis is stored as `(start, step, size)`.
+    """
+
+    def __init__(self, start=0., step=0., size=0, unix=None):
+        self._time = None
+        if unix is None:
+            self.regular = True
+            self.start = float(start)
+            self.step = float(step)
+            self.size = int(size)
+            self._unix = None
+        else:
+            unix = np.atleast_1d(np.asarray(unix, dtype='float64'))
+            self.regular = False
+            self.start = unix[0] if unix.size else 0.
+            self.step = 0.
+            self.size = unix.size
+            self._unix = unix
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __repr__(self):
+        if self.regular:
+            return 'TimeAxis(start={}, step={}, size={})'.format(
+                self.start,
+                self.step,
+                self.size
+                )
+        return 'TimeAxis(unix={})'.format(self._unix)
+
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if not -self.size <= key < self.size:
+                raise IndexError(
+                    'Time index out of range'
+                    )
+            key %= self.size
+            if self.regular:
+                return self.start + key * self.step
+            return self._unix[key]
+        elif isinstance(key, slice) and self.regular:
+            r = range(self.size)[key]
+            return TimeAxis(
+                start=self.start + r.start * self.step,
+                step=self.step * r.step,
+                size=len(r)
+                )
+        return TimeAxis.from_unix(self.unix[key])
+
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeAxis):
+            return NotImplemented
+        if self.size != other.size:
+            return False
+        if self.regular and other.regular:
+            return (abs(self.start - other.start) <= regular_atol) and\
+                (abs(self.step - other.step) * self.size <= regular_atol)
+        return np.allclose(self.unix, other.unix, rtol=0, atol=regular_atol)
+
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+
+    # --------------------------------------------------------- #
+    # --------------------- Getter/Setter --------------------- #
+    @property
+    def unix(self):
+        """ Unix times as a float64 array
+        """
+        if self.regular:
+            return self.start + np.arange(self.size) * self.step
+        return self._unix
+
+
+    @property
+    def time(self):
+        """ Time axis as a `astropy.time.Time` object,
+            computed on first access.
+        """
+        if self._time is None:
+            self._time = Time(self.unix, format='unix', precision=7)
+        return self._time
+
+
+    @property
+    def isot(self):
+        return self.time.isot
+
+
+    @property
+    def mjd(self):
+        """ MJD dates, computed without `astropy.time.Time`
+        """
+        return self.unix / 86400. + 40587.
+
+
+    @property
+    def jd(self):
+        """ JD dates, computed without `astropy.time.Time`
+        """
+        return self.mjd + 2400000.5
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    @classmethod
+    def from_unix(cls, unix):
+        """ Build a time axis from unix times, using the compact
+            representation if they are regularly sampled.
+
+            Parameters
+            ----------
+            unix : np.ndarray
+                Unix times in seconds.
+
+            Returns
+            -------
+            axis : `TimeAxis`
+        """
+        unix = np.atleast_1d(np.asarray(unix, dtype='float64'))
+        if unix.size == 0:
+            return cls(size=0)
+        if unix.size == 1:
+            return cls(start=unix[0], step=0., size=1)
+        step = (unix[-1] - unix[0]) / (unix.size - 1)
+        grid = unix[0] + np.arange(unix.size) * step
+        if (step > 0) and np.all(np.abs(unix - grid) <= regular_atol):
+            return cls(start=unix[0], step=step, size=unix.size)
+        return cls(unix=unix)
+
+
+    @classmethod
+    def from_any(cls, time):
+        """ Convert `time` to a :class:`TimeAxis`.
+
+            Parameters
+            ----------
+            time : `TimeAxis`, `astropy.time.Time` or np.ndarray
+                Time axis, `astropy.time.Time` object or array
+                of unix times.
+
+            Returns
+            -------
+            axis : `TimeAxis`
+        """
+        if isinstance(time, TimeAxis):
+            return time
+        elif isinstance(time, Time):
+            axis = cls.from_unix(time.unix)
+            if not time.isscalar:
+                axis._time = time
+            return axis
+        elif isinstance(time, (np.ndarray, list, float, int)):
+            return cls.from_unix(time)
+        raise TypeError(
+            'TimeAxis, Time object or unix times expected'
+            )
+
+
+    @classmethod
+    def concatenate(cls, axes):
+        """ Concatenate several time axes.
+        """
+        return cls.from_unix(
+            np.concatenate([a.unix for a in axes])
+            )
+
+
+    def copy(self):
+        if self.regular:
+            return TimeAxis(
+                start=self.start,
+                step=self.step,
+                size=self.size
+                )
+        return TimeAxis(unix=self._unix.copy())
+
+
+    def min(self):
+        if self.regular:
+            return min(self[0], self[-1])
+        return self._unix.min()
+
+
+    def max(self):
+        if self.regular:
+            return max(self[0], self[-1])
+        return self._unix.max()
+# ============================================================= #
+
@@ -17,8 +17,10 @@ __email__ = 'alan.loh@obspm.fr'
 __status__ = 'Production'
 __all__ = [
     'idx_of',
+    'AxisIndex',
     'to_unix',
     'rebin1d',
+    'bin_accumulate',
     'ProgressBar'
     ]
 
@@ -68,6 +70,90 @@ def idx_of(array, value, order='low'):
                 )[0, 0]
 
 
+class AxisIndex(object):
+    """ Index resolver for a sorted 1D axis (e.g. block time
+        stamps or channel frequencies). It provides the same
+        result as :func:`idx_of` in O(1) if the axis is
+        regularly sampled (closed-form expression) or in
+        O(log n) otherwise (`np.searchsorted`).
+
+        Parameters
+        ----------
+        array : np.ndarray
+            Sorted array upon which to search for indices.
+
+        Attributes
+        ----------
+        regular : bool
+            Whether the closed-form expression is used.
+        start : float
+            First value of the axis.
+        step : float
+            Step between consecutive values (regular axis).
+    """
+
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype='float64')
+        self.size = self.array.size
+        if self.size == 0:
+            raise ValueError(
+                'Empty axis.'
+                )
+        diff = np.diff(self.array)
+        if np.any(diff < 0):
+            raise ValueError(
+                'Axis values should be sorted.'
+                )
+        self.start = self.array[0]
+        self.step = 0. if self.size == 1 else\
+            (self.array[-1] - self.array[0]) / (self.size - 1)
+        grid = self.start + np.arange(self.size) * self.step
+        self.regular = (self.step > 0) and\
+            np.all(np.abs(self.array - grid) < 0.5 * self.step)
+
+
+    def __call__(self, value, order='low'):
+        """ Find the index of value in the axis.
+
+            Parameters
+            ----------
+            value : float or np.ndarray
+                Value(s) to find the index for.
+            order : str
+                Could be 'low' or 'high', see :func:`idx_of`.
+
+            Returns
+            -------
+            index : int or np.ndarray
+                Index (or array of indices if `value` is an
+                array).
+        """
+        if not order in ['low', 'high']:
+            raise ValueError(
+                '`order` should only be low or high.'
+                )
+        value = np.asarray(value, dtype='float64')
+        if self.regular:
+            # Closed-form guess, corrected by one step at most
+            # against the actual values to remain exact
+            x = (value - self.start) / self.step
+            idx = np.clip(np.round(x), 0, self.size - 1).astype(int)
+            if order == 'low':
+                idx -= (self.array[idx] > value) & (idx > 0)
+                nxt = np.minimum(idx + 1, self.size - 1)
+                idx += (self.array[nxt] <= value) & (nxt > idx)
+            else:
+                idx += (self.array[idx] < value) & (idx < self.size - 1)
+                prv = np.maximum(idx - 1, 0)
+                idx -= (self.array[prv] >= value) & (prv < idx)
+        elif order == 'low':
+            idx = np.searchsorted(self.array, value, side='right') - 1
+        else:
+            idx = np.searchsorted(self.array, value, side='left')
+        idx = np.clip(idx, 0, self.size - 1).astype(int)
+        return idx if idx.ndim else int(idx)
+
+
 def to_unix(time):
     """
     """
@@ -87,6 +173,55 @@ def rebin1d(array, shape):
     return np.squeeze(array)
 
 
+def bin_accumulate(sums, counts, data, tbins, fgroups, fbins):
+    """ Accumulate a 2D (time, frequency) array onto a coarser
+        grid in a vectorized way.
+
+        Parameters
+        ----------
+        sums : np.ndarray
+            (nt, nf) array of summed values, updated in place.
+        counts : np.ndarray
+            (nt, nf) array of summed sample counts, updated in
+            place. `None` if counts are already accumulated
+            (e.g. for another Stokes parameter of the same data).
+        data : np.ndarray
+            (n_times, n_freqs) array of data to reduce.
+        tbins : np.ndarray
+            Output time bin index of each row of `data`. It is
+            expected to be non-decreasing, rows whose index
+            lies outside `[0, nt)` are ignored.
+        fgroups : np.ndarray
+            Column indices of `data` starting each group of
+            contiguous frequencies falling in the same bin.
+        fbins : np.ndarray
+            Output frequency bin index of each group.
+    """
+    valid = np.flatnonzero(
+        (tbins >= 0) & (tbins < sums.shape[0])
+        )
+    if valid.size == 0:
+        return
+    t0, t1 = valid[0], valid[-1] + 1
+    tbins = tbins[t0:t1]
+    tstarts = np.flatnonzero(
+        np.r_[True, tbins[1:] != tbins[:-1]]
+        )
+    tsum = np.add.reduceat(
+        data[t0:t1],
+        tstarts,
+        axis=0,
+        dtype='float64'
+        )
+    tcnt = np.diff(np.r_[tstarts, tbins.size])
+    fsum = np.add.reduceat(tsum, fgroups, axis=1)
+    fcnt = np.diff(np.r_[fgroups, data.shape[1]])
+    cells = np.ix_(tbins[tstarts], fbins)
+    sums[cells] += fsum
+    if counts is not None:
+        counts[cells] += np.outer(tcnt, fcnt)
+    return
+
 
 class ProgressBar(object):
     """
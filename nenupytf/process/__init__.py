@@ -4,4 +4,7 @@
 
 from .fits_conversion import *
 from .analysis import *
-
+from .dedispersion import *
+from .dmsearch import *
+from .singlepulse import *
+from .rfi import *
@@ -0,0 +1,346 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ************
+    dedispersion
+    ************
+
+    Incoherent dedispersion of dynamic spectra. Each frequency
+    channel is delayed by an integer number of time samples
+    (:func:`dm_shifts`, computed with :func:`.dispersion_delay`)
+    so that a dispersed signal is aligned on the arrival time at
+    the highest frequency of the band.
+
+    The shifts are applied at once on every channel as a gather
+    of the data (:func:`dedisperse`). Observations larger than
+    the memory are dedispersed by chunks (:class:`Dedisperser`),
+    the last `max_shift` time samples of each chunk, needed by
+    the low frequency channels of the next output samples, being
+    carried over to the next chunk:
+
+    >>> from nenupytf.read import Spectrum
+    >>> from nenupytf.process import Dedisperser
+    >>> s = Spectrum('/path/to/observation/')
+    >>> chunks = s.iter_chunks(time_chunk=60., freq=[30, 60])
+    >>> dd = None
+    >>> for chunk in chunks:
+            if dd is None:
+                dd = Dedisperser(freq=chunk.freq, dm=12.4, dt=chunk.taxis.step)
+            res = dd.process(chunk)
+            if res is not None:
+                dynspec, timeseries = res
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'dm_shifts',
+    'shift_gather',
+    'dedisperse',
+    'Dedisperser'
+    ]
+
+
+import numpy as np
+import astropy.units as u
+
+from nenupytf.other import chunk_bytes
+from nenupytf.stokes import SpecData
+from nenupytf.process.astro import dispersion_delay
+
+
+# ============================================================= #
+# ------------------------- dm_shifts ------------------------- #
+# ============================================================= #
+def dm_shifts(freq, dm, dt):
+    """ Integer time shifts of the channels of a dispersed
+        signal, relative to the highest frequency.
+
+        Parameters
+        ----------
+        freq : np.ndarray
+            Channel frequencies in MHz
+        dm : float
+            Dispersion measure in pc/cm^3
+        dt : float
+            Time resolution in seconds
+
+        Returns
+        -------
+        shifts : np.ndarray
+            Delay of each channel in number of time samples
+            (`int64`, `0` at the highest frequency)
+    """
+    freq = np.asarray(freq, dtype='float64')
+    if dt <= 0:
+        raise ValueError(
+            '`dt` should be positive.'
+            )
+    delay = dispersion_delay(
+        f1=freq,
+        f2=freq.max(),
+        dm=float(dm)
+        )
+    return np.round(delay.to(u.s).value / dt).astype('int64')
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ shift_gather ----------------------- #
+# ============================================================= #
+def shift_gather(data, shifts, out):
+    """ Shift the columns of a 2D array in time at once,
+        ``out[t, c] = data[t + shifts[c], c]``.
+
+        The flat indices are built by batches of rows so that
+        they fit in `chunk_bytes`.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            `(nt, nc)` array, at least `out.shape[0] +
+            shifts.max()` rows long
+        shifts : np.ndarray
+            Non-negative shift of each column in samples
+        out : np.ndarray
+            `(nout, nc)` output array
+
+        Returns
+        -------
+        out : np.ndarray
+            Shifted data
+    """
+    nc = data.shape[1]
+    flat = np.ascontiguousarray(data).reshape(-1)
+    offsets = np.asarray(shifts) * nc + np.arange(nc)
+    step = max(1, chunk_bytes // (nc * 8))
+    for t0 in range(0, out.shape[0], step):
+        t1 = min(t0 + step, out.shape[0])
+        idx = np.add.outer(np.arange(t0, t1) * nc, offsets)
+        np.take(flat, idx, out=out[t0:t1])
+    return out
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- dedisperse ------------------------ #
+# ============================================================= #
+def dedisperse(spec, dm, dt=None):
+    """ Dedisperse a dynamic spectrum.
+
+        Parameters
+        ----------
+        spec : `SpecData`
+            Dynamic spectrum, regularly sampled in time
+        dm : float
+            Dispersion measure in pc/cm^3
+        dt : float
+            Time resolution in seconds. Default: `None`, the
+            time step of `spec`.
+
+        Returns
+        -------
+        dynspec : `SpecData`
+            Dedispersed dynamic spectrum, the last `max_shift`
+            time samples (whose low frequency counterparts are
+            not in `spec`) are dropped
+        timeseries : `SpecData`
+            Band-integrated (mean) time series
+    """
+    dd = Dedisperser(
+        freq=spec.freq,
+        dm=dm,
+        dt=_time_step(spec) if dt is None else dt
+        )
+    res = dd.process(spec)
+    if res is None:
+        raise ValueError(
+            'Time range shorter than the dispersion delay ({} samples).'.format(
+                dd.max_shift
+                )
+            )
+    return res
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ Dedisperser ------------------------ #
+# ============================================================= #
+class Dedisperser(object):
+    """ Streaming incoherent dedispersion.
+
+        Consecutive chunks of a dynamic spectrum (e.g. from
+        :func:`.Spectrum.iter_chunks`) are fed to
+        :meth:`process`, the last :attr:`max_shift` time samples
+        are kept between two calls so that the output is
+        continuous and identical to the dedispersion of the
+        whole observation.
+
+        Parameters
+        ----------
+        freq : np.ndarray
+            Channel frequencies in MHz
+        dm : float
+            Dispersion measure in pc/cm^3
+        dt : float
+            Time resolution in seconds
+
+        Attributes
+        ----------
+        shifts : np.ndarray
+            Delay of each channel in number of time samples
+        max_shift : int
+            Maximal delay in number of time samples
+    """
+
+    def __init__(self, freq, dm, dt):
+        self.freq = np.asarray(freq, dtype='float64')
+        self.dm = dm
+        self.dt = dt
+        self.shifts = dm_shifts(self.freq, dm, dt)
+        self.max_shift = int(self.shifts.max())
+        self.reset()
+
+
+    def __repr__(self):
+        return 'Dedisperser(dm={}, dt={}, max_shift={})'.format(
+            self.dm,
+            self.dt,
+            self.max_shift
+            )
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def reset(self):
+        """ Forget the samples carried over from the previous
+            chunk.
+        """
+        self._buffer = None
+        self._unix = None
+        self._filled = 0
+        self._stokes = None
+        return
+
+
+    def process(self, spec):
+        """ Dedisperse the next chunk.
+
+            Parameters
+            ----------
+            spec : `SpecData`
+                Next chunk of the dynamic spectrum, directly
+                following the previous one in time
+
+            Returns
+            -------
+            dynspec, timeseries : `SpecData`, `SpecData`
+                Dedispersed dynamic spectrum and band-integrated
+                time series of the samples completed by this
+                chunk, `None` if fewer than :attr:`max_shift`
+                samples have been fed so far
+        """
+        if spec.freq.size != self.freq.size:
+            raise ValueError(
+                'Frequency axis inconsistent with the Dedisperser.'
+                )
+        self._stokes = spec.meta.get('stokes', self._stokes)
+        n = spec.data.shape[0]
+        self._grow(n, spec.data.dtype)
+        ms = self._filled
+        self._buffer[ms:ms + n] = spec.data
+        self._unix[ms:ms + n] = spec.unix
+        self._filled += n
+
+        nout = self._filled - self.max_shift
+        if nout <= 0:
+            return None
+        data = np.empty((nout, self.freq.size), dtype=self._buffer.dtype)
+        shift_gather(self._buffer[:self._filled], self.shifts, data)
+        times = self._unix[:nout].copy()
+
+        # Carry the samples needed by the next output samples
+        self._buffer[:self.max_shift] = self._buffer[nout:self._filled]
+        self._unix[:self.max_shift] = self._unix[nout:self._filled]
+        self._filled = self.max_shift
+
+        dynspec = SpecData(
+            data=data,
+            time=times,
+            freq=self.freq,
+            stokes=self._stokes,
+            dm=self.dm
+            )
+        timeseries = SpecData(
+            data=data.mean(axis=1, dtype='float64')[:, np.newaxis],
+            time=dynspec.taxis,
+            freq=np.array([self.freq.mean()]),
+            stokes=self._stokes,
+            dm=self.dm
+            )
+        return dynspec, timeseries
+
+
+    def stream(self, chunks):
+        """ Dedisperse an iterable of consecutive chunks.
+
+            Parameters
+            ----------
+            chunks : iterable
+                `SpecData` chunks, e.g. :func:`.Spectrum.iter_chunks`
+
+            Yields
+            ------
+            dynspec, timeseries : `SpecData`, `SpecData`
+                See :meth:`process`
+        """
+        for chunk in chunks:
+            res = self.process(chunk)
+            if res is not None:
+                yield res
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _grow(self, n, dtype):
+        """ Make room for `n` new samples after the carried ones.
+        """
+        size = self._filled + n
+        if (self._buffer is not None) and (self._buffer.shape[0] >= size):
+            return
+        buffer = np.empty((size, self.freq.size), dtype=dtype)
+        unix = np.empty(size, dtype='float64')
+        if self._buffer is not None:
+            buffer[:self._filled] = self._buffer[:self._filled]
+            unix[:self._filled] = self._unix[:self._filled]
+        self._buffer = buffer
+        self._unix = unix
+        return
+
+
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ _time_step ------------------------- #
+# ============================================================= #
+def _time_step(spec):
+    """ Time step of a `SpecData` in seconds.
+    """
+    taxis = spec.taxis
+    if taxis.size < 2:
+        raise ValueError(
+            'At least two time samples are required.'
+            )
+    if taxis.regular:
+        return taxis.step
+    return float(np.median(np.diff(taxis.unix)))
+# ============================================================= #
+
@@ -0,0 +1,404 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ********
+    dmsearch
+    ********
+
+    Search over many dispersion measures (DM). Dedispersing the
+    whole band for each DM trial costs `N_DM x N_chan x N_t`
+    operations, which is prohibitive at NenuFAR frequencies
+    where the delays span many samples and thousands of trials
+    are required. :class:`DMSearch` relies on the subband
+    dedispersion algorithm instead:
+
+    * the channels are grouped in `nsub` subbands and, for a few
+      nominal DMs, each subband is dedispersed and summed,
+    * each DM trial then only shifts and sums the `nsub` subband
+      time series of the closest nominal DM.
+
+    The nominal DMs are spaced so that the error on the delays
+    within a subband stays below `tolerance` samples, the cost
+    drops to about `N_nominal x N_chan x N_t + N_DM x N_sub x N_t`.
+
+    The observation is streamed by chunks (e.g. from
+    :func:`.Spectrum.iter_chunks`), the samples needed by the
+    largest delay being carried over from one chunk to the next:
+
+    >>> from nenupytf.read import Spectrum
+    >>> from nenupytf.process import DMSearch, dm_trials
+    >>> s = Spectrum('/path/to/observation/')
+    >>> chunks = s.iter_chunks(time_chunk=60., freq=[30, 60])
+    >>> first = next(chunks)
+    >>> dms = dm_trials(0, 50, first.freq, first.taxis.step)
+    >>> search = DMSearch(first.freq, dms, first.taxis.step)
+    >>> times, plane = search.run([first], chunks)
+    >>> search.stats['snr']
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'dm_trials',
+    'DMSearch'
+    ]
+
+
+from itertools import chain
+import numpy as np
+import astropy.units as u
+
+from nenupytf.other import TimeAxis
+from nenupytf.process.astro import dispersion_delay
+from nenupytf.process.dedispersion import dm_shifts, shift_gather
+
+
+# ============================================================= #
+# ------------------------- dm_trials ------------------------- #
+# ============================================================= #
+def dm_trials(dm_min, dm_max, freq, dt, tolerance=1.):
+    """ Grid of DM trials such that the dispersion delays across
+        the band of two consecutive trials differ by at most
+        `tolerance` time samples.
+
+        Parameters
+        ----------
+        dm_min : float
+            Minimal DM in pc/cm^3
+        dm_max : float
+            Maximal DM in pc/cm^3
+        freq : np.ndarray
+            Channel frequencies in MHz
+        dt : float
+            Time resolution in seconds
+        tolerance : float
+            Maximal delay difference in samples. Default: `1.`
+
+        Returns
+        -------
+        dms : np.ndarray
+            DM trials in pc/cm^3
+    """
+    if dm_max < dm_min:
+        raise ValueError(
+            '`dm_max` should be greater than `dm_min`.'
+            )
+    # Delay across the band per unit DM, in samples
+    span = _unit_delay(freq, dt).max()
+    step = tolerance / span
+    n = int(np.ceil((dm_max - dm_min) / step)) + 1
+    return np.linspace(dm_min, dm_min + (n - 1) * step, n)
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- DMSearch -------------------------- #
+# ============================================================= #
+class DMSearch(object):
+    """ Streaming subband dedispersion over a grid of DM trials.
+
+        Parameters
+        ----------
+        freq : np.ndarray
+            Channel frequencies in MHz
+        dms : np.ndarray
+            DM trials in pc/cm^3 (see :func:`dm_trials`)
+        dt : float
+            Time resolution in seconds
+        nsub : int
+            Number of subbands. Default: `None`, about the square
+            root of the number of channels.
+        tolerance : float
+            Maximal delay error within a subband, in samples.
+            Default: `1.`
+
+        Attributes
+        ----------
+        nominal : np.ndarray
+            Nominal DMs of the subband dedispersion
+        groups : np.ndarray
+            Index of the nominal DM used by each trial
+        max_shift : int
+            Number of samples carried over between two chunks
+        stats : dict
+            Per-trial statistics of the time series processed so
+            far (see :meth:`process`)
+    """
+
+    def __init__(self, freq, dms, dt, nsub=None, tolerance=1.):
+        self.freq = np.asarray(freq, dtype='float64')
+        self.dms = np.atleast_1d(np.asarray(dms, dtype='float64'))
+        self.dt = dt
+        nf = self.freq.size
+        if nsub is None:
+            nsub = int(np.sqrt(nf))
+        self.nsub = int(min(max(nsub, 1), nf))
+        self.tolerance = tolerance
+        self._plan()
+        self.reset()
+
+
+    def __repr__(self):
+        return 'DMSearch(ndm={}, nsub={}, nominal={}, max_shift={})'.format(
+            self.dms.size,
+            self.nsub,
+            self.nominal.size,
+            self.max_shift
+            )
+
+
+    # --------------------------------------------------------- #
+    # --------------------- Getter/Setter --------------------- #
+    @property
+    def stats(self):
+        """ Per-trial statistics of the time series processed
+            so far.
+
+            Returns
+            -------
+            stats : dict
+                `'dm'`, `'mean'`, `'std'`, `'max'`, `'tmax'`
+                (unix time of the maximum) and `'snr'`
+                (`(max - mean) / std`) arrays, one value per
+                DM trial
+        """
+        n = max(self._count, 1)
+        mean = self._sum / n
+        std = np.sqrt(np.maximum(self._sumsq / n - mean**2, 0.))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            snr = (self._max - mean) / std
+        return {
+            'dm': self.dms,
+            'mean': mean,
+            'std': std,
+            'max': self._max,
+            'tmax': self._tmax,
+            'snr': snr
+        }
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def reset(self):
+        """ Forget the carried samples and the statistics.
+        """
+        self._buffer = None
+        self._unix = None
+        self._filled = 0
+        ndm = self.dms.size
+        self._count = 0
+        self._sum = np.zeros(ndm)
+        self._sumsq = np.zeros(ndm)
+        self._max = np.full(ndm, -np.inf)
+        self._tmax = np.full(ndm, np.nan)
+        return
+
+
+    def process(self, spec):
+        """ Search the next chunk.
+
+            Parameters
+            ----------
+            spec : `SpecData`
+                Next chunk of the dynamic spectrum, directly
+                following the previous one in time
+
+            Returns
+            -------
+            times : `TimeAxis`
+                Times of the samples completed by this chunk
+                (arrival time at the highest frequency)
+            plane : np.ndarray
+                `(nt, ndm)` band-averaged time series of each DM
+                trial (`float32`). Both are `None` if fewer than
+                :attr:`max_shift` samples have been fed so far
+        """
+        if spec.freq.size != self.freq.size:
+            raise ValueError(
+                'Frequency axis inconsistent with the DMSearch.'
+                )
+        n = spec.data.shape[0]
+        self._grow(n)
+        ms = self._filled
+        self._buffer[ms:ms + n] = spec.data
+        self._unix[ms:ms + n] = spec.unix
+        self._filled += n
+
+        nout = self._filled - self.max_shift
+        if nout <= 0:
+            return None, None
+        data = self._buffer[:self._filled]
+        plane = np.empty((nout, self.dms.size), dtype='float32')
+        for g in range(self.nominal.size):
+            trials = np.flatnonzero(self.groups == g)
+            # Stage 1: dedisperse each subband at the nominal DM
+            nsub_t = nout + self._sub_shifts[trials].max()
+            shifted = shift_gather(
+                data,
+                self._chan_shifts[g],
+                np.empty((nsub_t, self.freq.size), dtype='float32')
+            )
+            subbands = np.add.reduceat(shifted, self._edges[:-1], axis=1)
+            # Stage 2: shift and sum the subbands per DM trial
+            tmp = np.empty((nout, self.nsub), dtype='float32')
+            for i in trials:
+                shift_gather(subbands, self._sub_shifts[i], tmp)
+                np.sum(tmp, axis=1, out=plane[:, i])
+        plane /= self.freq.size
+        times = self._unix[:nout].copy()
+
+        # Carry the samples needed by the next output samples
+        self._buffer[:self.max_shift] = self._buffer[nout:self._filled]
+        self._unix[:self.max_shift] = self._unix[nout:self._filled]
+        self._filled = self.max_shift
+
+        self._update(times, plane)
+        return TimeAxis.from_unix(times), plane
+
+
+    def stream(self, *chunks):
+        """ Search iterables of consecutive chunks.
+
+            Parameters
+            ----------
+            *chunks : iterable
+                `SpecData` chunks, e.g. :func:`.Spectrum.iter_chunks`
+
+            Yields
+            ------
+            times, plane : `TimeAxis`, np.ndarray
+                See :meth:`process`
+        """
+        for chunk in chain(*chunks):
+            times, plane = self.process(chunk)
+            if plane is not None:
+                yield times, plane
+
+
+    def run(self, *chunks):
+        """ Search iterables of consecutive chunks and gather
+            the whole DM-time plane.
+
+            Parameters
+            ----------
+            *chunks : iterable
+                `SpecData` chunks, e.g. :func:`.Spectrum.iter_chunks`
+
+            Returns
+            -------
+            times : `TimeAxis`
+                Time axis
+            plane : np.ndarray
+                `(nt, ndm)` DM-time plane (`float32`)
+        """
+        res = list(self.stream(*chunks))
+        if len(res) == 0:
+            raise ValueError(
+                'Time range shorter than the dispersion delay ({} samples).'.format(
+                    self.max_shift
+                    )
+                )
+        return (
+            TimeAxis.concatenate([t for t, _ in res]),
+            np.concatenate([p for _, p in res])
+            )
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _plan(self):
+        """ Subbands, nominal DMs and shifts of both stages.
+        """
+        nf = self.freq.size
+        if np.any(np.diff(self.freq) <= 0):
+            raise ValueError(
+                'Frequencies should be sorted in increasing order.'
+                )
+        self._edges = np.linspace(0, nf, self.nsub + 1).astype(int)
+        top = self.freq[self._edges[1:] - 1]
+
+        # Intra-subband delay span per unit DM (samples)
+        unit = _unit_delay(self.freq, self.dt) -\
+            np.repeat(_unit_delay(top, self.dt), np.diff(self._edges))
+        width = self.tolerance / max(unit.max(), 1e-12)
+
+        # Group the trials within +/- width of a nominal DM
+        dms = np.sort(self.dms)
+        nominal = []
+        i = 0
+        while i < dms.size:
+            j = np.searchsorted(dms, dms[i] + 2 * width, side='right')
+            nominal.append((dms[i] + dms[j - 1]) / 2.)
+            i = j
+        self.nominal = np.array(nominal)
+        self.groups = np.abs(
+            self.dms[:, np.newaxis] - self.nominal[np.newaxis, :]
+            ).argmin(axis=1)
+
+        self._chan_shifts = np.round(
+            self.nominal[:, np.newaxis] * unit[np.newaxis, :]
+            ).astype('int64')
+        self._sub_shifts = np.stack(
+            [dm_shifts(top, dm, self.dt) for dm in self.dms]
+            )
+        self.max_shift = int(max(
+            self._chan_shifts[g].max() + self._sub_shifts[self.groups == g].max()
+            for g in np.unique(self.groups)
+            ))
+        return
+
+
+    def _grow(self, n):
+        """ Make room for `n` new samples after the carried ones.
+        """
+        size = self._filled + n
+        if (self._buffer is not None) and (self._buffer.shape[0] >= size):
+            return
+        buffer = np.empty((size, self.freq.size), dtype='float32')
+        unix = np.empty(size, dtype='float64')
+        if self._buffer is not None:
+            buffer[:self._filled] = self._buffer[:self._filled]
+            unix[:self._filled] = self._unix[:self._filled]
+        self._buffer = buffer
+        self._unix = unix
+        return
+
+
+    def _update(self, times, plane):
+        """ Update the running per-trial statistics.
+        """
+        self._count += plane.shape[0]
+        self._sum += plane.sum(axis=0, dtype='float64')
+        self._sumsq += np.einsum('ij,ij->j', plane, plane, dtype='float64')
+        imax = plane.argmax(axis=0)
+        vmax = plane[imax, np.arange(plane.shape[1])]
+        better = vmax > self._max
+        self._max[better] = vmax[better]
+        self._tmax[better] = times[imax[better]]
+        return
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ _unit_delay ------------------------ #
+# ============================================================= #
+def _unit_delay(freq, dt):
+    """ Delay of each frequency relative to the highest one
+        for a unit DM, in (fractional) samples.
+    """
+    freq = np.asarray(freq, dtype='float64')
+    delay = dispersion_delay(
+        f1=freq,
+        f2=freq.max(),
+        dm=1.
+        )
+    return delay.to(u.s).value / dt
+# ============================================================= #
+
@@ -0,0 +1,391 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ***
+    rfi
+    ***
+
+    Radio frequency interference (RFI) flagging. Two estimators
+    are combined into a boolean mask (`True` where flagged):
+
+    * :func:`sumthreshold` (Offringa et al. 2010) flags the
+      sequences of samples, along time and frequency, whose sum
+      exceeds a threshold decreasing with their length. Each
+      window length is a single vectorized pass over the data
+      (cumulative sums), the lengths being processed in turn as
+      each one takes the flags of the previous ones into
+      account.
+    * the spectral kurtosis (:func:`.spectral_kurtosis`) of
+      the `nffte` raw spectra of each time block, computed while
+      reading the blocks (``iter_chunks(sk=True)``), flags non
+      Gaussian signals regardless of their power
+      (:func:`sk_flags`, each polarization against the bounds
+      of the skewed estimator distribution).
+
+    Both work on whole dynamic spectra (:func:`flag`) or on
+    chunk iterators (:func:`iter_flags`):
+
+    >>> from nenupytf.read import Spectrum
+    >>> from nenupytf.process import iter_flags
+    >>> s = Spectrum('/path/to/observation/')
+    >>> chunks = s.iter_chunks(time_chunk=60., sk=True)
+    >>> for chunk, mask in iter_flags(chunks):
+            print(chunk.time[0], mask.mean())
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'sumthreshold',
+    'sk_bounds',
+    'sk_flags',
+    'flag',
+    'iter_flags'
+    ]
+
+
+import math
+import numpy as np
+from functools import lru_cache
+
+from nenupytf.stokes import SpecData
+
+
+# ============================================================= #
+# ------------------------ sumthreshold ----------------------- #
+# ============================================================= #
+def sumthreshold(data, threshold=6., windows=(1, 2, 4, 8, 16, 32, 64),
+        rho=1.5, axes=(1, 0), mask=None):
+    """ SumThreshold flagging of normalized residuals.
+
+        A window of `M` samples is flagged if the sum of its
+        values exceeds `M * threshold / rho**log2(M)` (RFI being
+        additive, only positive excursions are flagged and the
+        negative ones are clipped at `-threshold`). Already
+        flagged samples count as the current threshold.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            `(time, frequency)` residuals, normalized to a unit
+            standard deviation
+        threshold : float
+            Threshold of single samples. Default: `6.`
+        windows : tuple
+            Window lengths, in increasing order.
+            Default: `(1, 2, 4, 8, 16, 32, 64)`.
+        rho : float
+            Threshold decrease per doubling of the window.
+            Default: `1.5`.
+        axes : tuple
+            Axes along which the windows are slid (`0` time,
+            `1` frequency). Default: `(1, 0)`.
+        mask : np.ndarray
+            Initial flags. Default: `None`.
+
+        Returns
+        -------
+        mask : np.ndarray
+            Boolean mask, `True` for flagged samples
+    """
+    mask = np.zeros(data.shape, dtype=bool) if mask is None else mask.copy()
+    work = np.empty(data.shape, dtype='float32')
+    np.clip(data, -threshold, None, out=work, casting='unsafe')
+    for m in windows:
+        thr = threshold / rho**np.log2(m)
+        if m == 1:
+            mask |= work > thr
+            continue
+        np.copyto(work, thr, where=mask)
+        for axis in axes:
+            if work.shape[axis] >= m:
+                mask |= _window_flags(work, m, m * thr, axis)
+    return mask
+
+
+def _window_flags(work, m, limit, axis):
+    """ Samples covered by a window of `m` samples along `axis`
+        whose sum exceeds `limit`.
+    """
+    w = np.moveaxis(work, axis, 0)
+    n = w.shape[0]
+    csum = np.zeros((n + 1,) + w.shape[1:], dtype='float32')
+    if w.flags.c_contiguous and (w[0].size >= 256):
+        # Accumulating contiguous rows is much faster than
+        # np.cumsum along the slowest axis
+        for i in range(n):
+            np.add(csum[i], w[i], out=csum[i + 1])
+    else:
+        np.cumsum(w, axis=0, out=csum[1:])
+    covered = np.zeros(w.shape, dtype=bool)
+    np.greater(csum[m:] - csum[:-m], limit, out=covered[:n - m + 1])
+    # Dilate the window starts over the m samples of the windows,
+    # doubling the covered length at each step
+    k = 1
+    while k < m:
+        step = min(k, m - k)
+        covered[step:] |= covered[:-step]
+        k += step
+    return np.moveaxis(covered, 0, axis)
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- sk_bounds ------------------------- #
+# ============================================================= #
+@lru_cache(maxsize=32)
+def sk_bounds(m, n=1, sigma=3.):
+    """ Acceptance interval of the spectral kurtosis estimator
+        of `m` spectra integrating `n` FFTs each.
+
+        The distribution of the estimator is skewed for the
+        small `m` of NenuFAR blocks, it is approximated by the
+        Pearson distribution of the same first four moments
+        (Nita & Gary 2010), whose quantiles are integrated
+        numerically. Each bound has the false alarm probability
+        of a Gaussian `sigma` deviation.
+
+        Parameters
+        ----------
+        m : int
+            Number of spectra per estimate (`nffte`)
+        n : int
+            Number of FFTs per spectrum (`nfft2int`).
+            Default: `1`.
+        sigma : float
+            Width of the interval, in equivalent Gaussian
+            standard deviations. Default: `3.`
+
+        Returns
+        -------
+        lower, upper : float
+            Bounds of the interval
+    """
+    if m < 2:
+        raise ValueError(
+            'At least two spectra per estimate expected.'
+            )
+    pfa = 0.5 * math.erfc(sigma / math.sqrt(2.))
+    lower, upper = _pearson_quantiles(
+        *_sk_moments(m, n),
+        support=(-1., float(m) * n),
+        p=(pfa, 1. - pfa)
+        )
+    return 1. + lower, 1. + upper
+
+
+def sk_flags(sk, m, n=1, sigma=3., axis=-1):
+    """ Flag the spectral kurtosis estimates outside of
+        :func:`sk_bounds`.
+
+        Parameters
+        ----------
+        sk : np.ndarray
+            Spectral kurtosis estimates, e.g. of both
+            polarizations (:func:`.spectral_kurtosis`)
+        m, n, sigma : int, int, float
+            See :func:`sk_bounds`
+        axis : int
+            Polarization axis of `sk`, a sample is flagged if
+            any of its polarizations is (the false alarm rate
+            therefore adds up). Default: `-1`. `None` if `sk`
+            has no polarization axis.
+
+        Returns
+        -------
+        mask : np.ndarray
+            Boolean mask, `True` for flagged samples
+    """
+    lower, upper = sk_bounds(m, n, sigma)
+    mask = ~((sk >= lower) & (sk <= upper))
+    if axis is not None:
+        mask = mask.any(axis=axis)
+    return mask
+
+
+def _sk_moments(m, n):
+    """ Second to fourth central moments of the spectral
+        kurtosis estimator (Nita & Gary 2010).
+    """
+    m = float(m)
+    mn = m * n
+    d = (mn + 2.) * (mn + 3.)
+    mu2 = 2. * m**2 * n * (n + 1.) / ((m - 1.) * d)
+    d *= (mn + 4.) * (mn + 5.)
+    mu3 = 8. * m**3 * n * (n + 1.) * (-2. + n * (-5. + m * (4. + n))) /\
+        ((m - 1.)**2 * d)
+    d *= (mn + 6.) * (mn + 7.)
+    mu4 = 12. * m**4 * n * (n + 1.) * (24. + n * (48. + 84. * n + m * (-32. +
+        n * (-245. - 93. * n + m * (125. + n * (68. + m + (3. + m) * n)))))) /\
+        ((m - 1.)**3 * d)
+    return mu2, mu3, mu4
+
+
+def _pearson_quantiles(mu2, mu3, mu4, support, p, npoints=200001):
+    """ Quantiles `p` of the zero mean Pearson distribution of
+        central moments `mu2`, `mu3` and `mu4`, restricted to
+        `support`. Its density solves
+        ``d log f / dx = -(c1 + x) / (c0 + c1 x + c2 x^2)``,
+        integrated on a grid of `npoints`.
+    """
+    beta1 = mu3**2 / mu2**3
+    beta2 = mu4 / mu2**2
+    denom = 10. * beta2 - 12. * beta1 - 18.
+    if denom <= 0:
+        # Outside of the Pearson system, Gaussian approximation
+        z = np.sqrt(2.) * np.array([_erfinv(2. * q - 1.) for q in p])
+        return tuple(z * np.sqrt(mu2))
+    c0 = (4. * beta2 - 3. * beta1) * mu2 / denom
+    c1 = np.sign(mu3) * np.sqrt(mu2 * beta1) * (beta2 + 3.) / denom
+    c2 = (2. * beta2 - 3. * beta1 - 6.) / denom
+
+    # Interval around the mean where the density is defined
+    lo, hi = support
+    hi = min(hi, 60. * np.sqrt(mu2))
+    lo = max(lo, -60. * np.sqrt(mu2))
+    roots = np.roots([c2, c1, c0]) if c2 != 0 else np.array([-c0 / c1])
+    for r in np.real(roots[np.isreal(roots)]):
+        if r < 0:
+            lo = max(lo, r)
+        else:
+            hi = min(hi, r)
+    x = np.linspace(lo, hi, npoints)[1:-1]
+    dlogf = -(c1 + x) / (c0 + c1 * x + c2 * x**2)
+    logf = np.zeros(x.size)
+    np.cumsum(0.5 * (dlogf[1:] + dlogf[:-1]) * np.diff(x), out=logf[1:])
+    f = np.exp(logf - logf.max())
+    cdf = np.zeros(x.size)
+    np.cumsum(0.5 * (f[1:] + f[:-1]) * np.diff(x), out=cdf[1:])
+    cdf /= cdf[-1]
+    return tuple(np.interp(p, cdf, x))
+
+
+def _erfinv(y):
+    """ Inverse error function, by bisection.
+    """
+    lo, hi = -6., 6.
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        if math.erf(mid) < y:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5 * (lo + hi)
+# ============================================================= #
+
+
+# ============================================================= #
+# --------------------------- flag ---------------------------- #
+# ============================================================= #
+def flag(spec, threshold=6., sigma=3., mask=None, nstat=256, **kwargs):
+    """ Flag a dynamic spectrum.
+
+        The data are normalized per channel (median and median
+        absolute deviation over time, estimated on at most
+        `nstat` evenly spread time samples) before
+        :func:`sumthreshold`.
+        If the `SpecData` carries spectral kurtosis estimates
+        (``iter_chunks(sk=True)``), they are flagged with
+        :func:`sk_flags` as well.
+
+        Parameters
+        ----------
+        spec : `SpecData`
+            Dynamic spectrum
+        threshold : float
+            SumThreshold single sample threshold, in standard
+            deviations. Default: `6.`
+        sigma : float
+            Spectral kurtosis interval, in standard deviations.
+            Default: `3.`
+        mask : np.ndarray
+            Initial flags. Default: `None`.
+        nstat : int
+            Number of time samples of the normalization
+            statistics. Default: `256`.
+        **kwargs
+            Other :func:`sumthreshold` parameters.
+
+        Returns
+        -------
+        mask : np.ndarray
+            Boolean mask, `True` for flagged samples
+    """
+    data = spec.data
+    rows = data[::max(1, data.shape[0] // nstat)]
+    med = np.median(rows, axis=0)
+    mad = np.median(np.abs(rows - med), axis=0) * 1.4826
+    mad[mad == 0] = np.inf
+    residuals = np.subtract(data, med, dtype='float32')
+    residuals /= mad
+    if 'sk' in spec.meta:
+        skmask = sk_flags(spec.meta['sk'], *spec.meta['sk_mn'], sigma=sigma)
+        mask = skmask if mask is None else mask | skmask
+    return sumthreshold(
+        residuals,
+        threshold=threshold,
+        mask=mask,
+        **kwargs
+        )
+
+
+def iter_flags(chunks, **kwargs):
+    """ Flag an iterable of chunks, e.g.
+        :func:`.Spectrum.iter_chunks`. With an `overlap`, the
+        samples repeated from the previous chunk extend the
+        windows along time at the start of each chunk, they
+        are then trimmed: the yielded chunks and masks follow
+        each other without repeating any sample.
+
+        Parameters
+        ----------
+        chunks : iterable
+            `SpecData` chunks
+        **kwargs
+            :func:`flag` parameters
+
+        Yields
+        ------
+        chunk, mask : `SpecData`, np.ndarray
+            Chunk and its boolean mask
+    """
+    last = None
+    for chunk in chunks:
+        mask = flag(chunk, **kwargs)
+        if last is not None:
+            # Half a sample of tolerance on the repeated times
+            unix = chunk.unix
+            step = np.median(np.diff(unix)) if unix.size > 1 else 0.
+            n = int(np.searchsorted(unix, last + 0.5 * step, side='right'))
+            if n == chunk.taxis.size:
+                continue
+            if n > 0:
+                chunk = _skip(chunk, n)
+                mask = mask[n:]
+        last = chunk.unix[-1]
+        yield chunk, mask
+
+
+def _skip(spec, n):
+    """ `SpecData` without its first `n` time samples.
+    """
+    meta = dict(spec.meta)
+    if 'sk' in meta:
+        meta['sk'] = meta['sk'][n:]
+    return SpecData(
+        data=spec.data[n:],
+        time=spec.taxis[n:],
+        freq=spec.freq,
+        mask=None if spec.mask is None else spec.mask[n:],
+        weights=None if spec.weights is None else spec._weights_or_ones()[n:],
+        **meta
+        )
+# ============================================================= #
+
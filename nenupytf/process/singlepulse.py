@@ -0,0 +1,400 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ***********
+    singlepulse
+    ***********
+
+    Single pulse search over dedispersed time series, either
+    the band-integrated series of a :class:`.Dedisperser` or
+    the DM-time planes of a :class:`.DMSearch`.
+
+    The series are normalized by running robust statistics
+    (median and median absolute deviation over consecutive
+    windows of `window` samples, counted from the start of the
+    stream), then convolved with boxcars of a ladder of
+    widths. Every width is computed from a single cumulative sum,
+    as the difference of two of its shifted views. The events
+    above `threshold` are clustered: overlapping boxcars, at any
+    DM, are a single candidate (the one of highest S/N).
+
+    The search streams over chunks. Samples are only searched
+    once their normalization window is complete, so that the
+    candidates do not depend on how the stream is cut. The last
+    `max(widths) - 1` searched samples are carried over to the
+    next window (and searched with the boxcars that fit in them
+    at the end of the stream):
+
+    >>> from nenupytf.read import Spectrum
+    >>> from nenupytf.process import DMSearch, SinglePulseSearch, dm_trials
+    >>> s = Spectrum('/path/to/observation/')
+    >>> chunks = s.iter_chunks(time_chunk=60., freq=[30, 60])
+    >>> first = next(chunks)
+    >>> dms = dm_trials(0, 50, first.freq, first.taxis.step)
+    >>> search = DMSearch(first.freq, dms, first.taxis.step)
+    >>> sp = SinglePulseSearch(dms=dms, threshold=7.)
+    >>> cands = sp.run(search.stream([first], chunks))
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'candidate_struct',
+    'SinglePulseSearch'
+    ]
+
+
+import numpy as np
+
+from nenupytf.stokes import SpecData
+
+
+# Candidate table, see `SinglePulseSearch`: unix time of the
+# start of the boxcar, DM, width in samples, S/N and number of
+# merged detections
+candidate_struct = np.dtype([
+    ('time', 'float64'),
+    ('dm', 'float64'),
+    ('width', 'int32'),
+    ('snr', 'float32'),
+    ('members', 'int32')
+    ])
+
+
+# ============================================================= #
+# --------------------- SinglePulseSearch --------------------- #
+# ============================================================= #
+class SinglePulseSearch(object):
+    """ Streaming boxcar matched-filter search.
+
+        Parameters
+        ----------
+        dms : np.ndarray
+            DM of each column of the searched series (pc/cm^3).
+            Default: `None`, read from the `'dm'` metadata of the
+            `SpecData` chunks (or `0`).
+        widths : list
+            Boxcar widths in samples. Default: `None`, powers of
+            two up to `256`.
+        threshold : float
+            Detection threshold in S/N. Default: `6.`
+        window : int
+            Number of samples of the running normalization
+            windows. The last, incomplete, window of the stream
+            is normalized with the statistics of the last
+            `window` samples. Default: `4096`.
+
+        Attributes
+        ----------
+        max_width : int
+            Largest boxcar width
+    """
+
+    def __init__(self, dms=None, widths=None, threshold=6., window=4096):
+        self.dms = None if dms is None else np.atleast_1d(
+            np.asarray(dms, dtype='float64')
+            )
+        if widths is None:
+            widths = 2**np.arange(9)
+        self.widths = np.unique(np.asarray(widths, dtype='int64'))
+        if self.widths[0] < 1:
+            raise ValueError(
+                'Boxcar widths should be positive.'
+                )
+        self.max_width = int(self.widths[-1])
+        self.threshold = threshold
+        self.window = int(window)
+        self.reset()
+
+
+    def __repr__(self):
+        return 'SinglePulseSearch(widths={}, threshold={})'.format(
+            self.widths.tolist(),
+            self.threshold
+            )
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def reset(self):
+        """ Forget the carried samples and pending candidates.
+        """
+        self._carry = None
+        self._unix = np.zeros(0)
+        self._raw = None
+        self._raw_unix = np.zeros(0)
+        self._prev = None
+        self._dms = None
+        self._offset = 0
+        self._pending = np.zeros(0, dtype=candidate_struct)
+        self._pending_idx = np.zeros((0, 2), dtype='int64')
+        return
+
+
+    def process(self, data, times=None):
+        """ Search the next chunk.
+
+            Parameters
+            ----------
+            data : `SpecData` or np.ndarray
+                Time series, `(nt, ndm)` (e.g. the band-averaged
+                series of :func:`.dedisperse` or the plane of
+                :meth:`.DMSearch.process`)
+            times : `TimeAxis` or np.ndarray
+                Times of the samples if `data` is an array.
+
+            Returns
+            -------
+            candidates : np.ndarray
+                Candidates completed so far (see
+                `candidate_struct`), sorted by time
+        """
+        series, unix, self._dms = self._parse(data, times)
+        if self._raw is not None:
+            series = np.concatenate((self._raw, series))
+            unix = np.concatenate((self._raw_unix, unix))
+
+        # Only the complete normalization windows are searched
+        n = series.shape[0] // self.window * self.window
+        self._raw = series[n:].copy()
+        self._raw_unix = unix[n:].copy()
+        if n == 0:
+            return np.zeros(0, dtype=candidate_struct)
+        self._prev = series[n - self.window:n].copy()
+        return self._search(self._normalize(series[:n]), unix[:n])
+
+
+    def flush(self):
+        """ End of the stream: search the samples of the last
+            incomplete window, then the carried samples with the
+            boxcars that still fit in them, and return the
+            candidates still pending.
+        """
+        done = []
+        if (self._raw is not None) and (self._raw.shape[0] > 0):
+            ref = self._raw
+            if self._prev is not None:
+                ref = np.concatenate((self._prev, ref))[-self.window:]
+            done.append(
+                self._search(self._normalize(self._raw, ref), self._raw_unix)
+                )
+        self._raw = None
+        self._raw_unix = np.zeros(0)
+        self._prev = None
+
+        cands, idx = self._pending, self._pending_idx
+        if self._carry is not None:
+            tail, tail_idx = self._detect(self._carry, self._unix, self._carry.shape[0])
+            cands = np.concatenate((cands, tail))
+            idx = np.concatenate((idx, tail_idx))
+            self._offset += self._carry.shape[0]
+            self._carry = None
+            self._unix = np.zeros(0)
+        done.append(self._cluster(cands, idx, final=True))
+        self._pending = done[-1][:0]
+        self._pending_idx = self._pending_idx[:0]
+        return np.concatenate(done)
+
+
+    def stream(self, chunks):
+        """ Search an iterable of consecutive chunks.
+
+            Parameters
+            ----------
+            chunks : iterable
+                `SpecData` chunks or `(times, plane)` tuples
+                (e.g. :meth:`.DMSearch.stream`)
+
+            Yields
+            ------
+            candidates : np.ndarray
+                Candidates completed by each chunk
+        """
+        for chunk in chunks:
+            if isinstance(chunk, tuple):
+                times, chunk = chunk
+            else:
+                times = None
+            cands = self.process(chunk, times)
+            if cands.size:
+                yield cands
+        cands = self.flush()
+        if cands.size:
+            yield cands
+
+
+    def run(self, chunks):
+        """ Search an iterable of consecutive chunks, see
+            :meth:`stream`.
+
+            Returns
+            -------
+            candidates : np.ndarray
+                Candidate table (see `candidate_struct`)
+        """
+        res = list(self.stream(chunks))
+        if len(res) == 0:
+            return np.zeros(0, dtype=candidate_struct)
+        return np.concatenate(res)
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _parse(self, data, times):
+        """ Time series, unix times and DMs of a chunk.
+        """
+        if isinstance(data, SpecData):
+            unix = data.unix
+            series = data.data
+            dms = data.meta.get('dm', 0.)
+        else:
+            if times is None:
+                raise ValueError(
+                    '`times` is required with an array.'
+                    )
+            unix = times.unix if hasattr(times, 'unix') else np.asarray(times)
+            series = np.asarray(data)
+            dms = 0.
+        if series.ndim == 1:
+            series = series[:, np.newaxis]
+        if self.dms is not None:
+            dms = self.dms
+        dms = np.broadcast_to(np.asarray(dms, dtype='float64'), series.shape[1:])
+        return series, unix, dms
+
+
+    def _normalize(self, series, ref=None):
+        """ Subtract the running median and divide by the running
+            standard deviation (estimated from the median absolute
+            deviation), per window of `window` samples. If `ref`
+            is given, `series` is normalized as a whole with the
+            statistics of `ref` instead.
+        """
+        if ref is None:
+            nwin = series.shape[0] // self.window
+            x = series.reshape((nwin, self.window) + series.shape[1:])
+        else:
+            nwin = 1
+            x = ref[np.newaxis]
+        med = np.median(x, axis=1)
+        mad = np.median(np.abs(x - med[:, np.newaxis]), axis=1) * 1.4826
+        mad[mad == 0] = np.inf
+        size = series.shape[0] // nwin
+        norm = np.empty(series.shape, dtype='float32')
+        for k in range(nwin):
+            sl = slice(k * size, (k + 1) * size)
+            np.subtract(series[sl], med[k], out=norm[sl], casting='unsafe')
+            norm[sl] /= mad[k]
+        return norm
+
+
+    def _search(self, norm, unix):
+        """ Search normalized samples following the carried
+            ones.
+        """
+        if self._carry is not None:
+            norm = np.concatenate((self._carry, norm))
+            unix = np.concatenate((self._unix, unix))
+        # Boxcars starting in the carried samples need the next
+        # chunk, except the narrowest ones at the end of the stream
+        cands, idx = self._detect(norm, unix, norm.shape[0] - self.max_width + 1)
+
+        # Carry the samples needed by the widest boxcars
+        keep = min(self.max_width - 1, norm.shape[0])
+        self._carry = norm[norm.shape[0] - keep:].copy()
+        self._unix = unix[unix.size - keep:].copy()
+        self._offset += norm.shape[0] - keep
+
+        return self._cluster(
+            np.concatenate((self._pending, cands)),
+            np.concatenate((self._pending_idx, idx)),
+            final=False
+            )
+
+
+    def _detect(self, norm, unix, nvalid):
+        """ Candidates of the boxcars starting on the first
+            `nvalid` samples of normalized series, with their
+            `(start, width)` sample indices.
+        """
+        if nvalid <= 0:
+            return (
+                np.zeros(0, dtype=candidate_struct),
+                np.zeros((0, 2), dtype='int64')
+                )
+        snr, width = self._boxcars(norm, nvalid)
+        it, idm = np.nonzero(snr >= self.threshold)
+        cands = np.zeros(it.size, dtype=candidate_struct)
+        cands['time'] = unix[it]
+        cands['dm'] = self._dms[idm]
+        cands['width'] = width[it, idm]
+        cands['snr'] = snr[it, idm]
+        cands['members'] = 1
+        idx = np.stack((it + self._offset, cands['width']), axis=1)
+        return cands, idx
+
+
+    def _boxcars(self, norm, nvalid):
+        """ Best boxcar S/N and width of the first `nvalid`
+            samples, from a single cumulative sum. Boxcars
+            running past the end of `norm` are skipped.
+        """
+        csum = np.zeros((norm.shape[0] + 1,) + norm.shape[1:], dtype='float64')
+        np.cumsum(norm, axis=0, out=csum[1:])
+        snr = np.full((nvalid,) + norm.shape[1:], -np.inf, dtype='float32')
+        width = np.zeros(snr.shape, dtype='int32')
+        tmp = np.empty(snr.shape, dtype='float32')
+        better = np.empty(snr.shape, dtype=bool)
+        for w in self.widths:
+            n = min(nvalid, norm.shape[0] - w + 1)
+            if n <= 0:
+                break
+            np.subtract(csum[w:w + n], csum[:n], out=tmp[:n], casting='unsafe')
+            tmp[:n] /= np.sqrt(w)
+            np.greater(tmp[:n], snr[:n], out=better[:n])
+            np.copyto(width[:n], w, where=better[:n], casting='unsafe')
+            np.maximum(snr[:n], tmp[:n], out=snr[:n])
+        return snr, width
+
+
+    def _cluster(self, cands, idx, final):
+        """ Merge the candidates whose boxcars overlap, keeping
+            the one of highest S/N. Clusters which may still grow
+            with the next chunk are kept pending unless `final`.
+        """
+        if cands.size == 0:
+            self._pending = cands
+            self._pending_idx = idx
+            return cands
+        order = np.argsort(idx[:, 0], kind='stable')
+        cands = cands[order]
+        idx = idx[order]
+        start = idx[:, 0]
+        end = np.maximum.accumulate(start + idx[:, 1])
+        new = np.ones(cands.size, dtype=bool)
+        new[1:] = start[1:] >= end[:-1]
+        label = np.cumsum(new) - 1
+        first = np.flatnonzero(new)
+
+        # Highest S/N per cluster
+        best = np.lexsort((cands['snr'], label))
+        last = np.append(first[1:], cands.size) - 1
+        out = cands[best[last]]
+        out['members'] = np.add.reduceat(cands['members'], first)
+
+        done = np.ones(first.size, dtype=bool)
+        if not final:
+            # The last cluster may continue in the next chunk
+            done[-1] = end[-1] <= self._offset
+        self._pending = cands[label == first.size - 1] if not done[-1] else cands[:0]
+        self._pending_idx = idx[label == first.size - 1] if not done[-1] else idx[:0]
+        return out[done]
+# ============================================================= #
+
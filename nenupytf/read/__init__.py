@@ -2,7 +2,13 @@
 # -*- coding: utf-8 -*-
 
 
+from .backend import *
 from .lane import *
+from .lanepool import *
+from .obsindex import *
+from .tilestore import *
+from .pyramid import *
 from .obsrepo import *
+from .parallel import *
 from .spectrum import *
 
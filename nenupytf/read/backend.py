@@ -0,0 +1,355 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    *******
+    backend
+    *******
+
+    The time blocks of a '*.spectra' file are read through an
+    I/O backend. The default :class:`MemmapBackend` relies on the
+    memory map of the file, i.e. on page faults, which is fine on
+    local disks but results in many small reads on network file
+    systems. :class:`PreadBackend` reads each chunk of blocks with
+    a few large page-aligned ``pread`` calls instead.
+
+    Both backends may prefetch: while a chunk is converted, the
+    next one is read by a background thread (:class:`PreadBackend`,
+    double buffering) or announced to the kernel with an
+    ``madvise`` hint (:class:`MemmapBackend`).
+
+    >>> from nenupytf.read import Spectrum, PreadBackend
+    >>> s = Spectrum('/nfs/path/to/observation/', backend=PreadBackend())
+    >>> spec = s.average(dt=1., df=0.2)
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'IOBackend',
+    'MemmapBackend',
+    'PreadBackend',
+    'get_backend'
+    ]
+
+
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
+import threading
+import numpy as np
+
+
+# ============================================================= #
+# ------------------------- IOBackend ------------------------- #
+# ============================================================= #
+class IOBackend(object):
+    """ Base class of the I/O backends.
+
+        A backend is shared by the lanes of a :class:`.LanePool`
+        and only keeps per-file state (e.g. file descriptors)
+        which is dropped when pickled, so that it may be sent to
+        worker processes.
+
+        Parameters
+        ----------
+        prefetch : bool
+            Read the next chunk in advance when iterating over
+            several chunks (see :meth:`iter_read`).
+
+        Attributes
+        ----------
+        in_memory : bool
+            Whether the blocks read are copied in memory (and
+            therefore count in the working set of a selection).
+    """
+
+    name = None
+    in_memory = True
+
+    def __init__(self, prefetch=True):
+        self.prefetch = prefetch
+
+
+    def __repr__(self):
+        return '{}(prefetch={})'.format(
+            self.__class__.__name__,
+            self.prefetch
+            )
+
+
+    def __getstate__(self):
+        return {'prefetch': self.prefetch}
+
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def open(self, lane):
+        """ Called once the lane file is mapped.
+        """
+        return
+
+
+    def close(self, lane):
+        """ Release the resources associated to a lane file.
+        """
+        return
+
+
+    def read(self, lane, k0, k1, out=None):
+        """ Read the time blocks `k0` to `k1` (excluded).
+
+            Parameters
+            ----------
+            lane : `Lane`
+                Lane object
+            k0, k1 : int
+                Time block range
+            out : np.ndarray
+                Byte buffer that may be used to store the
+                blocks. Default: `None`.
+
+            Returns
+            -------
+            blocks : np.ndarray
+                Structured array of `k1 - k0` blocks (see
+                :func:`.block_struct`)
+        """
+        raise NotImplementedError
+
+
+    def iter_read(self, lane, ranges):
+        """ Read several block ranges in a row.
+
+            Parameters
+            ----------
+            lane : `Lane`
+                Lane object
+            ranges : list
+                `(k0, k1)` block ranges
+
+            Yields
+            ------
+            k0, k1, blocks : int, int, np.ndarray
+                Block range and blocks (see :meth:`read`), only
+                valid until the next iteration.
+        """
+        for k0, k1 in ranges:
+            yield k0, k1, self.read(lane, k0, k1)
+# ============================================================= #
+
+
+# ============================================================= #
+# ----------------------- MemmapBackend ----------------------- #
+# ============================================================= #
+class MemmapBackend(IOBackend):
+    """ Blocks are views of the memory map of the file.
+
+        Parameters
+        ----------
+        prefetch : bool
+            Ask the kernel to read the next chunk ahead
+            (``MADV_WILLNEED``) while iterating.
+        sequential : bool
+            Advise the kernel that the file is read sequentially
+            (``MADV_SEQUENTIAL``, more aggressive read-ahead).
+    """
+
+    name = 'memmap'
+    in_memory = False
+
+    def __init__(self, prefetch=True, sequential=False):
+        super().__init__(prefetch=prefetch)
+        self.sequential = sequential
+
+
+    def __getstate__(self):
+        return {'prefetch': self.prefetch, 'sequential': self.sequential}
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def open(self, lane):
+        if self.sequential:
+            self._advise(lane, 0, lane._timestamps.size, 'MADV_SEQUENTIAL')
+        return
+
+
+    def read(self, lane, k0, k1, out=None):
+        return lane.memdata[k0:k1]
+
+
+    def iter_read(self, lane, ranges):
+        for i, (k0, k1) in enumerate(ranges):
+            if self.prefetch and (i + 1 < len(ranges)):
+                self._advise(lane, *ranges[i + 1], 'MADV_WILLNEED')
+            yield k0, k1, self.read(lane, k0, k1)
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _advise(self, lane, k0, k1, advice):
+        """ `madvise` hint over the blocks `k0` to `k1`, ignored
+            where not supported.
+        """
+        mm = getattr(lane.memdata, '_mmap', None)
+        if (mm is None) or not hasattr(mm, 'madvise') or\
+            not hasattr(mmap, advice):
+            return
+        itemsize = lane._dtype.itemsize
+        start = k0 * itemsize // mmap.PAGESIZE * mmap.PAGESIZE
+        length = min(k1 * itemsize, len(mm)) - start
+        if length > 0:
+            mm.madvise(getattr(mmap, advice), start, length)
+        return
+# ============================================================= #
+
+
+# ============================================================= #
+# ----------------------- PreadBackend ------------------------ #
+# ============================================================= #
+class PreadBackend(IOBackend):
+    """ Blocks are read with large ``pread`` calls, starting on
+        `align` byte boundaries, in buffers reused from one
+        chunk to the next.
+
+        Parameters
+        ----------
+        prefetch : bool
+            Read the next chunk in a background thread while the
+            current one is processed (double buffering).
+        align : int
+            Alignment of the reads in bytes.
+            Default: `mmap.PAGESIZE`.
+    """
+
+    name = 'pread'
+
+    def __init__(self, prefetch=True, align=None):
+        super().__init__(prefetch=prefetch)
+        self.align = mmap.PAGESIZE if align is None else align
+        self._fds = {}
+        self._lock = threading.Lock()
+
+
+    def __getstate__(self):
+        return {'prefetch': self.prefetch, 'align': self.align}
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def close(self, lane):
+        with self._lock:
+            fd = self._fds.pop(lane.sfile, None)
+        if fd is not None:
+            os.close(fd)
+        return
+
+
+    def read(self, lane, k0, k1, out=None):
+        first, start, stop = self._span(lane, k0, k1)
+        nbytes = stop - first
+        if (out is None) or (out.size < nbytes):
+            out = np.empty(nbytes, dtype='uint8')
+        buf = memoryview(out)[:nbytes]
+        fd = self._fd(lane)
+        done = 0
+        while done < nbytes:
+            # os.preadv would avoid the copy but requires Python 3.7
+            chunk = os.pread(fd, nbytes - done, first + done)
+            if len(chunk) == 0:
+                raise EOFError(
+                    'Unexpected end of file {}'.format(lane.sfile)
+                    )
+            buf[done:done + len(chunk)] = chunk
+            done += len(chunk)
+        return out[start - first:nbytes].view(lane._dtype)
+
+
+    def iter_read(self, lane, ranges):
+        if not self.prefetch:
+            yield from super().iter_read(lane, ranges)
+            return
+        if len(ranges) == 0:
+            return
+        buffers = [None, None]
+
+        def fill(i):
+            k0, k1 = ranges[i]
+            first, _, stop = self._span(lane, k0, k1)
+            if (buffers[i % 2] is None) or (buffers[i % 2].size < stop - first):
+                buffers[i % 2] = np.empty(stop - first, dtype='uint8')
+            return self.read(lane, k0, k1, out=buffers[i % 2])
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(fill, 0)
+            for i, (k0, k1) in enumerate(ranges):
+                blocks = future.result()
+                if i + 1 < len(ranges):
+                    # The other buffer is free, the previous
+                    # chunk has been processed
+                    future = pool.submit(fill, i + 1)
+                yield k0, k1, blocks
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _span(self, lane, k0, k1):
+        """ Aligned first byte, first and last bytes of the
+            blocks `k0` to `k1`.
+        """
+        itemsize = lane._dtype.itemsize
+        start = k0 * itemsize
+        first = start // self.align * self.align
+        return first, start, k1 * itemsize
+
+
+    def _fd(self, lane):
+        """ File descriptor of a lane file, opened once.
+        """
+        with self._lock:
+            if lane.sfile not in self._fds:
+                self._fds[lane.sfile] = os.open(lane.sfile, os.O_RDONLY)
+            return self._fds[lane.sfile]
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ get_backend ------------------------ #
+# ============================================================= #
+def get_backend(backend=None):
+    """ Resolve an I/O backend.
+
+        Parameters
+        ----------
+        backend : str or `IOBackend`
+            `'memmap'`, `'pread'` or a backend instance.
+            Default: `None`, `'memmap'`.
+
+        Returns
+        -------
+        backend : `IOBackend`
+            Backend instance
+    """
+    if backend is None:
+        backend = 'memmap'
+    if isinstance(backend, IOBackend):
+        return backend
+    for cls in (MemmapBackend, PreadBackend):
+        if backend == cls.name:
+            return cls()
+    raise ValueError(
+        'Unknown I/O backend {}'.format(backend)
+        )
+# ============================================================= #
+
@@ -25,13 +25,15 @@ __all__ = [
 from astropy.time import Time
 import os.path as path
 from os import getpid
-import psutil
+from time import sleep, monotonic
 import numpy as np
 import warnings
 
-from nenupytf.other import header_struct, max_bsn
+from nenupytf.other import header_struct, block_struct, max_bsn, chunk_bytes
 from nenupytf.stokes import NenuStokes, SpecData
-from nenupytf.other import idx_of, to_unix, rebin1d, ProgressBar
+from nenupytf.read import get_backend
+from nenupytf.other import AxisIndex, TimeAxis, to_unix, rebin1d, bin_accumulate, ProgressBar
+from nenupytf.other import allocate, reserved_bytes, plan_chunks, memory_budget
 
 
 # ============================================================= #
@@ -45,6 +47,9 @@ class Lane(object):
         ----------
         spectrum : str
             Complete path towards a '*.spectra' file
+        backend : str or `IOBackend`
+            I/O backend reading the time blocks (see
+            :func:`.get_backend`). Default: `None`, memory map.
 
         Attributes
         ----------
@@ -64,6 +69,10 @@ class Lane(object):
             Minimal observed time
         time_max : `astropy.time.Time`
             maximal observed time
+        segments : `numpy.ndarray`
+            Runs of contiguous time blocks (`block`: first block
+            index, `nblocks`: number of blocks, `tmin` and `tmax`:
+            unix time range)
 
         fftlen : int
             Number of frequencies within each channel
@@ -75,8 +84,10 @@ class Lane(object):
             Number of frequency channels
     """
 
-    def __init__(self, spectrum):
+    def __init__(self, spectrum, backend=None):
         self._dtype = None
+        self._bandpasses = {}
+        self.backend = get_backend(backend)
         self.memdata = None
         self.lane = None
         self.sfile = spectrum
@@ -126,6 +137,7 @@ class Lane(object):
 
         self._load()
         self._parse_tf()
+        self.backend.open(self)
         return
 
 
@@ -264,8 +276,7 @@ class Lane(object):
         """ Array of frequencies in MHz corresponding
             to the selected beam.
         """
-        channels = self._channels[self._beams == self.beam]
-        return channels * max_bsn * 1e-6
+        return self._findex(self.beam).array
 
 
     @property
@@ -283,6 +294,24 @@ class Lane(object):
         return np.max(self.frequencies) + df
 
 
+    @property
+    def bandpass_file(self):
+        """ File in which the median bandpasses computed by
+            :meth:`bandpass` are cached, next to the '*.spectra'
+            file.
+        """
+        return self.sfile.replace('.spectra', '.bandpass.npz')
+
+
+    @property
+    def nbytes(self):
+        """ Number of bytes mapped from the '*.spectra' file
+        """
+        if self.memdata is None:
+            return 0
+        return self.memdata.nbytes
+
+
     @property
     def time_min(self):
         """ Minimal observed time.
@@ -296,20 +325,27 @@ class Lane(object):
         """ Maximal observed time.
             `astropy.Time` object
         """
-        times_per_block = self.nffte * self.fftlen * self.nfft2int
-        sec_dt_block = 5.12e-6 * times_per_block
-        return to_unix(self._timestamps[-1] + sec_dt_block)
+        return to_unix(self._timestamps[-1] + self.block_dt)
 
 
     # --------------------------------------------------------- #
     # ------------------------ Methods ------------------------ #
-    def select(self, stokes='I', time=None, freq=None, beam=None, bp_corr=True):
+    def close(self):
+        """ Release the memory map of the '*.spectra' file.
+            The mapping is effectively removed as soon as no
+            other object refers to it.
+        """
+        self.backend.close(self)
+        self.memdata = None
+        return
+
+
+    def select(self, stokes='I', time=None, freq=None, beam=None, bp_corr=True, dtype=None):
         """ Select data within a lane file.
             If the selection appears to be too big regarding
-            available memory, an error should be raised.
-            However as rough estimate, try to avoid time range
-            of more than 15 min and/or frequency range of more
-            than 10 MHz...
+            the memory budget (see :func:`.set_memory_budget`),
+            it is read by chunks and/or returned in arrays
+            backed by temporary files (`np.memmap`).
 
             Parameters
             ----------
@@ -318,8 +354,10 @@ class Lane(object):
                 e.g.:
                 `time=['2019-03-20T11:59:00.0', '2019-03-20T12:20:00.0']`
                 Default: `None` whole time range selection.
-            stokes : str
-                Stokes parameter required (I, Q, U, V, fracV)
+            stokes : str or list
+                Stokes parameter required (I, Q, U, V, fracV),
+                or list of Stokes parameters, all computed from
+                a single read of the data.
                 Default: `'I'`
             freq : list
                 Length-2 list of frequency range (in MHz)
@@ -334,85 +372,73 @@ class Lane(object):
                 Compute the bandpass correction.
                 `False`: do not compute any correction
                 `True``: compute the correction with Kaiser coefficients
-                `'median'`: compute a medianed correction
+                `'median'`: apply the median bandpass of the
+                observation (see :meth:`bandpass`)
                 `'fft'`: correct the bandpass using FFT
+            dtype : str, optional, default: `None`
+                Data type of the selected data (`'float32'` or
+                `'float64'`). `None` selects `'float64'` for the
+                `'fft'` bandpass correction, `'float32'` otherwise.
 
             Returns
             -------
-            spec : `SpecData`
-                SpecData object containing the time, the frequency and the data
+            spec : `SpecData` or dict
+                SpecData object containing the time, the frequency and the data,
+                or dictionary of SpecData objects if `stokes` is a list
 
         """
-        self.beam = beam
-        self.time = time
-        self.freq = freq
-
-        if self.time[1] - self.time[0] < self.dt:
-            raise ValueError(
-                'Time interval selected < {} sec'.format(self.dt)
+        plan = self._plan(
+            time=time,
+            freq=freq,
+            beam=beam
             )
-        if self.freq[1] - self.freq[0] < self.df:
-            raise ValueError(
-                'Frequency interval selected < {} MHz'.format(self.df)
+        b0, b1 = plan['blocks']
+        t0, t1 = plan['samples']
+
+        # Outputs larger than the memory budget are backed by
+        # temporary files, the selection is read by chunks if
+        # its working set does not fit either.
+        names = [stokes] if isinstance(stokes, str) else list(stokes)
+        if dtype is None:
+            dtype = 'float64' if bp_corr == 'fft' else 'float32'
+        data = allocate(
+            names=names,
+            shape=(t1 - t0, plan['freqs'].size),
+            dtype=dtype
             )
-        
-        tmin_idx = self._t2bidx(
-            time=self.time[0],
-            order='low'
-            )
-        tmax_idx = self._t2bidx(
-            time=self.time[1],
-            order='high'
-            )
-        fmin_idx = self._f2bidx(
-            frequency=self.freq[0],
-            order='low'
-            )
-        fmax_idx = self._f2bidx(
-            frequency=self.freq[1],
-            order='high'
-            )
-
-        self._check_memory(
-            nt=tmax_idx + 1 - tmin_idx,
-            nf=fmax_idx + 1 - fmin_idx
-            )
-
-        times = self._get_time(
-            id_min=tmin_idx,
-            id_max=tmax_idx + 1
-            )
-        t_mask = (times >= to_unix(self.time[0])) &\
-            (times < to_unix(self.time[1]))
-        
-        freqs = self._get_freq(
-            id_min=fmin_idx,
-            id_max=fmax_idx + 1
-            )
-        f_mask = (freqs >= self.freq[0]) &\
-            (freqs < self.freq[1])
-        
-        spectrum = NenuStokes(
-            data=self.memdata['data'],
-            stokes=stokes,
-            nffte=self.nffte,
-            fftlen=self.fftlen,
-            bp_corr=bp_corr
-            )[
-            tmin_idx:tmax_idx + 1,
-            fmin_idx:fmax_idx + 1,
-            ]
-
-        return SpecData(
-            data=spectrum[t_mask, :][:, f_mask],
-            time=times[t_mask],
-            freq=freqs[f_mask],
-            stokes=stokes
+        self._read_chunked(
+            plan=plan,
+            stokes=names,
+            bp_corr=bp_corr,
+            out=data,
+            reserved=reserved_bytes(data)
             )
+        times = self._get_time(id_min=b0, id_max=b1)[t0:t1]
+        if isinstance(stokes, str):
+            return SpecData(
+                data=data[stokes],
+                time=times,
+                freq=plan['freqs'],
+                stokes=stokes
+                )
+        return {
+            st: SpecData(
+                data=data[st],
+                time=times,
+                freq=plan['freqs'],
+                stokes=st
+                )
+            for st in stokes
+            }
 
 
-    def average(self, stokes='I', time=None, freq=None, beam=None, dt=None, df=None):
-        """ Average a dynamic spectrum in time and frequency
+    def average(self, stokes='I', time=None, freq=None, beam=None, dt=None, df=None, bp_corr=True):
+        """ Average a dynamic spectrum in time and frequency.
+            The file is read by chunks of time blocks (see
+            `chunk_bytes`), each chunk being converted and reduced
+            onto the output grid at once, so that the memory
+            footprint is bounded by the chunk size rather than
+            by the selection.
 
             Parameters
             ----------
@@ -421,8 +447,10 @@ class Lane(object):
                 e.g.:
                 `time=['2019-03-20T11:59:00.0', '2019-03-20T12:20:00.0']`
                 Default: `None` whole time range selection.
-            stokes : str
-                Stokes parameter required (I, Q, U, V, fracV)
+            stokes : str or list
+                Stokes parameter required (I, Q, U, V, fracV),
+                or list of Stokes parameters, all computed from
+                a single read of the data.
                 Default: `'I'`
             freq : list
                 Length-2 list of frequency range (in MHz)
@@ -437,15 +465,22 @@ class Lane(object):
                 Time steps in seconds
             df : float
                 Frequency steps in MHz
+            bp_corr : bool or str, optional, default: `True`
+                Bandpass correction, see :func:`select`.
 
             Returns
             -------
-            spec : `SpecData`
-                SpecData object containing the time, the frequency and the data
+            spec : `SpecData` or dict
+                SpecData object containing the time, the frequency and the data,
+                or dictionary of SpecData objects if `stokes` is a list.
+                Its weights are the number of samples of each bin,
+                empty bins are flagged.
         """
-        self.beam = beam
-        self.time = time
-        self.freq = freq
+        plan = self._plan(
+            time=time,
+            freq=freq,
+            beam=beam
+            )
         time_min, time_max = self.time
         freq_min, freq_max = self.freq
         if dt is None:
@@ -456,43 +491,390 @@ class Lane(object):
         # Prepare the final array
         nt = int((time_max - time_min) // dt)
         nf = int((freq_max - freq_min) // df)
-        available_memory = psutil.virtual_memory().available
-        avg_data_size = nt * nf * np.dtype(np.float32).itemsize
-        if avg_data_size > available_memory:
-            raise MemoryError(
-                'Try to increase dt and/or df'
+        nf = min(max(nf, 1), plan['freqs'].size)
+        # Backed by temporary files beyond the memory budget
+        names = [stokes] if isinstance(stokes, str) else list(stokes)
+        sums = allocate(names, (nt, nf), dtype='float64', zeros=True)
+        counts = allocate(
+            ['counts'],
+            (nt, nf),
+            dtype='float64',
+            zeros=True,
+            reserved=reserved_bytes(sums)
+            )['counts']
+
+        # Frequency bins of equal width, remaining channels are
+        # dropped (same behavior as `rebin1d`)
+        dx = plan['freqs'].size // nf
+        v0, v1 = plan['columns']
+        plan['columns'] = (v0, v0 + dx * nf)
+        averaged_freq = rebin1d(plan['freqs'], nf)
+
+        b0, b1 = plan['blocks']
+        c0, c1 = plan['beamlets']
+        bar = ProgressBar(
+            valmax=int(np.ceil((b1 - b0) / self._chunk_blocks(c1 - c0))),
+            title='Averaging spectra...'
+            )
+        self._accumulate(
+            sums=sums,
+            counts=counts,
+            plan=plan,
+            fgroups=np.arange(nf) * dx,
+            fbins=np.arange(nf),
+            start=time_min,
+            stop=time_min + nt * dt,
+            dt=dt,
+            stokes=names,
+            bp_corr=bp_corr,
+            bar=bar
+            )
+
+        data = allocate(
+            names,
+            (nt, nf),
+            dtype='float32',
+            reserved=reserved_bytes(dict(sums, counts=counts))
+            )
+        empty = counts == 0
+        specs = {}
+        for st in names:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                np.divide(sums[st], counts, out=data[st])
+            specs[st] = SpecData(
+                data=data[st],
+                time=TimeAxis(
+                    start=time_min + 0.5 * dt,
+                    step=dt,
+                    size=nt
+                    ),
+                freq=np.atleast_1d(averaged_freq),
+                mask=empty if empty.any() else None,
+                weights=counts,
+                stokes=st
                 )
-        averaged_data = np.zeros((nt, nf), dtype='float32')
-        averaged_time = np.zeros(nt)#, dtype='float32')
-        averaged_freq = np.zeros(nf)#, dtype='float32')
-       
-        # Loop over the time and seelct corresponding data
-        bar = ProgressBar(valmax=nt, title='Averaging spectra...')
-        for i in range(nt):
-            spec = self.select(
-                stokes=stokes,
-                time=[time_min + i*dt, time_min + (i + 1)*dt],
-                freq=freq,
-                beam=beam
+        return specs[stokes] if isinstance(stokes, str) else specs
+
+
+    def iter_chunks(self, stokes='I', time=None, freq=None, beam=None,
+            bp_corr=True, time_chunk=60., overlap=0., dtype=None, sk=False):
+        """ Walk through a selection by consecutive chunks of
+            time, with a constant memory footprint.
+
+            Parameters
+            ----------
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters,
+                see :meth:`select`.
+            time : list
+                Length-2 list of time range (ISO or ISOT format).
+                Default: `None` whole time range selection.
+            freq : list
+                Length-2 list of frequency range (in MHz).
+                Default: `None` whole frequency range selection.
+            beam : int
+                Beam index.
+                Default: `None` consider index 0.
+            bp_corr : bool or str
+                Bandpass correction, see :meth:`select`.
+            time_chunk : float
+                Duration of the data of each chunk in seconds,
+                shorter before a gap between time blocks (a
+                chunk never spans one, see :attr:`segments`).
+                Default: `60.`
+            overlap : float
+                Duration in seconds of the data of the previous
+                chunk repeated at the beginning of each chunk
+                (e.g. for filters), except after a gap.
+                Default: `0.`
+            dtype : str
+                Data type, see :meth:`select`.
+            sk : bool
+                Also compute the spectral kurtosis of the time
+                blocks while reading them (see
+                :func:`.spectral_kurtosis`), stored per sample
+                and polarization (`(nsamples, nfreqs, 2)`) in the
+                `'sk'` metadata of the chunks, along with the
+                `(nffte, nfft2int)` estimator parameters
+                (`'sk_mn'`). Default: `False`.
+
+            Yields
+            ------
+            spec : `SpecData` or dict
+                Chunk of data (dictionary of chunks if `stokes`
+                is a list). The data arrays are views of buffers
+                reused from one chunk to the next, they should
+                be copied to be kept.
+        """
+        plan = self._plan(
+            time=time,
+            freq=freq,
+            beam=beam
+            )
+        chunks = self._chunk_samples(plan, time_chunk, overlap)
+        n_max = max(s1 - s0 for s0, s1 in chunks)
+
+        names = [stokes] if isinstance(stokes, str) else list(stokes)
+        if dtype is None:
+            dtype = 'float64' if bp_corr == 'fft' else 'float32'
+        buffers = allocate(
+            names=names,
+            shape=(n_max, plan['freqs'].size),
+            dtype=dtype
+            )
+        meta = {}
+        if sk:
+            sk_buf = allocate(
+                names=['sk'],
+                shape=(n_max, plan['freqs'].size, 2),
+                dtype='float32',
+                reserved=reserved_bytes(buffers)
+                )['sk']
+            meta['sk_mn'] = (self.nffte, self.nfft2int)
+        for s0, s1 in chunks:
+            sub = self._subplan(plan, s0, s1)
+            if sk:
+                meta['sk'] = sk_buf[:s1 - s0]
+            data = self._read(
+                plan=sub,
+                stokes=names,
+                bp_corr=bp_corr,
+                out={st: buf[:s1 - s0] for st, buf in buffers.items()},
+                sk=meta.get('sk')
                 )
-            # Averaging data in time
-            d = np.squeeze(np.mean(spec.data, axis=0))
-            averaged_time[i] = to_unix(np.mean(spec.time.unix)).unix
-            # Averaging in frequency
-            d = rebin1d(d, nf)
-            if i == 0:
-                averaged_freq[:] = rebin1d(spec.freq, nf)
-            # Storing into final array
-            averaged_data[i, :] = d
-            bar.update()
-            
-        # return averaged_time, averaged_freq, averaged_data
-        return SpecData(
-            data=averaged_data,
-            time=to_unix(averaged_time),
-            freq=averaged_freq,
-            stokes=stokes
+            t0, t1 = sub['samples']
+            times = self._get_time(*sub['blocks'])[t0:t1]
+            specs = {
+                st: SpecData(
+                    data=data[st],
+                    time=times,
+                    freq=plan['freqs'],
+                    stokes=st,
+                    **meta
+                    )
+                for st in names
+                }
+            yield specs[stokes] if isinstance(stokes, str) else specs
+
+
+    def refresh(self):
+        """ Take into account the time blocks appended to the
+            file since it was opened (e.g. while it is still
+            being recorded). Only complete blocks are mapped, the
+            header columns of the new blocks only are parsed.
+
+            Returns
+            -------
+            n_new : int
+                Number of new time blocks
+        """
+        n_old = self._ntb
+        if path.getsize(self.sfile) < (n_old + 1) * self._dtype.itemsize:
+            return 0
+        self._load()
+        new = self.memdata[n_old:]
+        timestamps = new['TIMESTAMP'].astype('float64')
+        timestamps += new['BLOCKSEQNUMBER'] / max_bsn
+        self._timestamps = np.concatenate((self._timestamps, timestamps))
+        self._ntb = self._timestamps.size
+        self._parse_segments()
+        self._tindex = AxisIndex(self._timestamps)
+        self._bandpasses = {}
+        return self._ntb - n_old
+
+
+    def follow(self, stokes='I', freq=None, beam=None, bp_corr=True,
+            poll=1., timeout=None, max_blocks=None, from_start=False,
+            dtype=None):
+        """ Follow a file being recorded, yielding the time
+            blocks as soon as they are written (see
+            :meth:`refresh`).
+
+            Parameters
+            ----------
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters,
+                see :meth:`select`.
+            freq : list
+                Length-2 list of frequency range (in MHz).
+                Default: `None` whole frequency range selection.
+            beam : int
+                Beam index.
+                Default: `None` consider index 0.
+            bp_corr : bool or str
+                Bandpass correction, see :meth:`select`.
+            poll : float
+                Time in seconds between two checks of the file
+                size, which bounds the latency.
+                Default: `1.`
+            timeout : float
+                Stop once the file has not grown for `timeout`
+                seconds. Default: `None`, follow forever.
+            max_blocks : int
+                Maximal number of blocks yielded at once, e.g. to
+                bound the memory if the file grew a lot.
+                Default: `None`, every new block.
+            from_start : bool
+                Also yield the blocks already recorded.
+                Default: `False`
+            dtype : str
+                Data type, see :meth:`select`.
+
+            Yields
+            ------
+            spec : `SpecData` or dict
+                Newly recorded data (dictionary of `SpecData` if
+                `stokes` is a list).
+        """
+        plan = self._plan(
+            freq=freq,
+            beam=beam
             )
+        k0 = plan['blocks'][0] if from_start else self._ntb
+        last = monotonic()
+        while True:
+            self.refresh()
+            if self._ntb > k0:
+                k1 = self._ntb
+                if max_blocks is not None:
+                    k1 = min(k1, k0 + max_blocks)
+                sub = dict(
+                    plan,
+                    blocks=(k0, k1),
+                    samples=(0, (k1 - k0) * self.nffte)
+                    )
+                data = self._read(
+                    plan=sub,
+                    stokes=stokes,
+                    bp_corr=bp_corr,
+                    dtype=dtype
+                    )
+                times = self._get_time(id_min=k0, id_max=k1)
+                if isinstance(stokes, str):
+                    yield SpecData(
+                        data=data,
+                        time=times,
+                        freq=plan['freqs'],
+                        stokes=stokes
+                        )
+                else:
+                    yield {
+                        st: SpecData(
+                            data=data[st],
+                            time=times,
+                            freq=plan['freqs'],
+                            stokes=st
+                            )
+                        for st in stokes
+                        }
+                k0 = k1
+                last = monotonic()
+                continue
+            if (timeout is not None) and (monotonic() - last > timeout):
+                return
+            sleep(poll)
+
+
+    def bandpass(self, beam=None, n_blocks=None, overwrite=False):
+        """ Median bandpass gain of a beam, used by the
+            `bp_corr='median'` correction.
+
+            The median spectrum (Stokes I, no correction) is
+            estimated in a single streaming pass as the median
+            of the median spectra of `n_blocks` time blocks
+            evenly spread over the file. The gain of each channel
+            is the median level of its beamlet divided by this
+            spectrum. It is computed once and cached in memory
+            and in :attr:`bandpass_file` (if writable), along
+            with `n_blocks` and the number of time blocks of the
+            file: it is recomputed if either of them differs
+            (e.g. the file has grown since).
+
+            Parameters
+            ----------
+            beam : int
+                Beam index.
+                Default: `None` consider index 0.
+            n_blocks : int
+                Number of time blocks sampled.
+                Default: `None` use the cached bandpass whatever
+                its `n_blocks`, or sample 256 blocks.
+            overwrite : bool
+                Recompute the bandpass even if already cached.
+                Default: `False`.
+
+            Returns
+            -------
+            gain : np.ndarray
+                Gain of every channel of the beam (see
+                :attr:`frequencies`).
+        """
+        beam = self._beams[0] if beam is None else beam
+        if beam not in self._beams:
+            raise ValueError(
+                'Out of range beam selection.'
+                )
+        key = 'b{}'.format(beam)
+
+        if not overwrite:
+            if (key not in self._bandpasses) and path.isfile(self.bandpass_file):
+                with np.load(self.bandpass_file) as cached:
+                    self._bandpasses.update(cached)
+            if self._valid_bandpass(key, n_blocks):
+                return self._bandpasses[key]
+
+        if n_blocks is None:
+            n_blocks = 256
+        c0 = int(np.searchsorted(self._beams, beam))
+        c1 = c0 + int(np.sum(self._beams == beam))
+        nchans = (c1 - c0) * self.fftlen
+        n_total = self._timestamps.size
+        blocks = np.unique(
+            np.linspace(0, n_total - 1, min(n_blocks, n_total)).astype(int)
+            )
+
+        spectrum = NenuStokes(
+            data=self.memdata['data'],
+            stokes='I',
+            nffte=self.nffte,
+            fftlen=self.fftlen,
+            bp_corr=False
+            )
+        buf = np.empty((self.nffte, nchans), dtype='float32')
+        medians = np.empty((blocks.size, nchans), dtype='float32')
+        for i, b in enumerate(blocks):
+            spectrum.extract(
+                blocks=(b, b + 1),
+                beamlets=(c0, c1),
+                samples=(0, self.nffte),
+                columns=(0, nchans),
+                out=buf
+                )
+            medians[i] = np.median(buf, axis=0)
+        median = np.median(medians, axis=0).astype('float64')
+        broadband = np.median(
+            median.reshape((c1 - c0, self.fftlen)),
+            axis=1
+            )
+        gain = np.zeros(nchans)
+        np.divide(
+            np.repeat(broadband, self.fftlen),
+            median,
+            out=gain,
+            where=median > 0
+            )
+        self._bandpasses[key] = gain
+        self._bandpasses[key + '_setup'] = np.array([n_blocks, n_total])
+
+        try:
+            np.savez(self.bandpass_file, **self._bandpasses)
+        except OSError:
+            warnings.warn(
+                'Unable to write {}, bandpass kept in memory.'.format(
+                    self.bandpass_file
+                    )
+                )
+        return gain
 
 
     # --------------------------------------------------------- #
@@ -502,12 +884,12 @@ class Lane(object):
             Store it in the `memdata` attribute.
         """
         with open(self.sfile, 'rb') as rf:
-            hd_struct = np.dtype(header_struct)
-            header = np.frombuffer(
-                rf.read(hd_struct.itemsize),
-                count=1,
-                dtype=hd_struct,
-                )[0]
+            tmp = np.memmap(rf, dtype='int8', mode='r')
+
+        # The header is read from the mapped bytes, the file
+        # is therefore opened only once.
+        hd_struct = np.dtype(header_struct)
+        header = tmp[:hd_struct.itemsize].view(hd_struct)[0]
 
         for key in [h[0] for h in header_struct]:
             setattr(self, key.lower(), header[key])
@@ -515,22 +897,13 @@ class Lane(object):
         self.block_dt = self.dt * self.nffte # sec
         self.df = (1.0 / 5.12e-6 / self.fftlen) * 1e-6
 
-        beamlet_struct = np.dtype(
-            [('lane', 'int32'),
-            ('beam', 'int32'),
-            ('channel', 'int32'),
-            ('fft0', 'float32', (self.nffte, self.fftlen, 2)),
-            ('fft1', 'float32', (self.nffte, self.fftlen, 2))]
+        self._dtype = block_struct(
+            nffte=self.nffte,
+            fftlen=self.fftlen,
+            nbchan=self.nbchan
             )
         
-        block_struct = header_struct +\
-            [('data', beamlet_struct, (self.nbchan))]
-        
-        self._dtype = np.dtype(block_struct)
-        
         itemsize = self._dtype.itemsize
-        with open(self.sfile, 'rb') as rf:
-            tmp = np.memmap(rf, dtype='int8', mode='r')
         n_blocks = tmp.size * tmp.itemsize // (itemsize)
         data = tmp[: n_blocks * itemsize].view(self._dtype)
 
@@ -545,13 +918,49 @@ class Lane(object):
         """
         datacube = self.memdata['data']
         self._ntb, self._nfb = datacube['lane'].shape
-        self._timestamps = np.arange(self._ntb, dtype='float64')
-        self._timestamps *= self.block_dt
-        self._timestamps += self.memdata['TIMESTAMP'][0]
+
+        # Block start times: strided read of the header columns
+        # only, the block sequence number gives the sub-second
+        # part of the time stamp.
+        self._timestamps = self.memdata['TIMESTAMP'].astype('float64')
+        self._timestamps += self.memdata['BLOCKSEQNUMBER'] / max_bsn
+        self._parse_segments()
+
         # We here assume that the same information
         # is repeated at each time block
         self._beams = datacube['beam'][0]
         self._channels = datacube['channel'][0]
+        self._tindex = AxisIndex(self._timestamps)
+        self._findices = {}
+        return
+
+
+    def _parse_segments(self):
+        """ Find the runs of contiguous time blocks. A gap is
+            detected whenever two consecutive block start times
+            are not separated by `block_dt`, e.g. if some blocks
+            were dropped during the recording.
+            Store them in the `segments` attribute.
+        """
+        diff = np.diff(self._timestamps)
+        breaks = np.flatnonzero(
+            np.abs(diff - self.block_dt) > 0.5 * self.block_dt
+            ) + 1
+        starts = np.r_[0, breaks]
+        stops = np.r_[breaks, self._ntb]
+        self.segments = np.zeros(
+            starts.size,
+            dtype=[
+                ('block', 'i8'),
+                ('nblocks', 'i8'),
+                ('tmin', 'f8'),
+                ('tmax', 'f8')
+            ]
+            )
+        self.segments['block'] = starts
+        self.segments['nblocks'] = stops - starts
+        self.segments['tmin'] = self._timestamps[starts]
+        self.segments['tmax'] = self._timestamps[stops - 1] + self.block_dt
         return
 
 
@@ -560,21 +969,17 @@ class Lane(object):
 
             Parameter
             ---------
-            time : str
-                Time selection in ISO or ISOT.
+            time : float or np.ndarray
+                Unix time(s) to convert.
+            order : str
+                `'low'` or `'high'`, see :func:`idx_of`.
 
             Returns
             -------
-            index : dict
-                Dictionnary of lanes <-> block index
+            index : int or np.ndarray
+                Block index (one per time if an array is given)
         """
-        indices = {}
-        idx = idx_of(
-            array=self._timestamps,
-            value=time,
-            order=order
-            )
-        return idx
+        return self._tindex(time, order=order)
 
 
     def _f2bidx(self, frequency, order='low'):
@@ -582,21 +987,47 @@ class Lane(object):
 
             Parameter
             ---------
-            frequency : float
-                Frequency selection in MHz.
+            frequency : float or np.ndarray
+                Frequency selection(s) in MHz.
+            order : str
+                `'low'` or `'high'`, see :func:`idx_of`.
 
             Returns
             -------
-            index : dict
-                Dictionnary of lanes <-> block index
+            index : int or np.ndarray
+                Beamlet index (one per frequency if an array
+                is given)
         """
-        idx = idx_of(
-            array=self.frequencies,
-            value=frequency,
-            order=order
+        idx = self._findex(self.beam)(frequency, order=order)
+        return idx + np.searchsorted(self._beams, self.beam)
+
+
+    def _t2sidx(self, time, id_min, id_max):
+        """ Number of time samples of blocks `id_min` to
+            `id_max` (excluded) occuring before `time`.
+        """
+        block = np.searchsorted(
+            self._timestamps[id_min:id_max],
+            time,
+            side='right'
+            ) - 1
+        block = min(max(block, 0), id_max - id_min - 1)
+        offset = np.searchsorted(
+            self._timestamps[id_min + block] + np.arange(self.nffte) * self.dt,
+            time,
+            side='left'
             )
-        idx += np.searchsorted(self._beams, self.beam)
-        return idx
+        return int(block * self.nffte + offset)
+
+
+    def _findex(self, beam):
+        """ Frequency index resolver of a given beam, computed
+            once per beam.
+        """
+        if beam not in self._findices:
+            channels = self._channels[self._beams == beam]
+            self._findices[beam] = AxisIndex(channels * max_bsn * 1e-6)
+        return self._findices[beam]
 
 
     def _get_time(self, id_min, id_max):
@@ -611,14 +1042,21 @@ class Lane(object):
 
             Returns
             -------
-            time : `astropy.Time`
-                Time object array
+            time : `TimeAxis`
+                Compact time axis, irregular if the selection
+                spans a gap between time blocks
         """
-        n_times = (id_max - id_min) * self.nffte
-        t = np.arange(n_times, dtype='float64')
-        dt = t * self.dt,
-        dt += self._timestamps[id_min]
-        return to_unix(np.squeeze(dt))
+        seg = np.searchsorted(self.segments['block'], id_min, side='right') - 1
+        seg_stop = self.segments['block'][seg] + self.segments['nblocks'][seg]
+        if id_max <= seg_stop:
+            return TimeAxis(
+                start=self._timestamps[id_min],
+                step=self.dt,
+                size=(id_max - id_min) * self.nffte
+                )
+        offsets = np.arange(self.nffte) * self.dt
+        times = self._timestamps[id_min:id_max, np.newaxis] + offsets
+        return TimeAxis(unix=times.ravel())
 
 
     def _get_freq(self, id_min, id_max):
@@ -645,23 +1083,402 @@ class Lane(object):
         return f
 
 
-    def _check_memory(self, nt, nf):
-        """ Check that the requested data selection does not
-            exceed the available memory. 
+    def _plan(self, time=None, freq=None, beam=None):
+        """ Resolve a selection into index ranges, without
+            reading any data.
+
+            Parameters
+            ----------
+            time : list
+                Length-2 list of time range (unix or ISO/ISOT)
+            freq : list
+                Length-2 list of frequency range (in MHz)
+            beam : int
+                Beam index
+
+            Returns
+            -------
+            plan : dict
+                `'blocks'`: time block index range,
+                `'beamlets'`: beamlet index range,
+                `'columns'`: range of selected frequency columns
+                within the beamlet range,
+                `'samples'`: range of selected time samples
+                within the block range,
+                `'freqs'`: selected frequencies in MHz.
         """
-        vm = psutil.virtual_memory()
-        mem_gb = vm.available / (1024**3)
+        self.beam = beam
+        self.time = time
+        self.freq = freq
 
-        n_elements = nt * self.nffte * nf * self.fftlen
-        fftn_size = n_elements * 4 * np.dtype(np.float32).itemsize
-        meta_size = n_elements * 3 * np.dtype(np.int32).itemsize
-        sel_gb = (fftn_size + meta_size) / (1024**3)
+        if self.time[1] - self.time[0] < self.dt:
+            raise ValueError(
+                'Time interval selected < {} sec'.format(self.dt)
+                )
+        if self.freq[1] - self.freq[0] < self.df:
+            raise ValueError(
+                'Frequency interval selected < {} MHz'.format(self.df)
+                )
 
-        if sel_gb > mem_gb * 0.9:
-            raise MemoryError(
-                'Try to reduce the selection range'
+        tmin_idx = self._t2bidx(
+            time=self.time[0],
+            order='low'
+            )
+        tmax_idx = self._t2bidx(
+            time=self.time[1],
+            order='high'
+            )
+        fmin_idx = self._f2bidx(
+            frequency=self.freq[0],
+            order='low'
+            )
+        fmax_idx = self._f2bidx(
+            frequency=self.freq[1],
+            order='high'
+            )
+
+        freqs = self._get_freq(
+            id_min=fmin_idx,
+            id_max=fmax_idx + 1
+            )
+        cols = np.flatnonzero(
+            (freqs >= self.freq[0]) & (freqs < self.freq[1])
+            )
+        if cols.size == 0:
+            raise ValueError(
+                'Empty frequency selection'
                 )
+
+        # Selected times are contiguous, only the blocks
+        # containing the time boundaries are partially selected.
+        t0, t1 = [
+            self._t2sidx(time=t, id_min=tmin_idx, id_max=tmax_idx + 1)
+            for t in self.time
+            ]
+
+        return {
+            'blocks': (tmin_idx, tmax_idx + 1),
+            'beamlets': (fmin_idx, fmax_idx + 1),
+            'columns': (cols[0], cols[-1] + 1),
+            'samples': (t0, t1),
+            'freqs': freqs[cols[0]:cols[-1] + 1]
+            }
+
+
+    def _chunk_samples(self, plan, time_chunk, overlap=0.):
+        """ Split the samples of a selection into chunks of
+            `time_chunk` seconds of data, each one starting
+            `overlap` seconds before the end of the previous one.
+            Chunks never span a gap between time blocks (see
+            :attr:`segments`): each run of contiguous blocks is
+            split on its own, without overlap with the previous
+            run.
+
+            Returns
+            -------
+            chunks : list
+                `(s0, s1)` sample ranges, in the same reference
+                as `plan['samples']`
+        """
+        if time_chunk < self.dt:
+            raise ValueError(
+                'Time chunk < {} sec'.format(self.dt)
+                )
+        if overlap < 0:
+            raise ValueError(
+                'Negative overlap'
+                )
+        t0, t1 = plan['samples']
+        step = int(round(time_chunk / self.dt))
+        ovl = int(round(overlap / self.dt))
+        b0, b1 = plan['blocks']
+        starts = self.segments['block']
+        starts = starts[(starts > b0) & (starts < b1)]
+        bounds = np.concatenate((
+            [t0],
+            (starts - b0) * self.nffte,
+            [t1]
+            ))
+        return [
+            (max(r0, s - ovl), min(s + step, r1))
+            for r0, r1 in zip(bounds[:-1], bounds[1:])
+            for s in range(r0, r1, step)
+            ]
+
+
+    def _subplan(self, plan, s0, s1):
+        """ Restrict a selection to its samples `s0` to `s1`
+            (same reference as `plan['samples']`), reading only
+            the blocks containing them.
+        """
+        b0 = plan['blocks'][0]
+        k0 = b0 + s0 // self.nffte
+        k1 = b0 + (s1 - 1) // self.nffte + 1
+        shift = (k0 - b0) * self.nffte
+        return dict(
+            plan,
+            blocks=(k0, k1),
+            samples=(s0 - shift, s1 - shift)
+            )
+
+
+    def _read(self, plan, stokes='I', bp_corr=True, out=None, dtype=None, sk=None):
+        """ Read the data of a selection resolved by
+            :meth:`_plan`.
+
+            Parameters
+            ----------
+            plan : dict
+                Selection returned by :meth:`_plan`
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters
+            bp_corr : bool or str
+                Bandpass correction
+            out : np.ndarray or dict
+                Array of shape `(nsamples, nfreqs)` (dictionary
+                of arrays if `stokes` is a list) to store the
+                result in. Default: `None`, a new array is
+                returned.
+            dtype : str
+                Data type of the returned array if `out` is
+                `None`, see :meth:`.NenuStokes.extract`.
+            sk : np.ndarray
+                Array of shape `(nsamples, nfreqs, 2)` filled
+                with the spectral kurtosis of the time block of
+                each sample and polarization (see
+                :func:`.spectral_kurtosis`), computed from the
+                same read. Default: `None`.
+
+            Returns
+            -------
+            data : np.ndarray or dict
+                Selected data, a dictionary of arrays if
+                `stokes` is a list
+        """
+        b0, b1 = plan['blocks']
+        spectrum = NenuStokes(
+            data=self.backend.read(self, b0, b1)['data'],
+            stokes=stokes,
+            nffte=self.nffte,
+            fftlen=self.fftlen,
+            bp_corr=bp_corr
+            )
+        if sk is not None:
+            t0, t1 = plan['samples']
+            per_block = spectrum.kurtosis(
+                blocks=(0, b1 - b0),
+                beamlets=plan['beamlets'],
+                columns=plan['columns'],
+                nfft2int=self.nfft2int
+                )
+            np.take(per_block, np.arange(t0, t1) // self.nffte, axis=0, out=sk)
+        return spectrum.extract(
+            blocks=(0, b1 - b0),
+            beamlets=plan['beamlets'],
+            samples=plan['samples'],
+            columns=plan['columns'],
+            out=out,
+            dtype=dtype,
+            gain=self._gain(plan, bp_corr)
+            )
+
+
+    def _valid_bandpass(self, key, n_blocks=None):
+        """ Whether the cached bandpass `key` was computed from
+            the current time blocks of the file, sampling
+            `n_blocks` of them (any number if `None`).
+        """
+        setup = self._bandpasses.get(key + '_setup')
+        if (key not in self._bandpasses) or (setup is None):
+            return False
+        if int(setup[1]) != self._ntb:
+            return False
+        return (n_blocks is None) or (int(setup[0]) == n_blocks)
+
+
+    def _gain(self, plan, bp_corr):
+        """ Precomputed bandpass gain of the beamlets of a
+            selection, `None` unless `bp_corr` is `'median'`.
+        """
+        if bp_corr != 'median':
+            return None
+        c0, c1 = plan['beamlets']
+        beam = self._beams[c0]
+        first = np.searchsorted(self._beams, beam)
+        gain = self.bandpass(beam=beam)
+        return gain[(c0 - first) * self.fftlen:(c1 - first) * self.fftlen]
+
+
+    def _chunk_blocks(self, nbeamlets):
+        """ Number of time blocks to read at once so that the
+            raw data of `nbeamlets` beamlets fit in `chunk_bytes`
+            (or in a quarter of the memory budget if lower).
+        """
+        beamlet_size = self._dtype['data'].base['fft0'].itemsize * 2
+        size = min(chunk_bytes, memory_budget() // 4)
+        return max(1, int(size // (beamlet_size * nbeamlets)))
+
+
+    def _sample_bytes(self, plan, bp_corr=True):
+        """ Transient memory needed per time sample to read a
+            selection, on top of its outputs: raw blocks copied
+            by the I/O backend and whole-beamlet buffers of the
+            FFT bandpass correction (about three float64 arrays).
+        """
+        nbytes = 0.
+        if self.backend.in_memory:
+            nbytes += self._dtype.itemsize / self.nffte
+        if bp_corr == 'fft':
+            c0, c1 = plan['beamlets']
+            nbytes += 3 * 8 * (c1 - c0) * self.fftlen
+        return nbytes
+
+
+    def _read_chunked(self, plan, stokes, bp_corr, out, reserved=0, concurrency=1):
+        """ Same as :meth:`_read` (with a list of Stokes
+            parameters and output arrays), by chunks of whole
+            time blocks so that the working set fits in the
+            memory budget (see :func:`.plan_chunks`).
+
+            Parameters
+            ----------
+            reserved : int
+                Memory already used by the outputs (bytes).
+            concurrency : int
+                Number of selections read at the same time,
+                sharing the memory budget.
+        """
+        t0, t1 = plan['samples']
+        chunk = plan_chunks(
+            nsamples=t1 - t0,
+            sample_bytes=concurrency * self._sample_bytes(plan, bp_corr),
+            reserved=reserved,
+            align=self.nffte
+            )
+        if chunk >= t1 - t0:
+            return self._read(plan, stokes=stokes, bp_corr=bp_corr, out=out)
+        # Chunk edges on block boundaries
+        edges = np.r_[
+            t0,
+            np.arange((t0 // chunk + 1) * chunk, t1, chunk),
+            t1
+            ]
+        for s0, s1 in zip(edges[:-1], edges[1:]):
+            self._read(
+                plan=self._subplan(plan, s0, s1),
+                stokes=stokes,
+                bp_corr=bp_corr,
+                out={st: o[s0 - t0:s1 - t0] for st, o in out.items()}
+                )
+        return out
+
+
+    def _accumulate(self, sums, counts, plan, fgroups, fbins,
+            start, stop, dt, stokes='I', bp_corr=True, bar=None, first=0):
+        """ Walk the memmap once, by chunks of time blocks, and
+            accumulate the selected data onto an averaged grid.
+
+            Parameters
+            ----------
+            sums : np.ndarray or dict
+                (nt, nf) array of summed values, updated in place,
+                or dictionary of such arrays if `stokes` is a list.
+            counts : np.ndarray
+                (nt, nf) array of sample counts, updated in place.
+            plan : dict
+                Selection plan returned by :func:`_plan`.
+            fgroups : np.ndarray
+                Indices, among the planned frequencies, starting
+                each output frequency bin.
+            fbins : np.ndarray
+                Output frequency bin index of each group.
+            start : float
+                Unix time of the first output time bin edge.
+            stop : float
+                Unix time after which data are discarded.
+            dt : float
+                Output time bin width in seconds.
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters
+                computed from a single read of each chunk.
+            bp_corr : bool or str
+                Bandpass correction, see :func:`select`.
+            bar : `ProgressBar`
+                Progress bar updated after each chunk.
+            first : int
+                Index, on the whole averaged grid, of the first
+                time bin of `sums` and `counts` (which may only
+                hold a time shard of the grid).
+        """
+        b0, b1 = plan['blocks']
+        c0, c1 = plan['beamlets']
+        v0, v1 = plan['columns']
+        nt = counts.shape[0]
+
+        names = [stokes] if isinstance(stokes, str) else list(stokes)
+        spectrum = NenuStokes(
+            data=None,
+            stokes=names,
+            nffte=self.nffte,
+            fftlen=self.fftlen,
+            bp_corr=bp_corr
+            )
+        gain = self._gain(plan, bp_corr)
+        offsets = np.arange(self.nffte) * self.dt
+        step = self._chunk_blocks(c1 - c0)
+        # Chunk buffers, reused for every chunk
+        buffers = {
+            st: np.empty(
+                (min(step, b1 - b0) * self.nffte, v1 - v0),
+                dtype='float64' if bp_corr == 'fft' else 'float32'
+                )
+            for st in names
+            }
+
+        # Only read the chunks overlapping the output time bins
+        t_min = start + first * dt
+        t_max = min(stop, start + (first + nt) * dt)
+        ranges = []
+        for k0 in range(b0, b1, step):
+            k1 = min(k0 + step, b1)
+            if (self._timestamps[k0] < t_max) and\
+                (self._timestamps[k1 - 1] + self.block_dt > t_min):
+                ranges.append((k0, k1))
+            elif bar is not None:
+                bar.update()
+
+        # The next chunk may be read while this one is processed
+        for k0, k1, blocks in self.backend.iter_read(self, ranges):
+            times = self._timestamps[k0:k1, np.newaxis] + offsets
+            times = times.ravel()
+            tbins = np.floor((times - start) / dt).astype(int) - first
+            tbins[times >= stop] = -1
+            data = {
+                st: buf[:times.size] for st, buf in buffers.items()
+                }
+            spectrum.data = blocks['data']
+            spectrum.extract(
+                blocks=(0, k1 - k0),
+                beamlets=(c0, c1),
+                samples=(0, times.size),
+                columns=(v0, v1),
+                out=data,
+                gain=gain
+                )
+            for i, st in enumerate(names):
+                bin_accumulate(
+                    sums=sums[st] if isinstance(sums, dict) else sums,
+                    counts=counts if i == 0 else None,
+                    data=data[st],
+                    tbins=tbins,
+                    fgroups=fgroups,
+                    fbins=fbins
+                    )
+            if bar is not None:
+                bar.update()
         return
+
+
 # ============================================================= #
 
 
@@ -0,0 +1,235 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ********
+    LanePool
+    ********
+
+    Opening a :class:`.Lane` reads the file header, maps the
+    whole file and parses its time-frequency content. A
+    :class:`LanePool` keeps a bounded number of those objects
+    open so that successive selections on the same observation
+    only cost the data reading.
+
+    Lanes in use by a selection are pinned (see
+    :meth:`LanePool.pinned`), they are never closed to make
+    room for other ones.
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'LanePool'
+    ]
+
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import os.path as path
+import threading
+
+from nenupytf.read import Lane, get_backend
+
+
+# ============================================================= #
+# ------------------------- LanePool -------------------------- #
+# ============================================================= #
+class LanePool(object):
+    """ Least Recently Used pool of open :class:`.Lane` objects.
+
+        Parameters
+        ----------
+        max_lanes : int
+            Maximal number of simultaneously open lane files.
+        max_bytes : int
+            Maximal number of mapped bytes. Default: `None`,
+            no limit (mapped pages are only loaded in memory
+            when read, and may be reclaimed by the system).
+        backend : str or `IOBackend`
+            I/O backend of the lanes (see :func:`.get_backend`).
+            Default: `None`, memory map.
+
+        Attributes
+        ----------
+        max_lanes : int
+            Maximal number of simultaneously open lane files.
+        max_bytes : int
+            Maximal number of mapped bytes.
+        backend : `IOBackend`
+            I/O backend shared by the lanes.
+    """
+
+    def __init__(self, max_lanes=8, max_bytes=None, backend=None):
+        self._lanes = OrderedDict()
+        self._pins = {}
+        self._lock = threading.RLock()
+        self.backend = get_backend(backend)
+        self.max_lanes = max_lanes
+        self.max_bytes = max_bytes
+
+
+    def __len__(self):
+        return len(self._lanes)
+
+
+    def __contains__(self, sfile):
+        return path.abspath(sfile) in self._lanes
+
+
+    def __str__(self):
+        return 'LanePool: {} lanes open, {:.1f} MB mapped'.format(
+            len(self),
+            self.nbytes / 1024**2
+            )
+
+
+    # --------------------------------------------------------- #
+    # --------------------- Getter/Setter --------------------- #
+    @property
+    def max_lanes(self):
+        return self._max_lanes
+    @max_lanes.setter
+    def max_lanes(self, n):
+        if not isinstance(n, int):
+            raise TypeError(
+                'Integer expected.'
+                )
+        if n < 1:
+            raise ValueError(
+                '`max_lanes` should be >= 1'
+                )
+        self._max_lanes = n
+        self._evict()
+        return
+
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+    @max_bytes.setter
+    def max_bytes(self, b):
+        self._max_bytes = b
+        self._evict()
+        return
+
+
+    @property
+    def nbytes(self):
+        """ Total number of bytes mapped by the open lanes
+        """
+        return sum(l.nbytes for l in self._lanes.values())
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def get(self, sfile):
+        """ Return an open :class:`.Lane` for `sfile`, opening
+            it if it is not in the pool yet.
+
+            Parameters
+            ----------
+            sfile : str
+                Path towards a '*.spectra' file
+
+            Returns
+            -------
+            lane : `Lane`
+                Open lane object
+        """
+        key = path.abspath(sfile)
+        with self._lock:
+            if key in self._lanes:
+                self._lanes.move_to_end(key)
+                return self._lanes[key]
+            lane = Lane(spectrum=key, backend=self.backend)
+            self._lanes[key] = lane
+            self._evict()
+            return lane
+
+
+    @contextmanager
+    def pinned(self, sfiles):
+        """ Open lanes of `sfiles`, which are not evicted from
+            the pool until the end of the context (contexts may
+            be nested and pin the same lanes).
+
+            Parameters
+            ----------
+            sfiles : list
+                Paths towards '*.spectra' files
+
+            Yields
+            ------
+            lanes : list
+                Open lane objects, in the order of `sfiles`
+
+            Example
+            -------
+            >>> with pool.pinned(files) as lanes:
+                    data = [l.select() for l in lanes]
+        """
+        keys = [path.abspath(f) for f in sfiles]
+        with self._lock:
+            for key in keys:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield [self.get(key) for key in keys]
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._pins[key] -= 1
+                    if self._pins[key] == 0:
+                        del self._pins[key]
+                self._evict()
+        return
+
+
+    def release(self, sfile):
+        """ Close the lane associated to `sfile`, if open and
+            not pinned.
+        """
+        key = path.abspath(sfile)
+        with self._lock:
+            if key in self._pins:
+                return
+            lane = self._lanes.pop(key, None)
+        if lane is not None:
+            lane.close()
+        return
+
+
+    def close(self):
+        """ Close every open lane.
+        """
+        with self._lock:
+            while self._lanes:
+                _, lane = self._lanes.popitem(last=False)
+                lane.close()
+        return
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _evict(self):
+        """ Close the least recently used lanes until the pool
+            bounds are respected. The most recent one and the
+            pinned ones are always kept open.
+        """
+        with self._lock:
+            for key in list(self._lanes)[:-1]:
+                if (len(self._lanes) <= self.max_lanes) and\
+                    ((self.max_bytes is None) or (self.nbytes <= self.max_bytes)):
+                    break
+                if key in self._pins:
+                    continue
+                self._lanes.pop(key).close()
+        return
+# ============================================================= #
+
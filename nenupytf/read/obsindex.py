@@ -0,0 +1,337 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ********
+    ObsIndex
+    ********
+
+    Describing an observation does not require to open every
+    '*.spectra' file as a :class:`.Lane`: the time range is
+    given by the first and last block headers, and the
+    frequency / beam setup by the beamlet descriptors of the
+    first block.
+
+    :class:`ObsIndex` reads only those few bytes for each file
+    and stores the result in a sidecar JSON file
+    (:attr:`ObsIndex.sidecar`) within the observation directory.
+    Each entry is keyed by the file name, size and modification
+    time so that reopening an observation only rescans files
+    that have changed. If the observation directory is not
+    writable, the index is kept in the user cache directory
+    instead.
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'ObsIndex',
+    'index_lane'
+    ]
+
+
+import os
+import os.path as path
+import json
+from hashlib import sha1
+import numpy as np
+
+from nenupytf.other import header_struct, block_struct, max_bsn, to_unix
+
+
+# Version of the index format, bump it to invalidate the sidecars
+index_version = 2
+
+# Name of the sidecar file
+sidecar_name = '.nenupytf_index.json'
+
+
+# ============================================================= #
+# ------------------------ index_lane ------------------------- #
+# ============================================================= #
+def index_lane(sfile):
+    """ Read the minimal information describing a '*.spectra'
+        file: first and last block headers, and beamlet
+        descriptors of the first block.
+
+        Parameters
+        ----------
+        sfile : str
+            Path towards a '*.spectra' file
+
+        Returns
+        -------
+        entry : dict
+            JSON-serializable description of the file
+    """
+    sfile = path.abspath(sfile)
+    stat = os.stat(sfile)
+    hd_struct = np.dtype(header_struct)
+
+    with open(sfile, 'rb') as rf:
+        first = np.frombuffer(
+            rf.read(hd_struct.itemsize),
+            count=1,
+            dtype=hd_struct
+            )[0]
+        dtype = block_struct(
+            nffte=first['nffte'],
+            fftlen=first['fftlen'],
+            nbchan=first['nbchan']
+            )
+        n_blocks = stat.st_size // dtype.itemsize
+        if n_blocks == 0:
+            raise ValueError(
+                '{} does not contain any complete block'.format(sfile)
+                )
+        rf.seek((n_blocks - 1) * dtype.itemsize)
+        last = np.frombuffer(
+            rf.read(hd_struct.itemsize),
+            count=1,
+            dtype=hd_struct
+            )[0]
+
+        # Only the descriptor fields are accessed, the
+        # corresponding pages are the only ones read.
+        beamlets = np.memmap(
+            rf,
+            dtype=dtype['data'].base,
+            mode='r',
+            offset=hd_struct.itemsize,
+            shape=(int(first['nbchan']),)
+            )
+        beams = beamlets['beam'].tolist()
+        channels = beamlets['channel'].tolist()
+        del beamlets
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'lane': int(
+            path.basename(sfile).split('_')[-1].replace('.spectra', '')
+            ),
+        'fftlen': int(first['fftlen']),
+        'nfft2int': int(first['nfft2int']),
+        'nffte': int(first['nffte']),
+        'nbchan': int(first['nbchan']),
+        'n_blocks': int(n_blocks),
+        'first': [int(first['TIMESTAMP']), int(first['BLOCKSEQNUMBER'])],
+        'last': [int(last['TIMESTAMP']), int(last['BLOCKSEQNUMBER'])],
+        'beams': beams,
+        'channels': channels
+        }
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- ObsIndex -------------------------- #
+# ============================================================= #
+class ObsIndex(object):
+    """ Header-only index of the '*.spectra' files of an
+        observation, persisted in a sidecar file.
+
+        Parameters
+        ----------
+        repo : str
+            Observation directory.
+        files : list
+            '*.spectra' files to index.
+
+        Attributes
+        ----------
+        entries : dict
+            File name <-> description (see :func:`index_lane`)
+        sidecar : str
+            Path towards the index file
+    """
+
+    def __init__(self, repo, files):
+        self.repo = path.abspath(repo)
+        self.entries = {}
+        self.sidecar = path.join(self.repo, sidecar_name)
+        self._load()
+        self.update(files)
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    def update(self, files):
+        """ Index `files`, only rescanning those that are not
+            in the index yet or whose size or modification time
+            have changed. The sidecar is rewritten if needed.
+
+            Parameters
+            ----------
+            files : list
+                '*.spectra' files to index.
+        """
+        entries = {}
+        modified = False
+        for f in files:
+            name = path.basename(f)
+            stat = os.stat(f)
+            entry = self.entries.get(name)
+            if (entry is None) or\
+                (entry['size'] != stat.st_size) or\
+                (entry['mtime'] != stat.st_mtime):
+                entry = index_lane(f)
+                modified = True
+            entries[name] = entry
+        modified |= set(entries) != set(self.entries)
+        self.entries = entries
+        if modified:
+            self._save()
+        return
+
+
+    def describe(self, sfile):
+        """ Summary of a '*.spectra' file.
+
+            Parameters
+            ----------
+            sfile : str
+                Path towards a '*.spectra' file
+
+            Returns
+            -------
+            desc : dict
+                `'tmin'`, `'tmax'` (`astropy.time.Time`), `'fmin'`,
+                `'fmax'` (MHz) for the default beam, `'beam'`
+                (array of beam indices) and `'file'`.
+        """
+        entry = self.entries[path.basename(sfile)]
+        beams = np.array(entry['beams'])
+        channels = np.array(entry['channels'])
+        freqs = channels[beams == beams[0]] * max_bsn * 1e-6
+        df = (1.0 / 5.12e-6) * 1e-6
+        tmin, tmax = self.time_range(sfile)
+        return {
+            'tmin': to_unix(tmin),
+            'tmax': to_unix(tmax),
+            'fmin': freqs.min(),
+            'fmax': freqs.max() + df,
+            'beam': np.unique(beams),
+            'file': path.join(self.repo, path.basename(sfile))
+            }
+
+
+    def segments(self, sfile):
+        """ Frequency setup of each beam recorded in a
+            '*.spectra' file.
+
+            Parameters
+            ----------
+            sfile : str
+                Path towards a '*.spectra' file
+
+            Returns
+            -------
+            segments : list
+                List of `(beam, fmin, fmax, cmin, cmax)` tuples,
+                `fmin` and `fmax` being in MHz, `cmin` and `cmax`
+                the range of beamlet indices of the beam.
+        """
+        entry = self.entries[path.basename(sfile)]
+        beams = np.array(entry['beams'])
+        channels = np.array(entry['channels'])
+        df = (1.0 / 5.12e-6) * 1e-6
+        segments = []
+        for b in np.unique(beams):
+            idx = np.flatnonzero(beams == b)
+            freqs = channels[idx] * max_bsn * 1e-6
+            segments.append(
+                (
+                    int(b),
+                    freqs.min(),
+                    freqs.max() + df,
+                    int(idx[0]),
+                    int(idx[-1] + 1)
+                )
+            )
+        return segments
+
+
+    def time_range(self, sfile):
+        """ Time range covered by a '*.spectra' file, from
+            the first and last block headers (hence taking into
+            account missing blocks).
+
+            Parameters
+            ----------
+            sfile : str
+                Path towards a '*.spectra' file
+
+            Returns
+            -------
+            tmin, tmax : float
+                Unix times of the start and end of the file
+        """
+        entry = self.entries[path.basename(sfile)]
+        block_dt = 5.12e-6 * entry['fftlen'] *\
+            entry['nfft2int'] * entry['nffte']
+        tmin = entry['first'][0] + entry['first'][1] / max_bsn
+        tmax = entry['last'][0] + entry['last'][1] / max_bsn + block_dt
+        return tmin, tmax
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _load(self):
+        """ Read the sidecar file, either in the observation
+            directory or in the user cache.
+        """
+        for sidecar in [self.sidecar, self._cache_file()]:
+            try:
+                with open(sidecar, 'r') as rf:
+                    content = json.load(rf)
+            except (OSError, ValueError):
+                continue
+            if content.get('version') != index_version:
+                continue
+            self.entries = content['entries']
+            self.sidecar = sidecar
+            return
+        return
+
+
+    def _save(self):
+        """ Write the sidecar file, fall back to the user cache
+            if the observation directory is not writable.
+        """
+        content = {
+            'version': index_version,
+            'entries': self.entries
+            }
+        for sidecar in [path.join(self.repo, sidecar_name), self._cache_file()]:
+            tmp = sidecar + '.{}.tmp'.format(os.getpid())
+            try:
+                os.makedirs(path.dirname(sidecar), exist_ok=True)
+                with open(tmp, 'w') as wf:
+                    json.dump(content, wf)
+                os.replace(tmp, sidecar)
+            except OSError:
+                if path.isfile(tmp):
+                    os.remove(tmp)
+                continue
+            self.sidecar = sidecar
+            return
+        return
+
+
+    def _cache_file(self):
+        """ Path of the index in the user cache directory.
+        """
+        cache = os.environ.get(
+            'XDG_CACHE_HOME',
+            path.join(path.expanduser('~'), '.cache')
+            )
+        key = sha1(self.repo.encode('utf-8')).hexdigest()
+        return path.join(cache, 'nenupytf', key + '.json')
+# ============================================================= #
+
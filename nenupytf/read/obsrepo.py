@@ -24,9 +24,10 @@ __all__ = [
 
 import os.path as path
 from glob import glob
+from contextlib import contextmanager
 import numpy as np
 
-from nenupytf.read import Lane
+from nenupytf.read import LanePool, ObsIndex, TileStore, Pyramid
 
 
 # ============================================================= #
@@ -43,6 +44,9 @@ class ObsRepo(object):
         ----------
         repo : str
             Repository where observation files are stored.
+        backend : str or `IOBackend`
+            I/O backend reading the lane files (see
+            :func:`.get_backend`). Default: `None`, memory map.
 
         Attributes
         ----------
@@ -53,16 +57,43 @@ class ObsRepo(object):
             Array of lane indices used during the observation
         files : `numpy.array`
             Array of .spectra files that lies in the repository
+        pool : `LanePool`
+            Pool of open `Lane` objects, reused among successive
+            selections. It can be released with :func:`close`.
+        index : `ObsIndex`
+            Header-only description of the .spectra files,
+            cached on disk alongside the data.
+        store : `TileStore`
+            Tiled copy of the observation (see :func:`.convert`)
+            if one is found in the repository, otherwise `None`.
+            The repository may then only contain the store.
+        pyramid : `Pyramid`
+            Multi-resolution quick-look pyramid (see
+            :func:`.build_pyramid`) if one is found in the
+            repository, otherwise `None`.
     """
 
-    def __init__(self, repo):
+    def __init__(self, repo, backend=None):
         self.desc = {}
+        self.pool = LanePool(backend=backend)
+        self.index = None
+        self.store = None
+        self.pyramid = None
+        self._desctab = None
         self.spectra = None
         self.lanes = None
         self.files = None
         self.repo = repo
 
 
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
     # --------------------------------------------------------- #
     # --------------------- Getter/Setter --------------------- #
     @property
@@ -74,6 +105,7 @@ class ObsRepo(object):
             raise TypeError(
                 'String expected.'
                 )
+        self.pool.close()
         self._repo = path.abspath(r)
         if not path.isdir(self._repo):
             raise NotADirectoryError(
@@ -101,60 +133,35 @@ class ObsRepo(object):
         if l is None:
             return
         for la, fi in zip(l, self.files):
-            s = Lane(spectrum=fi)
-            self.desc[str(la)] = {
-                'tmin': s.time_min,
-                'tmax': s.time_max,
-                'fmin': s.freq_min,
-                'fmax': s.freq_max,
-                'beam': np.unique(s._beams),
-                'file': fi
-            }
-            del s
+            self.desc[str(la)] = self.index.describe(fi)
         return
     
 
     @property
     def desctab(self):
-        """ Numpy array of description,
-            usefull for masking purposes...
-        """
-        max_len = 0
-        desc_list = []
-        for k, v in self.desc.items():
-            if len(v['file']) > max_len:
-                max_len = len(v['file'])
-            for b in v['beam']:
-                desc_list.append(
-                    (
-                        int(k),
-                        b,
-                        v['tmin'].unix,
-                        v['tmax'].unix,
-                        v['fmin'],
-                        v['fmax'],
-                        v['file'])
-                )
+        """ Numpy structured array describing each segment of
+            the observation, i.e. one row per beam recorded in
+            each lane file (`lane`, `beam`, `tmin`, `tmax`,
+            `fmin`, `fmax`, beamlet index range `cmin`/`cmax`
+            and `file`). Rows are sorted by beam and frequency.
 
-        dtype = [
-            ('lane', 'u4'),
-            ('beam', 'u4'),
-            ('tmin', 'f8'),
-            ('tmax', 'f8'),
-            ('fmin', 'f8'),
-            ('fmax', 'f8'),
-            ('file', 'U{}'.format(max_len))
-            ]
-
-        d = np.array(
-            desc_list,
-            dtype=dtype
-        )
-        return d
+            The table is computed once and kept until the
+            repository changes.
+        """
+        if self._desctab is None:
+            self._desctab = self._build_desctab()
+        return self._desctab
 
 
     # --------------------------------------------------------- #
     # ------------------------ Methods ------------------------ #
+    def close(self):
+        """ Release every lane file kept open in :attr:`pool`.
+        """
+        self.pool.close()
+        return
+
+
     def info(self):
         """ Display the informations regarding the observation
         """
@@ -175,19 +182,142 @@ class ObsRepo(object):
         return
 
 
+    def refresh(self):
+        """ Take into account the growth of lane files still
+            being recorded: the open lanes map their new time
+            blocks (see :func:`.Lane.refresh`), the index and
+            :attr:`desctab` are updated.
+        """
+        for f in self.files:
+            if f in self.pool:
+                self.pool.get(f).refresh()
+        self.index.update(self.files)
+        self.lanes = self.lanes
+        self._desctab = None
+        return
+
+
     # --------------------------------------------------------- #
     # ----------------------- Internal ------------------------ #
+    def _segments(self, beam, time, freq):
+        """ Select the rows of :attr:`desctab` corresponding
+            to `beam` and overlapping the `time` and `freq`
+            ranges.
+
+            Parameters
+            ----------
+            beam : int
+                Beam index
+            time : list
+                Length-2 list of unix times
+            freq : list
+                Length-2 list of frequencies in MHz
+
+            Returns
+            -------
+            segments : `numpy.ndarray`
+                Selected rows of :attr:`desctab`
+        """
+        tab = self.desctab
+        b0 = np.searchsorted(tab['beam'], beam, side='left')
+        b1 = np.searchsorted(tab['beam'], beam, side='right')
+        tab = tab[b0:b1]
+        # Rows are sorted by fmin within a beam
+        tab = tab[:np.searchsorted(tab['fmin'], freq[1], side='left')]
+        overlap = (tab['fmax'] > freq[0]) &\
+            (tab['tmin'] < time[1]) &\
+            (tab['tmax'] > time[0])
+        return tab[overlap]
+
+
+    @contextmanager
+    def _beam_lanes(self, beam):
+        """ Open the lanes recording `beam` and resolve the
+            whole beam selection on each of them. The lanes are
+            pinned in :attr:`pool` until the end of the context.
+
+            Parameters
+            ----------
+            beam : int
+                Beam index
+
+            Yields
+            ------
+            lanes : list
+                `Lane` objects, sorted by frequency
+            plans : list
+                Selections returned by :func:`.Lane._plan`
+        """
+        tab = self.desctab
+        files = tab['file'][tab['beam'] == beam]
+        if files.size == 0:
+            raise ValueError(
+                'Beam {} not recorded'.format(beam)
+                )
+        with self.pool.pinned(files) as lanes:
+            plans = [l._plan(beam=beam) for l in lanes]
+            for l in lanes[1:]:
+                if not np.array_equal(l._timestamps, lanes[0]._timestamps):
+                    raise ValueError(
+                        'Lanes of beam {} do not share the same time blocks'.format(beam)
+                        )
+            yield lanes, plans
+
+
+    def _build_desctab(self):
+        """ Build the segment table from the index
+        """
+        if self.files.size == 0:
+            return self.store.desctab()
+
+        max_len = 0
+        desc_list = []
+        for la, fi in zip(self.lanes, self.files):
+            max_len = max(max_len, len(fi))
+            tmin, tmax = self.index.time_range(fi)
+            for b, fmin, fmax, cmin, cmax in self.index.segments(fi):
+                desc_list.append(
+                    (la, b, tmin, tmax, fmin, fmax, cmin, cmax, fi)
+                )
+
+        dtype = [
+            ('lane', 'u4'),
+            ('beam', 'u4'),
+            ('tmin', 'f8'),
+            ('tmax', 'f8'),
+            ('fmin', 'f8'),
+            ('fmax', 'f8'),
+            ('cmin', 'u4'),
+            ('cmax', 'u4'),
+            ('file', 'U{}'.format(max_len))
+            ]
+
+        d = np.array(
+            desc_list,
+            dtype=dtype
+        )
+        return np.sort(d, order=['beam', 'fmin', 'tmin'])
+
+
     def _find_spectra(self):
         """ Find all the .spectra files within the repo
         """
+        self._desctab = None
         search = path.join(self._repo, '*.spectra')
         self.files = np.array(glob(search))
+        self.store = TileStore.find(self._repo)
+        self.pyramid = Pyramid.find(self._repo)
         
-        if self.files.size == 0:
+        if (self.files.size == 0) and (self.store is None):
             raise FileNotFoundError(
                 'No .spectra files found!'
                 )
 
+        self.index = ObsIndex(
+            repo=self._repo,
+            files=self.files
+            )
+
         self.lanes = np.array([
             int(
                 f.split('_')[-1].replace('.spectra', '')
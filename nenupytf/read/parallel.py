@@ -0,0 +1,199 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    ********
+    parallel
+    ********
+
+    Averaging a whole night of high rate data is mostly a
+    matter of converting raw blocks to Stokes parameters, which
+    is done independently for each time block. The output time
+    bins are therefore split into contiguous shards, processed
+    by a pool of worker processes. Each worker maps the lane
+    files on its own (through a :class:`.LanePool`) and
+    accumulates its shard directly in arrays shared with the
+    parent process, so that no large array is pickled back.
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'sharded_average'
+    ]
+
+
+import multiprocessing as mp
+import numpy as np
+
+from nenupytf.read import LanePool
+from nenupytf.other import ProgressBar
+
+
+# Worker process state, set by `_init_worker`
+_worker = {}
+
+
+# ============================================================= #
+# ---------------------- sharded_average ---------------------- #
+# ============================================================= #
+def sharded_average(jobs, ntimes, nfreqs, start, stop, dt,
+        stokes='I', bp_corr=True, n_procs=None, n_shards=None,
+        progress=True, backend=None):
+    """ Accumulate several lane selections onto a common
+        averaged grid using a pool of processes.
+
+        Parameters
+        ----------
+        jobs : list
+            List of `(sfile, plan, fgroups, fbins)` tuples: lane
+            file, selection returned by :func:`.Lane._plan` and
+            frequency binning (see :func:`.Lane._accumulate`).
+        ntimes : int
+            Number of output time bins.
+        nfreqs : int
+            Number of output frequency bins.
+        start : float
+            Unix time of the first output time bin edge.
+        stop : float
+            Unix time after which data are discarded.
+        dt : float
+            Output time bin width in seconds.
+        stokes : str or list
+            Stokes parameter, or list of Stokes parameters.
+        bp_corr : bool or str
+            Bandpass correction, see :func:`.Lane.select`.
+        n_procs : int
+            Number of worker processes. Default: `None`, the
+            number of CPUs.
+        n_shards : int
+            Number of time shards. Default: `None`, four
+            shards per process to balance the load.
+        progress : bool
+            Display a progress bar updated after each shard.
+        backend : str or `IOBackend`
+            I/O backend used by the workers (see
+            :func:`.get_backend`). Default: `None`, memory map.
+
+        Returns
+        -------
+        sums, counts : np.ndarray
+            `(ntimes, nfreqs)` arrays of summed values (a
+            dictionary of arrays if `stokes` is a list) and
+            number of samples.
+    """
+    if n_procs is None:
+        n_procs = mp.cpu_count()
+    if n_shards is None:
+        n_shards = 4 * n_procs
+    n_shards = max(1, min(n_shards, ntimes))
+
+    names = [stokes] if isinstance(stokes, str) else list(stokes)
+    shape = (ntimes, nfreqs)
+    shared_sums = {
+        st: mp.RawArray('d', ntimes * nfreqs) for st in names
+        }
+    shared_counts = mp.RawArray('d', ntimes * nfreqs)
+
+    edges = np.linspace(0, ntimes, n_shards + 1).astype(int)
+    tasks = [
+        (jobs, start, stop, dt, edges[i], edges[i + 1], names, bp_corr)
+        for i in range(n_shards)
+        if edges[i + 1] > edges[i]
+    ]
+    bar = ProgressBar(
+        valmax=len(tasks),
+        title='Averaging ({} processes)...'.format(n_procs)
+        ) if progress else None
+
+    pool = mp.Pool(
+        processes=n_procs,
+        initializer=_init_worker,
+        initargs=(shared_sums, shared_counts, shape, backend)
+        )
+    try:
+        for _ in pool.imap_unordered(_average_shard, tasks):
+            if bar is not None:
+                bar.update()
+    finally:
+        pool.close()
+        pool.join()
+
+    sums = {
+        st: np.frombuffer(shared_sums[st], dtype=np.float64).reshape(shape)
+        for st in names
+        }
+    counts = np.frombuffer(shared_counts, dtype=np.float64).reshape(shape)
+    return sums[stokes] if isinstance(stokes, str) else sums, counts
+# ============================================================= #
+
+
+# ============================================================= #
+# -------------------------- Workers -------------------------- #
+# ============================================================= #
+def _init_worker(shared_sums, shared_counts, shape, backend=None):
+    """ Attach the shared output arrays to the worker process.
+    """
+    _worker['sums'] = {
+        st: np.frombuffer(shared, dtype=np.float64).reshape(shape)
+        for st, shared in shared_sums.items()
+        }
+    _worker['counts'] = np.frombuffer(
+        shared_counts,
+        dtype=np.float64
+        ).reshape(shape)
+    _worker['pool'] = LanePool(backend=backend)
+    return
+
+
+def _average_shard(task):
+    """ Accumulate the output time bins `first` to `last` of
+        every lane selection. Lanes may share an output
+        frequency bin, they are therefore processed by the same
+        worker whereas shards cover disjoint rows of the shared
+        arrays, no locking is required.
+    """
+    jobs, start, stop, dt, first, last, stokes, bp_corr = task
+    t_min = start + first * dt
+    t_max = min(stop, start + last * dt)
+
+    for sfile, plan, fgroups, fbins in jobs:
+        lane = _worker['pool'].get(sfile)
+
+        # Only read the blocks overlapping the shard
+        b0, b1 = plan['blocks']
+        b0 = max(
+            b0,
+            np.searchsorted(lane._timestamps, t_min, side='right') - 1
+            )
+        b1 = min(
+            b1,
+            np.searchsorted(lane._timestamps, t_max, side='left')
+            )
+        if b1 <= b0:
+            continue
+
+        lane._accumulate(
+            sums={
+                st: sums[first:last] for st, sums in _worker['sums'].items()
+                },
+            counts=_worker['counts'][first:last],
+            plan=dict(plan, blocks=(b0, b1)),
+            fgroups=fgroups,
+            fbins=fbins,
+            start=start,
+            stop=t_max,
+            dt=dt,
+            stokes=stokes,
+            bp_corr=bp_corr,
+            first=first
+            )
+    return
+# ============================================================= #
+
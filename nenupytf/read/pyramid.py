@@ -0,0 +1,478 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    *******
+    Pyramid
+    *******
+
+    Quick-looks of a whole observation do not need the native
+    resolution. :func:`build_pyramid` reads the lane files once
+    and writes successively downsampled versions of the dynamic
+    spectrum of each beam and Stokes parameter: level `0`
+    holds one spectrum per time block, at the native frequency
+    resolution, and each following level halves both the time
+    and frequency resolutions. The mean is always stored, the
+    minimum and maximum optionally.
+
+    :class:`Pyramid` maps those levels and serves a request
+    from the coarsest level that still satisfies the required
+    time and frequency resolutions.
+
+    By default the pyramid is written in a ``'nenupytf_pyramid'``
+    sub-directory of the observation, where :class:`.Spectrum`
+    finds it (see :func:`.Spectrum.quicklook`).
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'Pyramid',
+    'build_pyramid'
+    ]
+
+
+import os
+import os.path as path
+import json
+import numpy as np
+
+from nenupytf.stokes import SpecData
+from nenupytf.other import TimeAxis, chunk_bytes, ProgressBar
+
+
+# Version of the pyramid format
+pyramid_version = 1
+
+# Name of the pyramid directory within an observation
+pyramid_name = 'nenupytf_pyramid'
+
+# Name of the manifest file
+manifest_name = 'manifest.json'
+
+# Kind of directory described by the manifest
+manifest_kind = 'pyramid'
+
+
+# ============================================================= #
+# ----------------------- build_pyramid ----------------------- #
+# ============================================================= #
+def build_pyramid(repo, output=None, stokes=None, beams=None,
+        bp_corr=True, levels=None, min_size=64, minmax=False):
+    """ Build the multi-resolution pyramid of an observation in
+        a single pass over the lane files.
+
+        Parameters
+        ----------
+        repo : str or `ObsRepo`
+            Observation directory or object.
+        output : str
+            Pyramid directory. Default: `None`, a
+            ``'nenupytf_pyramid'`` sub-directory of `repo`.
+        stokes : str or list
+            Stokes parameters. Default: `None`, `['I']`.
+        beams : list
+            Beam indices. Default: `None`, every recorded beam.
+        bp_corr : bool or str
+            Bandpass correction, see :func:`.Lane.select`.
+        levels : int
+            Number of levels. Default: `None`, levels are added
+            as long as both dimensions keep at least `min_size`
+            elements.
+        min_size : int
+            Minimal number of time or frequency bins of the
+            coarsest level if `levels` is `None`.
+        minmax : bool
+            Also store the minimum and maximum of each bin.
+
+        Returns
+        -------
+        pyramid : `Pyramid`
+            Built pyramid, also attached to `repo` if written at
+            the default location.
+    """
+    from nenupytf.read import ObsRepo
+    if isinstance(repo, str):
+        repo = ObsRepo(repo)
+    default_output = output is None
+    if stokes is None:
+        stokes = ['I']
+    elif isinstance(stokes, str):
+        stokes = [stokes]
+    if output is None:
+        output = path.join(repo.repo, pyramid_name)
+    os.makedirs(output, exist_ok=True)
+    if beams is None:
+        beams = np.unique(repo.desctab['beam'])
+    stats = ['mean', 'min', 'max'] if minmax else ['mean']
+
+    manifest = {
+        'kind': manifest_kind,
+        'version': pyramid_version,
+        'stokes': list(stokes),
+        'bp_corr': bp_corr,
+        'stats': stats,
+        'dtype': 'float32',
+        'beams': {}
+        }
+
+    for beam in beams:
+        with repo._beam_lanes(beam) as (lanes, plans):
+            ref = lanes[0]
+            nffte = int(ref.nffte)
+            freqs = np.concatenate([p['freqs'] for p in plans])
+            edges = np.cumsum([0] + [p['freqs'].size for p in plans])
+            n_blocks = ref._timestamps.size
+            nlevels = levels
+            if nlevels is None:
+                nlevels = 1
+                while (n_blocks >> nlevels >= min_size) and\
+                    (freqs.size >> nlevels >= min_size):
+                    nlevels += 1
+
+            # Axes of each level
+            bdir = path.join(output, 'b{}'.format(beam))
+            os.makedirs(bdir, exist_ok=True)
+            times = ref._timestamps + 0.5 * nffte * ref.dt
+            level_freqs = freqs
+            info = []
+            for k in range(nlevels):
+                if k > 0:
+                    times = _halve_axis(times)
+                    level_freqs = _halve_axis(level_freqs)
+                np.save(path.join(bdir, 'L{}_time.npy'.format(k)), times)
+                np.save(path.join(bdir, 'L{}_freq.npy'.format(k)), level_freqs)
+                info.append({
+                    'nt': int(times.size),
+                    'nf': int(level_freqs.size),
+                    'dt': float(ref.block_dt * 2**k),
+                    'df': float(ref.df * 2**k)
+                    })
+                if min(times.size, level_freqs.size) <= 1:
+                    break
+            nlevels = len(info)
+            manifest['beams'][str(beam)] = {'levels': info}
+
+            # Chunks of blocks aligned on the coarsest level
+            align = 2**(nlevels - 1)
+            step = chunk_bytes // (nffte * freqs.size * 4 * len(stokes))
+            step = max(align, step // align * align)
+            bar = ProgressBar(
+                valmax=int(np.ceil(n_blocks / step)),
+                title='Pyramid of beam {}...'.format(beam)
+                )
+            buffers = {}
+            files = {}
+            for st in stokes:
+                os.makedirs(path.join(bdir, st), exist_ok=True)
+                buffers[st] = np.empty((step * nffte, freqs.size), dtype='float32')
+                for k in range(nlevels):
+                    for stat in stats:
+                        files[(st, k, stat)] = open(
+                            path.join(bdir, st, _level_name(k, stat)),
+                            'wb'
+                            )
+            try:
+                for k0 in range(0, n_blocks, step):
+                    k1 = min(k0 + step, n_blocks)
+                    data = {
+                        st: buf[:(k1 - k0) * nffte] for st, buf in buffers.items()
+                        }
+                    # Every Stokes parameter from a single read
+                    for l, p, e0, e1 in zip(lanes, plans, edges[:-1], edges[1:]):
+                        l._read(
+                            plan=dict(
+                                p,
+                                blocks=(k0, k1),
+                                samples=(0, (k1 - k0) * nffte)
+                                ),
+                            stokes=list(stokes),
+                            bp_corr=bp_corr,
+                            out={st: d[:, e0:e1] for st, d in data.items()}
+                            )
+                    for st in stokes:
+                        cube = data[st].reshape((k1 - k0, nffte, freqs.size))
+                        current = {
+                            stat: _reducers[stat](cube, axis=1)
+                            for stat in stats
+                            }
+                        for k in range(nlevels):
+                            if k > 0:
+                                current = {
+                                    stat: _halve(current[stat], _reducers[stat])
+                                    for stat in stats
+                                    }
+                            for stat in stats:
+                                current[stat].astype('float32').tofile(
+                                    files[(st, k, stat)]
+                                    )
+                    bar.update()
+            finally:
+                for f in files.values():
+                    f.close()
+
+    tmp = path.join(output, manifest_name + '.tmp')
+    with open(tmp, 'w') as wf:
+        json.dump(manifest, wf, indent=1)
+    os.replace(tmp, path.join(output, manifest_name))
+    pyramid = Pyramid(output)
+    if default_output:
+        repo.pyramid = pyramid
+    return pyramid
+# ============================================================= #
+
+
+# ============================================================= #
+# -------------------------- Pyramid -------------------------- #
+# ============================================================= #
+class Pyramid(object):
+    """ Reader of a multi-resolution pyramid written by
+        :func:`build_pyramid`.
+
+        Parameters
+        ----------
+        directory : str
+            Pyramid directory, containing the manifest.
+
+        Attributes
+        ----------
+        manifest : dict
+            Description of the pyramid
+    """
+
+    def __init__(self, directory):
+        self.directory = path.abspath(directory)
+        self.manifest = _read_manifest(self.directory)
+        if (self.manifest is None) or (self.manifest.get('kind') != manifest_kind):
+            raise ValueError(
+                'Not a pyramid: {}'.format(self.directory)
+                )
+        if self.manifest.get('version') != pyramid_version:
+            raise ValueError(
+                'Unsupported pyramid version'
+                )
+        self._axes = {}
+
+
+    def __str__(self):
+        return 'Pyramid: beams {}, Stokes {}, {}'.format(
+            self.beams,
+            self.stokes,
+            self.directory
+            )
+
+
+    # --------------------------------------------------------- #
+    # --------------------- Getter/Setter --------------------- #
+    @property
+    def beams(self):
+        """ Beam indices
+        """
+        return sorted(int(b) for b in self.manifest['beams'])
+
+
+    @property
+    def stokes(self):
+        """ Stokes parameters
+        """
+        return self.manifest['stokes']
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    @classmethod
+    def find(cls, directory):
+        """ Open the pyramid of an observation if there is one.
+
+            Parameters
+            ----------
+            directory : str
+                Pyramid directory or observation directory
+                containing a ``'nenupytf_pyramid'`` pyramid.
+
+            Returns
+            -------
+            pyramid : `Pyramid` or `None`
+        """
+        for d in [directory, path.join(directory, pyramid_name)]:
+            manifest = _read_manifest(d)
+            if (manifest is not None) and (manifest.get('kind') == manifest_kind):
+                return cls(d)
+        return None
+
+
+    def levels(self, beam):
+        """ Description (`'nt'`, `'nf'`, `'dt'`, `'df'`) of each
+            level of a beam, from the finest to the coarsest.
+        """
+        try:
+            return self.manifest['beams'][str(beam)]['levels']
+        except KeyError:
+            raise ValueError(
+                'Beam {} not in the pyramid'.format(beam)
+                )
+
+
+    def level(self, beam, dt=None, df=None):
+        """ Index of the coarsest level whose resolutions are
+            at least as fine as `dt` (s) and `df` (MHz), the
+            finest level if none is.
+        """
+        best = 0
+        for k, info in enumerate(self.levels(beam)):
+            if (dt is not None) and (info['dt'] > dt):
+                break
+            if (df is not None) and (info['df'] > df):
+                break
+            best = k
+        return best
+
+
+    def query(self, stokes='I', beam=0, time=None, freq=None,
+            dt=None, df=None, stat='mean'):
+        """ Read a time-frequency window from the coarsest
+            suitable level.
+
+            Parameters
+            ----------
+            stokes : str
+                Stokes parameter (case-insensitive)
+            beam : int
+                Beam index
+            time : list
+                Length-2 list of unix times. Default: `None`,
+                the whole observation.
+            freq : list
+                Length-2 list of frequencies in MHz. Default:
+                `None`, the whole band.
+            dt : float
+                Required time resolution in seconds
+            df : float
+                Required frequency resolution in MHz
+            stat : str
+                `'mean'`, `'min'` or `'max'`
+
+            Returns
+            -------
+            spec : `SpecData`
+        """
+        name = self._stored_name(stokes)
+        if name is None:
+            raise ValueError(
+                'Stokes {} not in the pyramid'.format(stokes)
+                )
+        if stat not in self.manifest['stats']:
+            raise ValueError(
+                'Statistic {} not in the pyramid'.format(stat)
+                )
+        k = self.level(beam, dt=dt, df=df)
+        times, freqs = self._level_axes(beam, k)
+        t0, t1 = (0, times.size) if time is None else\
+            np.searchsorted(times, time, side='left')
+        f0, f1 = (0, freqs.size) if freq is None else\
+            np.searchsorted(freqs, freq, side='left')
+        if (t1 <= t0) or (f1 <= f0):
+            raise ValueError(
+                'Empty selection, check parameter ranges'
+                )
+        return SpecData(
+            data=np.array(self._map(beam, name, k, stat)[t0:t1, f0:f1]),
+            time=TimeAxis.from_unix(times[t0:t1]),
+            freq=freqs[f0:f1],
+            stokes=stokes
+            )
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _stored_name(self, stokes):
+        """ Stored name of a Stokes parameter (case-insensitive),
+            `None` if it is not stored.
+        """
+        for name in self.stokes:
+            if name.lower() == stokes.lower():
+                return name
+        return None
+
+
+    def _level_axes(self, beam, k):
+        """ Times (unix, bin centers) and frequencies (MHz) of
+            the level `k` of a beam.
+        """
+        if (beam, k) not in self._axes:
+            bdir = path.join(self.directory, 'b{}'.format(beam))
+            self._axes[(beam, k)] = (
+                np.load(path.join(bdir, 'L{}_time.npy'.format(k))),
+                np.load(path.join(bdir, 'L{}_freq.npy'.format(k)))
+                )
+        return self._axes[(beam, k)]
+
+
+    def _map(self, beam, stokes, k, stat):
+        """ Memory map of a level
+        """
+        info = self.levels(beam)[k]
+        return np.memmap(
+            path.join(
+                self.directory,
+                'b{}'.format(beam),
+                stokes,
+                _level_name(k, stat)
+                ),
+            dtype=self.manifest['dtype'],
+            mode='r',
+            shape=(info['nt'], info['nf'])
+            )
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ Reductions ------------------------- #
+# ============================================================= #
+_reducers = {
+    'mean': np.mean,
+    'min': np.min,
+    'max': np.max
+    }
+
+
+def _halve(data, reducer):
+    """ Reduce a 2D array by a factor 2 along both axes,
+        dropping the last row / column if odd.
+    """
+    nt = data.shape[0] // 2
+    nf = data.shape[1] // 2
+    data = data[:2 * nt, :2 * nf].reshape((nt, 2, nf, 2))
+    return reducer(data, axis=(1, 3))
+
+
+def _halve_axis(axis):
+    """ Pairwise mean of a 1D axis, dropping the last element
+        if odd.
+    """
+    n = axis.size // 2
+    return axis[:2 * n].reshape((n, 2)).mean(axis=1)
+
+
+def _read_manifest(directory):
+    """ Manifest of a directory, `None` if there is none
+    """
+    fname = path.join(directory, manifest_name)
+    if not path.isfile(fname):
+        return None
+    with open(fname, 'r') as rf:
+        return json.load(rf)
+
+
+def _level_name(k, stat):
+    """ File name of the level `k` of a statistic
+    """
+    return 'L{}_{}.bin'.format(k, stat)
+# ============================================================= #
+
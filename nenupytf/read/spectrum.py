@@ -74,7 +74,22 @@
     within the Fourier domain. ``bp_corr='median'`` correction
     allows for most reduced aretfacts. However, the latter may
     significantly alter the signal if the dynamic spectrum is not
-    relatively smooth, use with caution! 
+    relatively smooth, use with caution! The median bandpass is
+    computed once per lane file and beam, over time blocks spread
+    along the whole observation, and cached next to the data
+    (see :func:`Spectrum.calibrate` and :func:`.Lane.bandpass`).
+
+
+    **Converted observations**
+
+    An observation may be rewritten once as time-frequency tiles
+    with :func:`.convert`. Selections are then read from the
+    tiles instead of the lane files, as long as the requested
+    Stokes parameter, beam and bandpass correction were stored:
+
+    >>> from nenupytf.read import convert
+    >>> convert(spectrum, stokes=['I', 'V'])
+    >>> spec = spectrum.select(stokes='V', freq=[54, 55])
 """
 
 
@@ -89,11 +104,17 @@ __all__ = [
     ]
 
 
-from nenupytf.read import ObsRepo, Lane
+from nenupytf.read import ObsRepo
+from nenupytf.read import sharded_average
 from nenupytf.stokes import SpecData
-from nenupytf.other import to_unix, ProgressBar
+from nenupytf.other import TimeAxis, to_unix, ProgressBar
+from nenupytf.other import allocate, reserved_bytes
 
 import numpy as np
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, monotonic
 
 
 # ============================================================= #
@@ -110,14 +131,19 @@ class Spectrum(ObsRepo):
         :param directory: Directory where observation files are
             stored
         :type directory: str, optional
+        :param backend: I/O backend reading the lane files,
+            `'memmap'` (default), `'pread'` (large reads, better
+            suited to network file systems) or a
+            :class:`.IOBackend` instance
+        :type backend: str, :class:`.IOBackend`, optional
 
         :Example:
         >>> from nenupytf.read import Spectrum
         >>> s = Spectrum('/path/to/observation/')
     """
 
-    def __init__(self, directory=''):
-        super().__init__(repo=directory)
+    def __init__(self, directory='', backend=None):
+        super().__init__(repo=directory, backend=backend)
         self.beam = None
         self.freq = None
         self.time = None
@@ -152,8 +178,11 @@ class Spectrum(ObsRepo):
     def beam(self, b):
         if b is None:
             b = self.desctab['beam'][0]
+        if b not in self.desctab['beam']:
+            raise ValueError(
+                'Beam {} not recorded'.format(b)
+                )
         self._beam = b
-        self._bmask = (self.desctab['beam'] == b)
         return
 
 
@@ -184,12 +213,10 @@ class Spectrum(ObsRepo):
         return self._time.copy()
     @time.setter
     def time(self, t):
-        tmin = self.desctab['tmin']
-        tmax = self.desctab['tmax']
         if t is None:
             t = [
-                    tmin.min(),
-                    tmax.max()
+                    self.desctab['tmin'].min(),
+                    self.desctab['tmax'].max()
                 ]
         else:
             t = [to_unix(ti).unix for ti in t]
@@ -198,8 +225,6 @@ class Spectrum(ObsRepo):
                 'time should be a length 2 list'
                 )
         self._time = t
-        self._tmask = ((tmin <= t[0]) * (t[0] <= tmax)) +\
-            ((t[0] <= tmin) * (tmin <= t[1]))
         return
 
 
@@ -211,7 +236,8 @@ class Spectrum(ObsRepo):
             specific keyword arguments in :func:`select()` and
             :func:`average()`.
 
-            Default value is `[obs_fmin, obs_fmax]`
+            Default value is `[obs_fmin, obs_fmax]` of the
+            selected :attr:`Spectrum.beam`
 
             :setter: Length-2 list defining the selected frequency
                 range: `[freq_min, freq_max]` where `freq_min`
@@ -230,26 +256,23 @@ class Spectrum(ObsRepo):
         return self._freq.copy()
     @freq.setter
     def freq(self, f):
-        fmin = self.desctab['fmin']
-        fmax = self.desctab['fmax']
         if f is None:
+            bmask = self.desctab['beam'] == self.beam
             f = [
-                    fmin.min(),
-                    fmax.max()
+                    self.desctab['fmin'][bmask].min(),
+                    self.desctab['fmax'][bmask].max()
                 ]
         if len(f) != 2:
             raise IndexError(
                 'freq should be a length 2 list'
                 )
         self._freq = f
-        self._fmask = ((fmin <= f[0]) * (f[0] <= fmax)) +\
-            ((f[0] <= fmin) * (fmin <= f[1]))
         return
 
 
     # --------------------------------------------------------- #
     # ------------------------ Methods ------------------------ #
-    def select(self, stokes='I', bp_corr=True, **kwargs):
+    def select(self, stokes='I', bp_corr=True, n_workers=1, dtype=None, **kwargs):
         r""" Select among the data stored in the directory 
             according to a :attr:`Spectrum.time` range, a
             :attr:`Spectrum.freq` range and a 
@@ -267,8 +290,10 @@ class Spectrum(ObsRepo):
             :param stokes:
                 Stokes parameter value to convert raw data to,
                 allowed values are `{'I', 'Q', 'U', 'V', 'fracV',
-                'XX', 'YY'}`, defaults to `'I'`
-            :type stokes: str, optional
+                'XX', 'YY'}`, defaults to `'I'`. A list of
+                Stokes parameters may be given, they are then all
+                computed from a single read of the data.
+            :type stokes: str, list, optional
             :param bp_corr:
                 Compute the bandpass correction, defaults to
                 `True`, possible values are 
@@ -276,10 +301,24 @@ class Spectrum(ObsRepo):
                 * `False`: do not compute any correction
                 * `True`: compute the correction with Kaiser
                 coefficients
-                * `'median'`: compute a medianed correction
+                * `'median'`: apply the median bandpass of the
+                observation (see :func:`calibrate()`)
                 * `'fft'`: correct the bandpass using FFT
 
             :type bp_corr: bool, str, optional
+            :param n_workers:
+                Number of threads reading the lane files
+                concurrently, each of them writing directly in
+                its own frequency columns of the output array.
+                `None` lets :class:`ThreadPoolExecutor` choose,
+                defaults to `1` (sequential reading)
+            :type n_workers: int, optional
+            :param dtype:
+                Data type of the selected data, `'float32'` or
+                `'float64'`, defaults to `None` (`'float64'` for
+                the `'fft'` bandpass correction, `'float32'`
+                otherwise)
+            :type dtype: str, optional
             :param \**kwargs:
                 See below for keyword arguments:
             :param freq:
@@ -294,8 +333,10 @@ class Spectrum(ObsRepo):
             :type beam: int, optional
 
             :returns: `SpecData` object, embedding the stacked
-                averaged spectra
-            :rtype: :class:`.SpecData`
+                averaged spectra, or dictionary of `SpecData`
+                objects (keyed by Stokes parameter) if `stokes`
+                is a list
+            :rtype: :class:`.SpecData`, dict
 
             :Example:
             
@@ -306,6 +347,8 @@ class Spectrum(ObsRepo):
                     freq=[34.5, 40],
                     stokes='I'
                 )
+            >>> specs = s.select(stokes=['I', 'V', 'fracV'])
+            >>> specs['V'].data
 
             .. seealso:: :func:`average()` :class:`.SpecData`
             .. warning:: This may take a significant time to
@@ -314,39 +357,328 @@ class Spectrum(ObsRepo):
         """
         self._parameters(**kwargs)
 
-        mask = self._bmask * self._fmask * self._tmask
-        if all(~mask):
-            raise ValueError(
-                'Empty selection, check parameter ranges'
+        if self._stored(stokes, bp_corr):
+            return self.store.select(
+                stokes=stokes,
+                time=self.time,
+                freq=self.freq,
+                beam=self.beam
             )
 
-        for f in self.desctab[mask]['file']:
-            l = Lane(f)
-            
-            if not 'spec' in locals():
-                spec = l.select(
-                    stokes=stokes,
-                    time=[to_unix(t).isot for t in self.time],
-                    freq=self.freq,
-                    beam=self.beam,
-                    bp_corr=bp_corr
-                )
-
+        with self._lane_plans() as (lanes, plans):
+            # Each lane fills its own frequency columns, outputs
+            # beyond the memory budget are backed by temporary files
+            names = [stokes] if isinstance(stokes, str) else list(stokes)
+            edges = np.cumsum([0] + [p['freqs'].size for p in plans])
+            t0, t1 = plans[0]['samples']
+            nt = t1 - t0
+            if dtype is None:
+                dtype = np.float64 if bp_corr == 'fft' else np.float32
+            data = allocate(
+                names=names,
+                shape=(nt, edges[-1]),
+                dtype=dtype
+            )
+            if (n_workers is None) or (n_workers > 1):
+                concurrency = len(lanes) if n_workers is None else\
+                    min(n_workers, len(lanes))
             else:
-                # We assume here that the time is the same,
-                # only frequency is spread over different lanes.
-                # This will concatenate spectra from different
-                # lanes:
-                spec = spec & l.select(
-                    stokes=stokes,
-                    time=[to_unix(t).isot for t in self.time],
-                    freq=self.freq,
-                    beam=self.beam,
-                    bp_corr=bp_corr
+                concurrency = 1
+            tasks = [
+                partial(
+                    l._read_chunked,
+                    plan=p,
+                    stokes=names,
+                    bp_corr=bp_corr,
+                    out={st: data[st][:, edges[i]:edges[i + 1]] for st in names},
+                    reserved=reserved_bytes(data),
+                    concurrency=concurrency
                 )
+                for i, (l, p) in enumerate(zip(lanes, plans))
+            ]
+            if (n_workers is None) or (n_workers > 1):
+                with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                    futures = [pool.submit(task) for task in tasks]
+                    for future in futures:
+                        future.result()
+            else:
+                for task in tasks:
+                    task()
+
+            b0, b1 = plans[0]['blocks']
+            t0, t1 = plans[0]['samples']
+            times = lanes[0]._get_time(id_min=b0, id_max=b1)[t0:t1]
+            freqs = np.concatenate([p['freqs'] for p in plans])
+        specs = {
+            st: SpecData(
+                data=data[st],
+                time=times,
+                freq=freqs,
+                stokes=st
+            )
+            for st in names
+        }
+        return specs[stokes] if isinstance(stokes, str) else specs
+
+
+    def iter_chunks(
+            self,
+            time_chunk=60.,
+            overlap=0.,
+            stokes='I',
+            bp_corr=True,
+            dtype=None,
+            sk=False,
+            **kwargs
+        ):
+        r""" Walk through the selection (see :func:`select()`)
+            by consecutive chunks of time, so that arbitrarily
+            long recordings may be processed with a constant
+            memory footprint (e.g. RFI flagging, dedispersion or
+            export pipelines).
+
+            Each chunk stacks the lane files in frequency, as
+            :func:`select()` does. Its data are views of buffers
+            reused from one chunk to the next, copy them if they
+            need to be kept. Chunks read from the :attr:`store`
+            are new arrays. Chunks are cut at the gaps between
+            time blocks (see :attr:`.Lane.segments`), a chunk
+            following a gap does not overlap the previous one.
+
+            :param time_chunk:
+                Duration of the data of each chunk in seconds,
+                defaults to `60.`
+            :type time_chunk: int, float, optional
+            :param overlap:
+                Duration in seconds of the data of the previous
+                chunk repeated at the beginning of each chunk
+                (e.g. for filters), defaults to `0.`
+            :type overlap: int, float, optional
+            :param stokes:
+                Stokes parameter or list of Stokes parameters,
+                see :func:`select()`, defaults to `'I'`
+            :type stokes: str, list, optional
+            :param bp_corr:
+                Bandpass correction, see :func:`select()`,
+                defaults to `True`
+            :type bp_corr: bool, str, optional
+            :param dtype:
+                Data type, see :func:`select()`, defaults to
+                `None`
+            :type dtype: str, optional
+            :param sk:
+                Also compute the spectral kurtosis of the raw
+                time blocks, see :func:`.Lane.iter_chunks`
+                (not available for chunks read from the
+                :attr:`store`), defaults to `False`
+            :type sk: bool, optional
+            :param \**kwargs:
+                `time`, `freq` and `beam` selection, see
+                :func:`select()`.
+
+            :returns: Generator of `SpecData` objects, or of
+                dictionaries of `SpecData` objects (keyed by
+                Stokes parameter) if `stokes` is a list
+            :rtype: generator
+
+            :Example:
 
-            del l
-        return spec
+            >>> from nenupytf.read import Spectrum
+            >>> s = Spectrum('/path/to/observation/')
+            >>> for chunk in s.iter_chunks(time_chunk=10., freq=[54, 56]):
+                    print(chunk.time[0], chunk.data.mean())
+
+            .. seealso:: :func:`select()` :func:`.Lane.iter_chunks`
+        """
+        self._parameters(**kwargs)
+        beam = self.beam
+        time = self.time.copy()
+        freq = self.freq.copy()
+
+        if self._stored(stokes, bp_corr) and not sk:
+            yield from self.store.iter_chunks(
+                stokes=stokes,
+                time=time,
+                freq=freq,
+                beam=beam,
+                time_chunk=time_chunk,
+                overlap=overlap
+            )
+            return
+
+        with self._lane_plans() as (lanes, plans):
+            names = [stokes] if isinstance(stokes, str) else list(stokes)
+            edges = np.cumsum([0] + [p['freqs'].size for p in plans])
+            freqs = np.concatenate([p['freqs'] for p in plans])
+            if dtype is None:
+                dtype = np.float64 if bp_corr == 'fft' else np.float32
+
+            chunks = lanes[0]._chunk_samples(plans[0], time_chunk, overlap)
+            n_max = max(s1 - s0 for s0, s1 in chunks)
+            buffers = allocate(
+                names=names,
+                shape=(n_max, edges[-1]),
+                dtype=dtype
+            )
+            meta = {}
+            if sk:
+                sk_buf = allocate(
+                    names=['sk'],
+                    shape=(n_max, edges[-1], 2),
+                    dtype='float32',
+                    reserved=reserved_bytes(buffers)
+                )['sk']
+                meta['sk_mn'] = (lanes[0].nffte, lanes[0].nfft2int)
+
+            for s0, s1 in chunks:
+                if sk:
+                    meta['sk'] = sk_buf[:s1 - s0]
+                for i, (l, p) in enumerate(zip(lanes, plans)):
+                    l._read(
+                        plan=l._subplan(p, s0, s1),
+                        stokes=names,
+                        bp_corr=bp_corr,
+                        out={
+                            st: buf[:s1 - s0, edges[i]:edges[i + 1]]
+                            for st, buf in buffers.items()
+                        },
+                        sk=None if not sk else meta['sk'][:, edges[i]:edges[i + 1]]
+                    )
+                sub = lanes[0]._subplan(plans[0], s0, s1)
+                t0, t1 = sub['samples']
+                times = lanes[0]._get_time(*sub['blocks'])[t0:t1]
+                specs = {
+                    st: SpecData(
+                        data=buffers[st][:s1 - s0],
+                        time=times,
+                        freq=freqs,
+                        stokes=st,
+                        **meta
+                    )
+                    for st in names
+                }
+                yield specs[stokes] if isinstance(stokes, str) else specs
+
+
+    def follow(
+            self,
+            stokes='I',
+            bp_corr=True,
+            poll=1.,
+            timeout=None,
+            max_blocks=None,
+            from_start=False,
+            dtype=None,
+            **kwargs
+        ):
+        r""" Monitor an observation while it is being recorded.
+            The lane files of the selection are polled (see
+            :func:`.Lane.refresh`) and the time blocks written
+            in all of them since the previous call are yielded,
+            stacked in frequency, as soon as they are complete.
+
+            :param stokes:
+                Stokes parameter or list of Stokes parameters,
+                see :func:`select()`, defaults to `'I'`
+            :type stokes: str, list, optional
+            :param bp_corr:
+                Bandpass correction, see :func:`select()`,
+                defaults to `True`
+            :type bp_corr: bool, str, optional
+            :param poll:
+                Time in seconds between two checks of the file
+                sizes, it bounds the latency, defaults to `1.`
+            :type poll: int, float, optional
+            :param timeout:
+                Stop once no new block has been written for
+                `timeout` seconds, defaults to `None` (follow
+                forever)
+            :type timeout: int, float, optional
+            :param max_blocks:
+                Maximal number of time blocks yielded at once,
+                defaults to `None` (every new block)
+            :type max_blocks: int, optional
+            :param from_start:
+                Also yield the blocks already recorded, defaults
+                to `False`
+            :type from_start: bool, optional
+            :param dtype:
+                Data type, see :func:`select()`, defaults to
+                `None`
+            :type dtype: str, optional
+            :param \**kwargs:
+                `freq` and `beam` selection, see :func:`select()`.
+
+            :returns: Generator of `SpecData` objects, or of
+                dictionaries of `SpecData` objects (keyed by
+                Stokes parameter) if `stokes` is a list
+            :rtype: generator
+
+            :Example:
+
+            >>> from nenupytf.read import Spectrum
+            >>> s = Spectrum('/path/to/ongoing/observation/')
+            >>> for spec in s.follow(freq=[54, 56], timeout=60):
+                    print(spec.time[-1].isot, spec.data.mean())
+
+            .. seealso:: :func:`.ObsRepo.refresh` to update the
+                observation description
+        """
+        self._parameters(**kwargs)
+        with self._lane_plans() as (lanes, plans):
+            names = [stokes] if isinstance(stokes, str) else list(stokes)
+            edges = np.cumsum([0] + [p['freqs'].size for p in plans])
+            freqs = np.concatenate([p['freqs'] for p in plans])
+            if dtype is None:
+                dtype = np.float64 if bp_corr == 'fft' else np.float32
+            nffte = lanes[0].nffte
+
+            k0 = plans[0]['blocks'][0] if from_start else\
+                min(l._timestamps.size for l in lanes)
+            last = monotonic()
+            while True:
+                for l in lanes:
+                    l.refresh()
+                # Blocks written in every lane file
+                k1 = min(l._timestamps.size for l in lanes)
+                if k1 > k0:
+                    if max_blocks is not None:
+                        k1 = min(k1, k0 + max_blocks)
+                    data = {
+                        st: np.empty(((k1 - k0) * nffte, edges[-1]), dtype=dtype)
+                        for st in names
+                    }
+                    for i, (l, p) in enumerate(zip(lanes, plans)):
+                        l._read(
+                            plan=dict(
+                                p,
+                                blocks=(k0, k1),
+                                samples=(0, (k1 - k0) * nffte)
+                            ),
+                            stokes=names,
+                            bp_corr=bp_corr,
+                            out={
+                                st: d[:, edges[i]:edges[i + 1]]
+                                for st, d in data.items()
+                            }
+                        )
+                    times = lanes[0]._get_time(id_min=k0, id_max=k1)
+                    specs = {
+                        st: SpecData(
+                            data=data[st],
+                            time=times,
+                            freq=freqs,
+                            stokes=st
+                        )
+                        for st in names
+                    }
+                    yield specs[stokes] if isinstance(stokes, str) else specs
+                    k0 = k1
+                    last = monotonic()
+                    continue
+                if (timeout is not None) and (monotonic() - last > timeout):
+                    return
+                sleep(poll)
 
 
     def average(
@@ -355,21 +687,32 @@ class Spectrum(ObsRepo):
             df=1.,
             dt=1.,
             bp_corr=True,
+            n_procs=1,
             **kwargs
         ):
         r""" Average in time and frequency *NenuFAR/UnDySPuTeD*
             high rate time-frequency data.
 
-            Data are read by time blocks of size `dt` before
-            averaging by computing the mean over time. Then, the
-            spectrum is rebinned to a reconstructed frequency
-            axis with spaces around `df`.
+            Each lane file is read only once, by large chunks of
+            time blocks. Every chunk is converted to the required
+            Stokes parameter and reduced onto the output grid
+            (time bins of size `dt` and a reconstructed frequency
+            axis with spaces around `df`) before the next one is
+            read, so that the processing time is mostly bound by
+            the disk throughput.
+
+            With `n_procs` > 1, the output time bins are split
+            into shards averaged by a pool of processes (see
+            :func:`.sharded_average`), each one mapping the files
+            independently and writing its shard in shared memory.
 
             :param stokes:
                 Stokes parameter value to convert raw data to,
                 allowed values are `{'I', 'Q', 'U', 'V', 'fracV',
-                'XX', 'YY'}`, defaults to `'I'`
-            :type stokes: str, optional
+                'XX', 'YY'}`, defaults to `'I'`. A list of
+                Stokes parameters may be given, they are then all
+                computed from a single read of the data.
+            :type stokes: str, list, optional
             :param df:
                 Frequency resolution in MHz on which the
                 averaging is performed, defaults to `1.`
@@ -385,10 +728,15 @@ class Spectrum(ObsRepo):
                 * `False`: do not compute any correction
                 * `True`: compute the correction with Kaiser
                     coefficients
-                * `'median'`: compute a medianed correction
+                * `'median'`: apply the median bandpass of the
+                observation (see :func:`calibrate()`)
                 * `'fft'`: correct the bandpass using FFT
 
             :type bp_corr: bool, str, optional
+            :param n_procs:
+                Number of worker processes, `None` uses every
+                CPU, defaults to `1` (single process)
+            :type n_procs: int, optional
             :param \**kwargs:
                 See below for keyword arguments:
             :param freq:
@@ -403,8 +751,11 @@ class Spectrum(ObsRepo):
             :type beam: int, optional
 
             :returns: `SpecData` object, embedding the stacked
-                averaged spectra
-            :rtype: :class:`.SpecData`
+                averaged spectra, or dictionary of `SpecData`
+                objects (keyed by Stokes parameter) if `stokes`
+                is a list. Their weights are the number of
+                samples of each bin, empty bins are flagged
+            :rtype: :class:`.SpecData`, dict
 
             :Example:
             
@@ -430,47 +781,294 @@ class Spectrum(ObsRepo):
         beam = self.beam
         freq = self.freq.copy()
         time = self.time.copy()
-        
         start, stop = time
 
-        # Predefined array
-        ntimes = int(np.ceil((stop - start)/dt))
-        nfreqs = int((freq[1]-freq[0])/df)
-        avg_data = np.zeros(
-            (ntimes, nfreqs)
-        )
-        avg_time = np.zeros(ntimes)
-        avg_freq = np.zeros(nfreqs)
-        i = 0
-        bar = ProgressBar(
-            valmax=ntimes,
-            title='Averaging...')
-        while start < stop - dt:
-            tmp_spec = self.select(
+        if self._stored(stokes, bp_corr):
+            return self.store.average(
                 stokes=stokes,
-                time=[start, start+dt],
+                time=time,
                 freq=freq,
                 beam=beam,
-                bp_corr=bp_corr,
-            ).tmean().frebin((freq[1]-freq[0])/df)
-            avg_data[i, :] = tmp_spec.amp
-            avg_time[i] = start + dt/2
-            avg_freq = tmp_spec.freq
-            i += 1
-            start += dt
-            bar.update()
-        spec = SpecData(
-            data=avg_data,
-            time=to_unix(avg_time),
-            freq=avg_freq,
-            stokes=stokes
+                dt=dt,
+                df=df
             )
 
-        return spec
+        segments = self._segments(
+            beam=beam,
+            time=time,
+            freq=freq
+            )
+        if segments.size == 0:
+            raise ValueError(
+                'Empty selection, check parameter ranges'
+            )
+
+        # Resolve the selection on each lane file
+        with self.pool.pinned(segments['file']) as lanes:
+            plans = [
+                l._plan(
+                    time=[start, stop],
+                    freq=freq.copy(),
+                    beam=beam
+                )
+                for l in lanes
+            ]
+            order = np.argsort([p['freqs'][0] for p in plans])
+
+            # Output frequency bins, shared among the lanes
+            freqs = np.concatenate([plans[i]['freqs'] for i in order])
+            nfreqs = min(max(int((freq[1] - freq[0])/df), 1), freqs.size)
+            slices = np.linspace(0, freqs.size, nfreqs + 1).astype(int)
+            avg_freq = np.add.reduceat(freqs, slices[:-1]) / np.diff(slices)
+
+            ntimes = int(np.ceil((stop - start)/dt))
+
+            # Output frequency bins covered by each lane
+            jobs = []
+            col = 0
+            for i in order:
+                ncols = plans[i]['freqs'].size
+                bins = np.searchsorted(
+                    slices,
+                    col + np.arange(ncols),
+                    side='right'
+                ) - 1
+                fgroups = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+                jobs.append((lanes[i], plans[i], fgroups, bins[fgroups]))
+                col += ncols
+
+            names = [stokes] if isinstance(stokes, str) else list(stokes)
+            if (n_procs is None) or (n_procs > 1):
+                if bp_corr == 'median':
+                    # Computed once, before the workers load it
+                    for l in lanes:
+                        l.bandpass(beam=beam)
+                # Time shards processed by a pool of processes
+                sums, counts = sharded_average(
+                    jobs=[(l.sfile, p, fg, fb) for l, p, fg, fb in jobs],
+                    ntimes=ntimes,
+                    nfreqs=nfreqs,
+                    start=start,
+                    stop=stop,
+                    dt=dt,
+                    stokes=names,
+                    bp_corr=bp_corr,
+                    n_procs=n_procs,
+                    backend=self.pool.backend
+                )
+            else:
+                # Single pass over each lane file
+                sums = allocate(names, (ntimes, nfreqs), 'float64', zeros=True)
+                counts = allocate(
+                    ['counts'],
+                    (ntimes, nfreqs),
+                    'float64',
+                    zeros=True,
+                    reserved=reserved_bytes(sums)
+                )
+                counts = counts['counts']
+                nchunks = 0
+                for l, p, _, _ in jobs:
+                    b0, b1 = p['blocks']
+                    c0, c1 = p['beamlets']
+                    nchunks += int(np.ceil((b1 - b0)/l._chunk_blocks(c1 - c0)))
+                bar = ProgressBar(
+                    valmax=nchunks,
+                    title='Averaging...')
+                for l, p, fgroups, fbins in jobs:
+                    l._accumulate(
+                        sums=sums,
+                        counts=counts,
+                        plan=p,
+                        fgroups=fgroups,
+                        fbins=fbins,
+                        start=start,
+                        stop=stop,
+                        dt=dt,
+                        stokes=names,
+                        bp_corr=bp_corr,
+                        bar=bar
+                    )
+
+        empty = counts == 0
+        specs = {}
+        for st in names:
+            avg_data = sums[st]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                np.divide(avg_data, counts, out=avg_data)
+            specs[st] = SpecData(
+                data=avg_data,
+                time=TimeAxis(
+                    start=start + 0.5 * dt,
+                    step=dt,
+                    size=ntimes
+                    ),
+                freq=avg_freq,
+                mask=empty if empty.any() else None,
+                weights=counts,
+                stokes=st
+                )
+
+        return specs[stokes] if isinstance(stokes, str) else specs
+
+
+    def quicklook(self, stokes='I', df=None, dt=None, stat='mean', **kwargs):
+        r""" Read a quick-look dynamic spectrum from the
+            multi-resolution :attr:`pyramid` of the observation
+            (see :func:`.build_pyramid`), at the coarsest level
+            whose resolution is at least `dt` and `df`.
+
+            :param stokes:
+                Stokes parameter, defaults to `'I'`
+            :type stokes: str, optional
+            :param df:
+                Required frequency resolution in MHz, defaults
+                to `None` (coarsest level)
+            :type df: int, float, optional
+            :param dt:
+                Required time resolution in seconds, defaults
+                to `None` (coarsest level)
+            :type dt: int, float, optional
+            :param stat:
+                Statistic within each bin, `'mean'`, `'min'`
+                or `'max'`, defaults to `'mean'`
+            :type stat: str, optional
+            :param \**kwargs:
+                `time`, `freq` and `beam` selection, see
+                :func:`select()`.
+
+            :returns: `SpecData` object
+            :rtype: :class:`.SpecData`
+
+            :Example:
+
+            >>> from nenupytf.read import Spectrum, build_pyramid
+            >>> s = Spectrum('/path/to/observation/')
+            >>> build_pyramid(s)
+            >>> spec = s.quicklook(dt=1., df=0.2)
+        """
+        if self.pyramid is None:
+            raise ValueError(
+                'No pyramid found, see build_pyramid()'
+            )
+        self._parameters(**kwargs)
+        return self.pyramid.query(
+            stokes=stokes,
+            beam=self.beam,
+            time=self.time,
+            freq=self.freq,
+            dt=dt,
+            df=df,
+            stat=stat
+        )
+
+
+    def calibrate(self, beams=None, n_blocks=256, overwrite=False):
+        r""" Compute the median bandpass of every lane file
+            and beam, used by the `bp_corr='median'` correction
+            of :func:`select()` and :func:`average()`. Each
+            bandpass is cached next to its lane file, so that
+            this only needs to be done once per observation.
+            Otherwise, bandpasses are computed on first use.
+
+            :param beams:
+                Beam indices, defaults to `None` (every beam)
+            :type beams: list, optional
+            :param n_blocks:
+                Number of time blocks sampled in each lane file,
+                defaults to `256`
+            :type n_blocks: int, optional
+            :param overwrite:
+                Recompute cached bandpasses, defaults to `False`
+            :type overwrite: bool, optional
+
+            :Example:
+
+            >>> from nenupytf.read import Spectrum
+            >>> s = Spectrum('/path/to/observation/')
+            >>> s.calibrate()
+            >>> spec = s.select(bp_corr='median')
+
+            .. seealso:: :func:`.Lane.bandpass`
+        """
+        if self.files.size == 0:
+            raise ValueError(
+                'No lane file to calibrate'
+            )
+        if beams is None:
+            beams = np.unique(self.desctab['beam'])
+        for f in np.unique(self.files):
+            with self.pool.pinned([f]) as (l,):
+                for b in np.intersect1d(beams, l._beams):
+                    l.bandpass(
+                        beam=int(b),
+                        n_blocks=n_blocks,
+                        overwrite=overwrite
+                    )
+        return
 
 
     # --------------------------------------------------------- #
     # ----------------------- Internal ------------------------ #
+    @contextmanager
+    def _lane_plans(self):
+        """ Resolve the current selection on each lane file,
+            sorted by frequency. The lanes are pinned in
+            :attr:`pool` until the end of the context.
+        """
+        segments = self._segments(
+            beam=self.beam,
+            time=self.time,
+            freq=self.freq
+            )
+        if segments.size == 0:
+            raise ValueError(
+                'Empty selection, check parameter ranges'
+            )
+
+        with self.pool.pinned(segments['file']) as lanes:
+            # Resolve the selection on each lane file
+            plans = [
+                l._plan(
+                    time=self.time,
+                    freq=self.freq,
+                    beam=self.beam
+                )
+                for l in lanes
+            ]
+            order = np.argsort([p['freqs'][0] for p in plans])
+            lanes = [lanes[i] for i in order]
+            plans = [plans[i] for i in order]
+
+            # We assume here that the time is the same, only
+            # frequency is spread over different lanes.
+            nsamples = set(p['samples'][1] - p['samples'][0] for p in plans)
+            if len(nsamples) != 1:
+                raise ValueError(
+                    'Lanes do not share the same time samples'
+                )
+            yield lanes, plans
+
+
+    def _stored(self, stokes, bp_corr):
+        """ Whether the selection should be read from the
+            tiled :attr:`store` rather than from the lane files.
+        """
+        if self.store is None:
+            return False
+        if self.store.covers(stokes, self.beam, bp_corr):
+            return True
+        if self.files.size == 0:
+            raise ValueError(
+                'Stokes {} (bp_corr={}) of beam {} not stored'.format(
+                    stokes,
+                    bp_corr,
+                    self.beam
+                )
+            )
+        return False
+
+
     def _parameters(self, **kwargs):
         """ Read the selection parameters
         """
@@ -0,0 +1,732 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    *********
+    TileStore
+    *********
+
+    In the '*.spectra' files, both polarizations (`fft0` and
+    `fft1`) of every beamlet are interleaved within each time
+    block. Any selection, however narrow in frequency or
+    restricted to a single Stokes parameter, therefore reads
+    strided bytes spread over the whole file.
+
+    :func:`convert` rewrites an observation once into a store
+    of time-frequency tiles: for each beam and each Stokes
+    parameter, the `(time, frequency)` array is cut into tiles
+    of a fixed number of samples and channels, saved as
+    plain binary files (optionally compressed with `zlib`).
+    A JSON manifest describes the tiling, alongside the
+    frequencies and the block start times of each beam. :class:`TileStore` reads them back, only
+    opening the tiles overlapping a selection.
+
+    By default the store is written in a ``'nenupytf_store'``
+    sub-directory of the observation, where :class:`.Spectrum`
+    automatically finds and uses it.
+"""
+
+
+__author__ = ['Alan Loh']
+__copyright__ = 'Copyright 2019, nenupytf'
+__credits__ = ['Alan Loh']
+__maintainer__ = 'Alan Loh'
+__email__ = 'alan.loh@obspm.fr'
+__status__ = 'Production'
+__all__ = [
+    'TileStore',
+    'convert'
+    ]
+
+
+import os
+import os.path as path
+import json
+import zlib
+import numpy as np
+
+from nenupytf.stokes import SpecData
+from nenupytf.other import TimeAxis, bin_accumulate, ProgressBar
+
+
+# Version of the store format
+store_version = 1
+
+# Name of the store directory within an observation
+store_name = 'nenupytf_store'
+
+# Name of the manifest file
+manifest_name = 'manifest.json'
+
+# Kind of directory described by the manifest
+manifest_kind = 'store'
+
+
+# ============================================================= #
+# -------------------------- convert -------------------------- #
+# ============================================================= #
+def convert(repo, output=None, stokes=None, beams=None, bp_corr=True,
+        tile=(4096, 256), compression=None):
+    """ Convert the '*.spectra' files of an observation into a
+        tiled store.
+
+        Parameters
+        ----------
+        repo : str or `ObsRepo`
+            Observation directory or object.
+        output : str
+            Store directory. Default: `None`, a
+            ``'nenupytf_store'`` sub-directory of `repo`.
+        stokes : str or list
+            Stokes parameters to store. Default: `None`,
+            `['I']`.
+        beams : list
+            Beam indices to store. Default: `None`, every
+            recorded beam.
+        bp_corr : bool or str
+            Bandpass correction applied before storing, see
+            :func:`.Lane.select`.
+        tile : tuple
+            Number of time samples and frequency channels of a
+            tile. The time size is rounded up to a multiple of
+            the number of samples per block.
+        compression : str
+            `None` or `'zlib'`.
+
+        Returns
+        -------
+        store : `TileStore`
+            Converted store, also attached to `repo` if written
+            at the default location.
+    """
+    from nenupytf.read import ObsRepo
+    if isinstance(repo, str):
+        repo = ObsRepo(repo)
+    default_output = output is None
+    if compression not in [None, 'zlib']:
+        raise ValueError(
+            'Unknown compression {}'.format(compression)
+            )
+    if stokes is None:
+        stokes = ['I']
+    elif isinstance(stokes, str):
+        stokes = [stokes]
+    if output is None:
+        output = path.join(repo.repo, store_name)
+    os.makedirs(output, exist_ok=True)
+
+    tab = repo.desctab
+    if beams is None:
+        beams = np.unique(tab['beam'])
+
+    manifest = {
+        'kind': manifest_kind,
+        'version': store_version,
+        'stokes': list(stokes),
+        'bp_corr': bp_corr,
+        'compression': compression,
+        'dtype': 'float32',
+        'beams': {}
+        }
+
+    for beam in beams:
+        rows = tab[tab['beam'] == beam]
+        with repo._beam_lanes(beam) as (lanes, plans):
+            ref = lanes[0]
+            freqs = np.concatenate([p['freqs'] for p in plans])
+            edges = np.cumsum([0] + [p['freqs'].size for p in plans])
+            nfreqs = freqs.size
+            nsamples = ref._timestamps.size * int(ref.nffte)
+            tile_t = int(np.ceil(tile[0] / ref.nffte) * ref.nffte)
+            tile_f = int(tile[1])
+
+            bdir = path.join(output, 'b{}'.format(beam))
+            os.makedirs(bdir, exist_ok=True)
+            np.save(path.join(bdir, 'freq.npy'), freqs)
+            np.save(path.join(bdir, 'time.npy'), ref._timestamps)
+
+            manifest['beams'][str(beam)] = {
+                'nsamples': int(nsamples),
+                'nfreqs': int(nfreqs),
+                'tile': [tile_t, tile_f],
+                'dt': float(ref.dt),
+                'df': float(ref.df),
+                'nffte': int(ref.nffte),
+                # Runs of contiguous samples (first sample, size)
+                'segments': [
+                    [int(s['block'] * ref.nffte), int(s['nblocks'] * ref.nffte)]
+                    for s in ref.segments
+                    ],
+                'lanes': [
+                    [int(r['lane']), float(r['fmin']), float(r['fmax'])]
+                    for r in rows
+                    ]
+                }
+
+            block_step = tile_t // ref.nffte
+            n_blocks = ref._timestamps.size
+            bar = ProgressBar(
+                valmax=int(np.ceil(n_blocks / block_step)),
+                title='Converting beam {}...'.format(beam)
+                )
+            buffers = {}
+            for st in stokes:
+                os.makedirs(path.join(bdir, st), exist_ok=True)
+                buffers[st] = np.empty((tile_t, nfreqs), dtype='float32')
+            for it, k0 in enumerate(range(0, n_blocks, block_step)):
+                k1 = min(k0 + block_step, n_blocks)
+                data = {
+                    st: buf[:(k1 - k0) * ref.nffte] for st, buf in buffers.items()
+                    }
+                # Every Stokes parameter from a single read
+                for l, p, e0, e1 in zip(lanes, plans, edges[:-1], edges[1:]):
+                    l._read(
+                        plan=dict(
+                            p,
+                            blocks=(k0, k1),
+                            samples=(0, (k1 - k0) * ref.nffte)
+                            ),
+                        stokes=list(stokes),
+                        bp_corr=bp_corr,
+                        out={st: d[:, e0:e1] for st, d in data.items()}
+                        )
+                for st in stokes:
+                    for jf, c0 in enumerate(range(0, nfreqs, tile_f)):
+                        _write_tile(
+                            fname=path.join(bdir, st, _tile_name(it, jf)),
+                            data=data[st][:, c0:c0 + tile_f],
+                            compression=compression
+                            )
+                bar.update()
+
+    tmp = path.join(output, manifest_name + '.tmp')
+    with open(tmp, 'w') as wf:
+        json.dump(manifest, wf, indent=1)
+    os.replace(tmp, path.join(output, manifest_name))
+    store = TileStore(output)
+    if default_output:
+        repo.store = store
+    return store
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------- TileStore ------------------------- #
+# ============================================================= #
+class TileStore(object):
+    """ Reader of a tiled store written by :func:`convert`.
+
+        Parameters
+        ----------
+        directory : str
+            Store directory, containing the manifest.
+
+        Attributes
+        ----------
+        manifest : dict
+            Description of the store
+    """
+
+    def __init__(self, directory):
+        self.directory = path.abspath(directory)
+        self.manifest = _read_manifest(self.directory)
+        if (self.manifest is None) or (self.manifest.get('kind') != manifest_kind):
+            raise ValueError(
+                'Not a tile store: {}'.format(self.directory)
+                )
+        if self.manifest.get('version') != store_version:
+            raise ValueError(
+                'Unsupported store version'
+                )
+        self._freqs = {}
+        self._times = {}
+
+
+    def __str__(self):
+        return 'TileStore: beams {}, Stokes {}, {}'.format(
+            self.beams,
+            self.stokes,
+            self.directory
+            )
+
+
+    # --------------------------------------------------------- #
+    # --------------------- Getter/Setter --------------------- #
+    @property
+    def beams(self):
+        """ Stored beam indices
+        """
+        return sorted(int(b) for b in self.manifest['beams'])
+
+
+    @property
+    def stokes(self):
+        """ Stored Stokes parameters
+        """
+        return self.manifest['stokes']
+
+
+    @property
+    def bp_corr(self):
+        """ Bandpass correction applied before storing
+        """
+        return self.manifest['bp_corr']
+
+
+    # --------------------------------------------------------- #
+    # ------------------------ Methods ------------------------ #
+    @classmethod
+    def find(cls, directory):
+        """ Open the store of an observation if there is one.
+
+            Parameters
+            ----------
+            directory : str
+                Store directory or observation directory
+                containing a ``'nenupytf_store'`` store.
+
+            Returns
+            -------
+            store : `TileStore` or `None`
+        """
+        for d in [directory, path.join(directory, store_name)]:
+            manifest = _read_manifest(d)
+            if (manifest is not None) and (manifest.get('kind') == manifest_kind):
+                return cls(d)
+        return None
+
+
+    def covers(self, stokes, beam, bp_corr=True):
+        """ Whether a selection (of one or several Stokes
+            parameters) can be served by the store.
+        """
+        names = [stokes] if isinstance(stokes, str) else stokes
+        return all(self._stored_name(st) is not None for st in names) and\
+            (beam in self.beams) and\
+            (bp_corr == self.bp_corr)
+
+
+    def desctab(self):
+        """ Segment table of the stored data, with the same
+            fields as :attr:`.ObsRepo.desctab`.
+        """
+        desc_list = []
+        for b in self.beams:
+            info = self._beam(b)
+            tmin, tmax = self._time_range(b)
+            for lane, fmin, fmax in info['lanes']:
+                desc_list.append(
+                    (lane, b, tmin, tmax, fmin, fmax, 0, 0, '')
+                    )
+        dtype = [
+            ('lane', 'u4'),
+            ('beam', 'u4'),
+            ('tmin', 'f8'),
+            ('tmax', 'f8'),
+            ('fmin', 'f8'),
+            ('fmax', 'f8'),
+            ('cmin', 'u4'),
+            ('cmax', 'u4'),
+            ('file', 'U1')
+            ]
+        d = np.array(desc_list, dtype=dtype)
+        return np.sort(d, order=['beam', 'fmin', 'tmin'])
+
+
+    def select(self, stokes='I', time=None, freq=None, beam=0):
+        """ Select stored data.
+
+            Parameters
+            ----------
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters
+            time : list
+                Length-2 list of unix times. Default: `None`,
+                the whole stored time range.
+            freq : list
+                Length-2 list of frequencies in MHz. Default:
+                `None`, the whole stored band.
+            beam : int
+                Beam index
+
+            Returns
+            -------
+            spec : `SpecData` or dict
+                Dictionary of `SpecData` if `stokes` is a list
+        """
+        if not isinstance(stokes, str):
+            # Each Stokes parameter is stored in its own tiles
+            return {
+                st: self.select(stokes=st, time=time, freq=freq, beam=beam)
+                for st in stokes
+                }
+        s0, s1, c0, c1 = self._plan(time=time, freq=freq, beam=beam)
+        return self._spec(stokes, beam, s0, s1, c0, c1)
+
+
+    def iter_chunks(self, stokes='I', time=None, freq=None, beam=0,
+            time_chunk=60., overlap=0.):
+        """ Walk through a selection by consecutive chunks of
+            `time_chunk` seconds, cut as :func:`.Spectrum.iter_chunks`
+            cuts the lane files: the same number of samples per
+            chunk, chunks never spanning a gap between time
+            blocks.
+
+            Parameters
+            ----------
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters
+            time : list
+                Length-2 list of unix times. Default: `None`,
+                the whole stored time range.
+            freq : list
+                Length-2 list of frequencies in MHz. Default:
+                `None`, the whole stored band.
+            beam : int
+                Beam index
+            time_chunk : float
+                Duration of each chunk in seconds
+            overlap : float
+                Duration in seconds of the data of the previous
+                chunk repeated at the beginning of each chunk
+
+            Yields
+            ------
+            spec : `SpecData` or dict
+                Dictionary of `SpecData` if `stokes` is a list
+        """
+        info = self._beam(beam)
+        if time_chunk < info['dt']:
+            raise ValueError(
+                'Time chunk < {} sec'.format(info['dt'])
+                )
+        if overlap < 0:
+            raise ValueError(
+                'Negative overlap'
+                )
+        s0, s1, c0, c1 = self._plan(time=time, freq=freq, beam=beam)
+        step = int(round(time_chunk / info['dt']))
+        ovl = int(round(overlap / info['dt']))
+        starts = np.array(info['segments'])[:, 0]
+        starts = starts[(starts > s0) & (starts < s1)]
+        bounds = np.concatenate(([s0], starts, [s1]))
+        for r0, r1 in zip(bounds[:-1], bounds[1:]):
+            for k in range(r0, r1, step):
+                k0, k1 = max(r0, k - ovl), min(k + step, r1)
+                if isinstance(stokes, str):
+                    yield self._spec(stokes, beam, k0, k1, c0, c1)
+                else:
+                    yield {
+                        st: self._spec(st, beam, k0, k1, c0, c1)
+                        for st in stokes
+                        }
+
+
+    def average(self, stokes='I', time=None, freq=None, beam=0, dt=1., df=1.):
+        """ Average stored data, with the same binning as
+            :func:`.Spectrum.average`.
+
+            Parameters
+            ----------
+            stokes : str or list
+                Stokes parameter, or list of Stokes parameters
+            time : list
+                Length-2 list of unix times. Default: `None`,
+                the whole stored time range.
+            freq : list
+                Length-2 list of frequencies in MHz. Default:
+                `None`, the whole stored band.
+            beam : int
+                Beam index
+            dt : float
+                Time resolution in seconds
+            df : float
+                Frequency resolution in MHz
+
+            Returns
+            -------
+            spec : `SpecData` or dict
+                Dictionary of `SpecData` if `stokes` is a list
+        """
+        if not isinstance(stokes, str):
+            return {
+                st: self.average(
+                    stokes=st,
+                    time=time,
+                    freq=freq,
+                    beam=beam,
+                    dt=dt,
+                    df=df
+                    )
+                for st in stokes
+                }
+        time, freq = self._ranges(time, freq, beam)
+        s0, s1, c0, c1 = self._plan(time=time, freq=freq, beam=beam)
+        start, stop = time
+        freqs = self.frequencies(beam)[c0:c1]
+        nfreqs = min(max(int((freq[1] - freq[0])/df), 1), freqs.size)
+        slices = np.linspace(0, freqs.size, nfreqs + 1).astype(int)
+        avg_freq = np.add.reduceat(freqs, slices[:-1]) / np.diff(slices)
+        bins = np.searchsorted(slices, np.arange(freqs.size), side='right') - 1
+        fgroups = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+
+        ntimes = int(np.ceil((stop - start)/dt))
+        sums = np.zeros((ntimes, nfreqs))
+        counts = np.zeros((ntimes, nfreqs))
+
+        tile_t = self._beam(beam)['tile'][0]
+        for k0 in range(s0, s1, tile_t):
+            k1 = min(k0 + tile_t, s1)
+            times = self._unix(beam, k0, k1)
+            tbins = np.floor((times - start) / dt).astype(int)
+            tbins[times >= stop] = -1
+            bin_accumulate(
+                sums=sums,
+                counts=counts,
+                data=self.read(beam, stokes, k0, k1, c0, c1),
+                tbins=tbins,
+                fgroups=fgroups,
+                fbins=bins[fgroups]
+                )
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_data = sums / counts
+
+        return SpecData(
+            data=avg_data,
+            time=TimeAxis(
+                start=start + 0.5 * dt,
+                step=dt,
+                size=ntimes
+                ),
+            freq=avg_freq,
+            mask=counts == 0 if (counts == 0).any() else None,
+            weights=counts,
+            stokes=stokes
+            )
+
+
+    def read(self, beam, stokes, s0, s1, c0, c1):
+        """ Read the samples `s0` to `s1` and channels `c0` to
+            `c1` of a stored Stokes parameter, opening only the
+            overlapping tiles.
+
+            Returns
+            -------
+            data : np.ndarray
+                `(s1 - s0, c1 - c0)` array
+        """
+        info = self._beam(beam)
+        tile_t, tile_f = info['tile']
+        data = np.empty((s1 - s0, c1 - c0), dtype=self.manifest['dtype'])
+        if data.size == 0:
+            return data
+        name = self._stored_name(stokes)
+        if name is None:
+            raise ValueError(
+                'Stokes {} not stored'.format(stokes)
+                )
+        sdir = path.join(self.directory, 'b{}'.format(beam), name)
+        for it in range(s0 // tile_t, (s1 - 1) // tile_t + 1):
+            t_lo = it * tile_t
+            rows = min(tile_t, info['nsamples'] - t_lo)
+            r0 = max(s0 - t_lo, 0)
+            r1 = min(s1 - t_lo, rows)
+            for jf in range(c0 // tile_f, (c1 - 1) // tile_f + 1):
+                f_lo = jf * tile_f
+                cols = min(tile_f, info['nfreqs'] - f_lo)
+                q0 = max(c0 - f_lo, 0)
+                q1 = min(c1 - f_lo, cols)
+                tile = self._read_tile(
+                    fname=path.join(sdir, _tile_name(it, jf)),
+                    cols=cols,
+                    r0=r0,
+                    r1=r1
+                    )
+                data[
+                    t_lo + r0 - s0:t_lo + r1 - s0,
+                    f_lo + q0 - c0:f_lo + q1 - c0
+                    ] = tile[:, q0:q1]
+        return data
+
+
+    def frequencies(self, beam):
+        """ Stored frequencies (MHz) of a beam
+        """
+        if beam not in self._freqs:
+            self._freqs[beam] = np.load(
+                path.join(self.directory, 'b{}'.format(beam), 'freq.npy')
+                )
+        return self._freqs[beam]
+
+
+    def timestamps(self, beam):
+        """ Unix start times of the stored time blocks of a beam
+        """
+        if beam not in self._times:
+            self._times[beam] = np.load(
+                path.join(self.directory, 'b{}'.format(beam), 'time.npy')
+                )
+        return self._times[beam]
+
+
+    # --------------------------------------------------------- #
+    # ----------------------- Internal ------------------------ #
+    def _spec(self, stokes, beam, s0, s1, c0, c1):
+        """ `SpecData` of the samples `s0` to `s1` and channels
+            `c0` to `c1` of a stored Stokes parameter
+        """
+        return SpecData(
+            data=self.read(beam, stokes, s0, s1, c0, c1),
+            time=self._taxis(beam, s0, s1),
+            freq=self.frequencies(beam)[c0:c1],
+            stokes=stokes
+            )
+
+
+    def _stored_name(self, stokes):
+        """ Stored name of a Stokes parameter (case-insensitive),
+            `None` if it is not stored.
+        """
+        for name in self.stokes:
+            if name.lower() == stokes.lower():
+                return name
+        return None
+
+
+    def _beam(self, beam):
+        """ Manifest entry of a beam
+        """
+        try:
+            return self.manifest['beams'][str(beam)]
+        except KeyError:
+            raise ValueError(
+                'Beam {} not stored'.format(beam)
+                )
+
+
+    def _ranges(self, time, freq, beam):
+        """ Time and frequency ranges of a selection, `None`
+            standing for the whole stored range of the beam.
+        """
+        if time is None:
+            time = list(self._time_range(beam))
+        if freq is None:
+            freqs = self.frequencies(beam)
+            freq = [freqs[0], freqs[-1] + self._beam(beam)['df']]
+        return time, freq
+
+
+    def _plan(self, time, freq, beam):
+        """ Sample and channel ranges of a selection
+        """
+        time, freq = self._ranges(time, freq, beam)
+        freqs = self.frequencies(beam)
+        c0, c1 = np.searchsorted(freqs, freq, side='left')
+        s0, s1 = [self._t2sidx(beam, t) for t in time]
+        if (c1 <= c0) or (s1 <= s0):
+            raise ValueError(
+                'Empty selection, check parameter ranges'
+                )
+        return s0, s1, int(c0), int(c1)
+
+
+    def _t2sidx(self, beam, time):
+        """ Number of stored samples occuring before `time`
+        """
+        info = self._beam(beam)
+        timestamps = self.timestamps(beam)
+        block = np.searchsorted(timestamps, time, side='right') - 1
+        if block < 0:
+            return 0
+        offset = np.searchsorted(
+            timestamps[block] + np.arange(info['nffte']) * info['dt'],
+            time,
+            side='left'
+            )
+        return int(block * info['nffte'] + offset)
+
+
+    def _unix(self, beam, s0, s1):
+        """ Unix times of the samples `s0` to `s1`
+        """
+        info = self._beam(beam)
+        blocks, offsets = np.divmod(np.arange(s0, s1), info['nffte'])
+        return self.timestamps(beam)[blocks] + offsets * info['dt']
+
+
+    def _taxis(self, beam, s0, s1):
+        """ Time axis of the samples `s0` to `s1`, regular if
+            they belong to the same segment of contiguous blocks.
+        """
+        info = self._beam(beam)
+        segments = np.array(info['segments'])
+        seg = np.searchsorted(segments[:, 0], s0, side='right') - 1
+        if s1 <= segments[seg].sum():
+            return TimeAxis(
+                start=self._unix(beam, s0, s0 + 1)[0],
+                step=info['dt'],
+                size=s1 - s0
+                )
+        return TimeAxis(unix=self._unix(beam, s0, s1))
+
+
+    def _time_range(self, beam):
+        """ Unix time range covered by a beam
+        """
+        info = self._beam(beam)
+        timestamps = self.timestamps(beam)
+        return timestamps[0], timestamps[-1] + info['nffte'] * info['dt']
+
+
+    def _read_tile(self, fname, cols, r0, r1):
+        """ Read the rows `r0` to `r1` of a tile
+        """
+        dtype = np.dtype(self.manifest['dtype'])
+        if self.manifest['compression'] == 'zlib':
+            with open(fname, 'rb') as rf:
+                tile = np.frombuffer(
+                    zlib.decompress(rf.read()),
+                    dtype=dtype
+                    )
+            return tile.reshape((-1, cols))[r0:r1]
+        # Tiles are stored row-major, only the needed rows are read
+        with open(fname, 'rb') as rf:
+            rf.seek(r0 * cols * dtype.itemsize)
+            tile = np.fromfile(rf, dtype=dtype, count=(r1 - r0) * cols)
+        return tile.reshape((r1 - r0, cols))
+# ============================================================= #
+
+
+# ============================================================= #
+# ---------------------- Manifest / Tiles --------------------- #
+# ============================================================= #
+def _read_manifest(directory):
+    """ Manifest of a directory, `None` if there is none
+    """
+    fname = path.join(directory, manifest_name)
+    if not path.isfile(fname):
+        return None
+    with open(fname, 'r') as rf:
+        return json.load(rf)
+
+
+def _tile_name(it, jf):
+    """ File name of the tile `it` in time, `jf` in frequency
+    """
+    return 't{:06d}_f{:04d}.tile'.format(it, jf)
+
+
+def _write_tile(fname, data, compression=None):
+    """ Write a tile, row-major
+    """
+    data = np.ascontiguousarray(data)
+    with open(fname, 'wb') as wf:
+        if compression == 'zlib':
+            wf.write(zlib.compress(data.tobytes()))
+        else:
+            data.tofile(wf)
+    return
+# ============================================================= #
+
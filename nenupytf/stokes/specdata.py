@@ -7,7 +7,14 @@
     SpecData
     ********
 
-    Test de docstring
+    Dynamic spectra may carry a mask of flagged samples (e.g.
+    from :func:`.flag`) and weights (e.g. the number of samples
+    averaged in each bin by :func:`.Spectrum.average`). The mask
+    is stored bit-packed along frequency (one bit per sample),
+    the reductions (:meth:`SpecData.tmean`,
+    :meth:`SpecData.fmean`, :meth:`SpecData.frebin`) are
+    weighted sums ignoring the flagged samples and return the
+    summed weights of each bin.
 """
 
 
@@ -22,21 +29,37 @@ __all__ = [
     ]
 
 
-from astropy.time import Time
 import numpy as np
 
+from nenupytf.other import TimeAxis, to_unix
+
+
+# Number of set bits of each byte value, to count the flagged
+# samples without unpacking the mask
+_popcount = np.array([bin(i).count('1') for i in range(256)], dtype='uint8')
+
 
 # ============================================================= #
 # ------------------------- SpecData -------------------------- #
 # ============================================================= #
 class SpecData(object):
     """ A class to handle dynamic spectrum data
+
+        The time axis is stored as a compact :class:`.TimeAxis`
+        (:attr:`taxis`) of unix times, the `astropy.time.Time`
+        object (:attr:`time`) is only computed when requested.
+
+        Flagged samples (:attr:`mask`) are ignored, and the
+        samples are weighted by :attr:`weights`, in the time and
+        frequency reductions.
     """
 
-    def __init__(self, data, time, freq, **kwargs):
+    def __init__(self, data, time, freq, mask=None, weights=None, **kwargs):
         self.time = time
         self.freq = freq
         self.data = data
+        self.mask = mask
+        self.weights = weights
         self.meta = kwargs
 
 
@@ -58,18 +81,25 @@ class SpecData(object):
                     )
 
         if self.freq.max() < other.freq.min():
-            new_data = np.hstack((self.data, other.data))
-            new_time = self.time
-            new_freq = np.concatenate((self.freq, other.freq))
+            parts = (self, other)
         else:
-            new_data = np.hstack((other.data, self.data))
-            new_time = self.time
-            new_freq = np.concatenate((other.freq, self.freq))
+            parts = (other, self)
+        new_data = np.hstack([p.data for p in parts])
+        new_time = self.taxis
+        new_freq = np.concatenate([p.freq for p in parts])
+        new_mask = None
+        if any(p._mask_bits is not None for p in parts):
+            new_mask = np.hstack([p._mask_or_zeros() for p in parts])
+        new_weights = None
+        if any(p.weights is not None for p in parts):
+            new_weights = np.hstack([p._weights_or_ones() for p in parts])
 
         return SpecData(
             data=new_data,
             time=new_time,
             freq=new_freq,
+            mask=new_mask,
+            weights=new_weights,
             stokes=self.meta['stokes']
             )
 
@@ -87,21 +117,28 @@ class SpecData(object):
                     'Inconsistent Stokes parameters'
                     )
 
-        if self.time.max() < other.time.min():
-            new_data = np.vstack((self.data, other.data))
-            new_time = Time(np.concatenate((self.time, other.time)))
-            new_freq = self.freq
+        if self.taxis.max() < other.taxis.min():
+            parts = (self, other)
         else:
-            new_data = np.vstack((other.data, self.data))
-            new_time = Time(np.concatenate((self.time, other.time)))
-            new_freq = self.freq
-
-        return SpecData(
+            parts = (other, self)
+        new_data = np.vstack([p.data for p in parts])
+        new_time = TimeAxis.concatenate([p.taxis for p in parts])
+        new_freq = self.freq
+        new_weights = None
+        if any(p.weights is not None for p in parts):
+            new_weights = np.vstack([p._weights_or_ones() for p in parts])
+
+        spec = SpecData(
             data=new_data,
             time=new_time,
             freq=new_freq,
+            weights=new_weights,
             stokes=self.meta['stokes']
             )
+        if any(p._mask_bits is not None for p in parts):
+            # Packed along frequency, rows are stacked as they are
+            spec._mask_bits = np.vstack([p._packed_or_zeros() for p in parts])
+        return spec
 
 
     def __add__(self, other):
@@ -114,12 +151,7 @@ class SpecData(object):
             self._check_value(other)
             add = other 
 
-        return SpecData(
-            data=self.amp + add,
-            time=self.time,
-            freq=self.freq,
-            stokes=self.meta['stokes']
-            )
+        return self._derived(self.amp + add, other)
 
 
     def __sub__(self, other):
@@ -132,12 +164,7 @@ class SpecData(object):
             self._check_value(other)
             sub = other 
 
-        return SpecData(
-            data=self.amp - sub,
-            time=self.time,
-            freq=self.freq,
-            stokes=self.meta['stokes']
-            )
+        return self._derived(self.amp - sub, other)
 
 
     def __mul__(self, other):
@@ -150,12 +177,7 @@ class SpecData(object):
             self._check_value(other)
             mul = other 
 
-        return SpecData(
-            data=self.amp * mul,
-            time=self.time,
-            freq=self.freq,
-            stokes=self.meta['stokes']
-            )
+        return self._derived(self.amp * mul, other)
 
 
     def __truediv__(self, other):
@@ -168,12 +190,7 @@ class SpecData(object):
             self._check_value(other)
             div = other 
 
-        return SpecData(
-            data=self.amp / div,
-            time=self.time,
-            freq=self.freq,
-            stokes=self.meta['stokes']
-            )
+        return self._derived(self.amp / div, other)
 
 
     # --------------------------------------------------------- #
@@ -184,7 +201,7 @@ class SpecData(object):
     @data.setter
     def data(self, d):
         ts, fs = d.shape
-        assert self.time.size == ts,\
+        assert self.taxis.size == ts,\
             'time axis inconsistent'
         assert self.freq.size == fs,\
             'frequency axis inconsistent'
@@ -192,29 +209,96 @@ class SpecData(object):
         return
 
 
+    @property
+    def mask(self):
+        """ Boolean mask of the flagged samples, `None` if no
+            sample is flagged. It is stored bit-packed along the
+            frequency axis, :attr:`nflagged` and the reductions
+            do not unpack it.
+        """
+        if self._mask_bits is None:
+            return None
+        return np.unpackbits(
+            self._mask_bits,
+            axis=1,
+            count=self.freq.size,
+            bitorder='little'
+            ).view(bool)
+    @mask.setter
+    def mask(self, m):
+        if m is None:
+            self._mask_bits = None
+            return
+        m = np.broadcast_to(np.asarray(m, dtype=bool), self._data.shape)
+        self._mask_bits = np.packbits(m, axis=1, bitorder='little')
+        return
+
+
+    @property
+    def weights(self):
+        """ Weight of each sample (e.g. number of averaged
+            samples), `None` for unit weights. Any array
+            broadcastable to the data shape is accepted.
+        """
+        return self._weights
+    @weights.setter
+    def weights(self, w):
+        if w is not None:
+            w = np.asarray(w)
+            np.broadcast_to(w, self._data.shape)
+        self._weights = w
+        return
+
+
+    @property
+    def nflagged(self):
+        """ Number of flagged samples
+        """
+        if self._mask_bits is None:
+            return 0
+        return int(_popcount[self._mask_bits].sum(dtype='int64'))
+
+
     @property
     def time(self):
-        return self._time
+        """ Time axis as an `astropy.time.Time` object,
+            computed on first access. It can be set with a
+            `astropy.time.Time` object, a :class:`.TimeAxis`
+            or an array of unix times.
+        """
+        return self._taxis.time
     @time.setter
     def time(self, t):
-        if not isinstance(t, Time):
-            raise TypeError('Time object expected')
-        self._time = t
+        self._taxis = TimeAxis.from_any(t)
         return
 
 
+    @property
+    def taxis(self):
+        """ Compact time axis (:class:`.TimeAxis`)
+        """
+        return self._taxis
+
+
+    @property
+    def unix(self):
+        """ Return unix times
+        """
+        return self._taxis.unix
+
+
     @property
     def mjd(self):
         """ Return MJD dates
         """
-        return self.time.mjd
+        return self._taxis.mjd
 
 
     @property
     def jd(self):
         """ Return JD dates
         """
-        return self.time.jd
+        return self._taxis.jd
 
 
     @property
@@ -250,48 +334,45 @@ class SpecData(object):
             Returns
             -------
             averaged_data : SpecData
-                A new `SpecData` instance containging the averaged quantities.
+                A new `SpecData` instance containging the averaged
+                quantities, whose weights are the summed weights
+                (number of unflagged samples for the median).
         """
-        if freq1 is None:
-            freq1 = self.freq.min()
-        else:
-            freq1 *= u.MHz
-        if freq2 is None:
-            freq2 = self.freq.max()
-        else:
-            freq2 *= u.MHz
+        freq1 = self.freq.min() if freq1 is None else freq1
+        freq2 = self.freq.max() if freq2 is None else freq2
         fmask = (self.freq >= freq1) & (self.freq <= freq2)
-        
-        data = self.data[:, fmask]
-        if clean:
-            # Find out the noisiest profiles
-            sigmas = np.std(data, axis=0)
-            max_sig = np.percentile(sigmas, 90, axis=1)
-            data = data[:, np.newaxis, sigmas < max_sig]
-
-            # Smoothin' the time profiles
-            from scipy.signal import savgol_filter
-            tf = np.zeros(data.shape)
-            for j in range(sigmas[sigmas < max_sig].size):
-                tf[:, i, j] = savgol_filter(data[:, j], 201, 1)
-
-            # Rescale everything not to bias the mean
-            data = tf - (np.median(tf, axis=0) - np.median(tf))
-
-        average = np.mean(data, axis=1)\
-            if method == 'mean'\
-            else np.median(data, axis=1)
+        f0, f1 = np.flatnonzero(fmask)[[0, -1]] + [0, 1]
 
+        average, weights = self._reduce(
+            rows=slice(None),
+            cols=slice(f0, f1),
+            axis=1,
+            method=method
+            )
         return SpecData(
-            data=np.expand_dims(average, axis=1),
-            time=self.time.copy(),
-            freq=np.expand_dims(np.mean(self.freq[fmask]), axis=0),
+            data=average[:, np.newaxis],
+            time=self.taxis,
+            freq=np.expand_dims(np.mean(self.freq[f0:f1]), axis=0),
+            mask=None if self._mask_bits is None else weights[:, np.newaxis] == 0,
+            weights=weights[:, np.newaxis],
             stokes=self.meta['stokes']
             )
 
 
     def frebin(self, bins):
-        """
+        """ Rebin the frequency axis in `bins` bins of (about)
+            the same number of channels.
+
+            Parameters
+            ----------
+            bins : int
+                Number of frequency bins.
+
+            Returns
+            -------
+            rebinned_data : SpecData
+                A new `SpecData` instance whose weights are the
+                summed weights of each bin.
         """
         bins = int(bins)
 
@@ -300,12 +381,31 @@ class SpecData(object):
             self.freq.size,
             bins + 1,
             True
-        ).astype(np.int)
+        ).astype(int)
         counts = np.diff(slices)
+        w = self._effective_weights()
+        if w is None:
+            wsum = np.broadcast_to(
+                counts.astype('float64'),
+                (self.taxis.size, bins)
+                )
+            dsum = np.add.reduceat(self.data, slices[:-1], axis=1, dtype='float64')
+        else:
+            wsum = np.add.reduceat(w, slices[:-1], axis=1, dtype='float64')
+            dsum = np.add.reduceat(
+                np.where(w > 0, self.data * w, 0),
+                slices[:-1],
+                axis=1,
+                dtype='float64'
+                )
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = dsum / wsum
         return SpecData(
-            data=np.expand_dims(np.add.reduceat(self.amp, slices[:-1]) / counts, axis=0),
-            time=self.time.copy(),
+            data=average,
+            time=self.taxis,
             freq=np.add.reduceat(self.freq, slices[:-1]) / counts,
+            mask=None if self._mask_bits is None else wsum == 0,
+            weights=wsum,
             stokes=self.meta['stokes']
             )
 
@@ -316,36 +416,37 @@ class SpecData(object):
             Parameters
             ----------
 
-            t1 : str
-                Lower time bound in ISO/ISOT format.
+            t1 : str or float
+                Lower time bound in ISO/ISOT format or unix.
 
-            t2 : str
-                Upper time bound in ISO/ISOT format.
+            t2 : str or float
+                Upper time bound in ISO/ISOT format or unix.
 
             Returns
             -------
 
             averaged_data : SpecData
-                A new `SpecData` instance containging the averaged quantities.
+                A new `SpecData` instance containging the averaged
+                quantities, whose weights are the summed weights
+                (number of unflagged samples for the median).
         """
-        if t1 is None:
-            t1 = self.time[0]
-        else:
-            t1 = np.datetime64(t1)
-        if t2 is None:
-            t2 = self.time[-1]
-        else:
-            t2 = np.datetime64(t2)
-        tmask = (self.time >= t1) & (self.time <= t2)
-        tmasked = self.time[tmask]
-        dt = (tmasked[-1] - tmasked[0])
-        average = np.mean(self.data[tmask, :], axis=0)\
-            if method == 'mean'\
-            else np.median(self.data[tmask, :], axis=0)
+        unix = self.unix
+        t1 = unix[0] if t1 is None else to_unix(t1).unix
+        t2 = unix[-1] if t2 is None else to_unix(t2).unix
+        tmask = (unix >= t1) & (unix <= t2)
+        tmasked = unix[tmask]
+        average, weights = self._reduce(
+            rows=tmask,
+            cols=slice(None),
+            axis=0,
+            method=method
+            )
         return SpecData(
             data=np.expand_dims(average, axis=0),
-            time=Time(np.array([tmasked[0] + dt/2.])),
+            time=np.array([(tmasked[0] + tmasked[-1]) / 2.]),
             freq=self.freq.copy(),
+            mask=None if self._mask_bits is None else weights[np.newaxis, :] == 0,
+            weights=weights[np.newaxis, :],
             stokes=self.meta['stokes']
             )
 
@@ -355,12 +456,14 @@ class SpecData(object):
         """
         specf = self.fmean(method='median')
         spect = self.tmean(method='median')
-        bkg = np.ones(self.amp.shape)
-        bkg *= specf.amp[:, np.newaxis] * spect.amp[np.newaxis, :]
+        bkg = np.ones(self.data.shape)
+        bkg *= specf.data * spect.data
         return SpecData(
             data=bkg,
-            time=self.time.copy(),
+            time=self.taxis,
             freq=self.freq.copy(),
+            mask=self.mask,
+            weights=self.weights,
             stokes=self.meta['stokes']
             )
 
@@ -387,8 +490,10 @@ class SpecData(object):
         filtered_data[:, :] = tf
         return SpecData(
             data=filtered_data,
-            time=self.time.copy(),
-            freq=self.freq.copy()
+            time=self.taxis,
+            freq=self.freq.copy(),
+            mask=self.mask,
+            weights=self.weights
             )
 
 
@@ -397,15 +502,108 @@ class SpecData(object):
         """
         bg = self.background()
         return SpecData(
-            data=self.amp,
-            time=self.time,
+            data=self.data,
+            time=self.taxis,
             freq=self.freq,
+            mask=self.mask,
+            weights=self.weights,
             stokes=self.meta['stokes']
             ) - bg
 
 
     # --------------------------------------------------------- #
     # ----------------------- Internal ------------------------ #
+    def _effective_weights(self, rows=slice(None), cols=slice(None)):
+        """ Weights of a selection, `0` for flagged samples.
+            `None` if all samples have unit weights.
+        """
+        if (self._mask_bits is None) and (self._weights is None):
+            return None
+        if self._weights is None:
+            w = np.ones(self._data[rows, cols].shape, dtype='float32')
+        else:
+            w = np.broadcast_to(self._weights, self._data.shape)[rows, cols]
+            w = w.astype('float64')
+        if self._mask_bits is not None:
+            w[self.mask[rows, cols]] = 0
+        return w
+
+
+    def _reduce(self, rows, cols, axis, method='mean'):
+        """ Weighted mean or median (of the unflagged samples)
+            of a selection along `axis`, and the summed weights.
+        """
+        data = self.data[rows, cols]
+        w = self._effective_weights(rows, cols)
+        if method == 'median':
+            if self._mask_bits is None:
+                weights = np.full(data.shape[1 - axis], data.shape[axis], dtype='float64')
+                return np.median(data, axis=axis), weights
+            valid = ~self.mask[rows, cols]
+            data = np.where(valid, data, np.nan)
+            with np.errstate(invalid='ignore'):
+                average = np.nanmedian(data, axis=axis)
+            return average, valid.sum(axis=axis).astype('float64')
+        if w is None:
+            weights = np.full(data.shape[1 - axis], data.shape[axis], dtype='float64')
+            return np.mean(data, axis=axis), weights
+        weights = w.sum(axis=axis, dtype='float64')
+        # Flagged samples may be NaN (e.g. empty averaged bins)
+        data = np.where(w > 0, data, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = np.einsum(
+                'ij,ij->j' if axis == 0 else 'ij,ij->i',
+                data,
+                w,
+                dtype='float64'
+                ) / weights
+        return average, weights
+
+
+    def _derived(self, data, other=None):
+        """ `SpecData` of the same axes as `self`, with the mask
+            of both operands of an arithmetic operation.
+        """
+        spec = SpecData(
+            data=np.reshape(data, self.data.shape),
+            time=self.taxis,
+            freq=self.freq,
+            weights=self.weights,
+            stokes=self.meta['stokes']
+            )
+        bits = [
+            d._mask_bits for d in (self, other)
+            if isinstance(d, SpecData) and (d._mask_bits is not None)
+            ]
+        if len(bits) > 0:
+            spec._mask_bits = np.bitwise_or.reduce(bits)
+        return spec
+
+
+    def _mask_or_zeros(self):
+        """ Unpacked mask, all `False` if there is none.
+        """
+        if self._mask_bits is None:
+            return np.zeros(self._data.shape, dtype=bool)
+        return self.mask
+
+
+    def _packed_or_zeros(self):
+        """ Bit-packed mask, all zeros if there is none.
+        """
+        if self._mask_bits is None:
+            return np.zeros((self.taxis.size, (self.freq.size + 7) // 8), dtype='uint8')
+        return self._mask_bits
+
+
+    def _weights_or_ones(self):
+        """ Weights broadcasted to the data shape.
+        """
+        if self._weights is None:
+            return np.ones(self._data.shape, dtype='float32')
+        return np.broadcast_to(self._weights, self._data.shape)
+
+
     def _check_conformity(self, other):
         """ Checks that other if of same type, same time, 
             frequency ans Stokes parameters than self
@@ -420,12 +618,12 @@ class SpecData(object):
                 'SpecData objects do not have the same dimensions'
                 )
 
-        if self.time != other.time:
+        if self.taxis != other.taxis:
             raise ValueError(
                 'Not the same times'
                 )
 
-        if self.freq != other.freq:
+        if not np.array_equal(self.freq, other.freq):
             raise ValueError(
                 'Not the same frequencies'
                 )
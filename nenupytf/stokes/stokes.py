@@ -17,6 +17,11 @@ __email__ = 'alan.loh@obspm.fr'
 __status__ = 'Production'
 __all__ = [
     'NenuStokes',
+    'stokes_from_fft',
+    'fused_stokes',
+    'fft_filter',
+    'fft_notch',
+    'spectral_kurtosis',
     'LaneDSpec',
     'Stokes_I',
     'Stokes_Q',
@@ -28,15 +33,27 @@ __all__ = [
 
 
 import numpy as np
+from functools import lru_cache
 
-from nenupytf.other import allowed_stokes, compute_bandpass
+from nenupytf.other import allowed_stokes, compute_bandpass, chunk_bytes
 
 
 # ============================================================= #
 # ------------------------ NenuStokes ------------------------- #
 # ============================================================= #
 class NenuStokes(object):
-    """
+    """ Conversion of raw *UnDySPuTeD* beamlets into Stokes
+        parameters.
+
+        `stokes` may be a single Stokes parameter or a list of
+        them. In the latter case, selections return a dictionary
+        of arrays, all computed from a single read of the raw
+        `fft0` / `fft1` data.
+
+        Slicing (``NenuStokes(...)[blocks, beamlets]``) returns
+        the corrected data of whole blocks and beamlets, whereas
+        :meth:`extract` writes an arbitrary sample and channel
+        range directly into an output buffer.
     """
     def __init__(self, data, stokes, nffte, fftlen, bp_corr=True):
         self.data = data
@@ -51,36 +68,25 @@ class NenuStokes(object):
 
     def __getitem__(self, slice_val):
         self.sel_slice = slice_val
-        
-        if self.stokes == 'i':
-            data = Stokes_I(self.data)[slice_val]
-        elif self.stokes == 'q':
-            data = Stokes_Q(self.data)[slice_val]
-        elif self.stokes == 'u':
-            data = Stokes_U(self.data)[slice_val]
-        elif self.stokes == 'v':
-            data = Stokes_V(self.data)[slice_val]
-        elif self.stokes == 'fracv':
-            stokes_i = Stokes_I(self.data)[slice_val]
-            stokes_v = Stokes_V(self.data)[slice_val]
-            data = stokes_v/stokes_i
-        elif self.stokes == 'xx':
-            data = CrossXX(self.data)[slice_val]
-        elif self.stokes == 'yy':
-            data = CrossYY(self.data)[slice_val]
-        elif self.stokes == 'argxy':
-            re = Stokes_U(self.data)[slice_val]
-            im = Stokes_V(self.data)[slice_val]
-            data = np.abs( re + 1j * im)
-        elif self.stokes == 'phasexy':
-            re = Stokes_U(self.data)[slice_val]
-            im = Stokes_V(self.data)[slice_val]
-            data = np.angle( re + 1j * im)
-
-        return self.correct(
-            data=data,
-            bandpass=self.bp_corr
-            )
+
+        fields = set()
+        for st in self._stokes_list:
+            fields.update(stokes_fields[st])
+        raw = {f: self.data[f][slice_val] for f in fields}
+        if len(self._stokes_list) > 1:
+            # Read once, shared by every Stokes parameter
+            raw = {f: np.array(raw[f]) for f in fields}
+
+        data = {
+            name: self.correct(
+                data=stokes_from_fft(st, **raw),
+                bandpass=self.bp_corr
+                )
+            for name, st in zip(self._names, self._stokes_list)
+            }
+        if isinstance(self._stokes, str):
+            return data[self._names[0]]
+        return data
 
 
     @property
@@ -104,11 +110,164 @@ class NenuStokes(object):
         return self._stokes
     @stokes.setter
     def stokes(self, s):
-        if not isinstance(s, str):
+        if isinstance(s, str):
+            names = [s]
+        elif isinstance(s, (list, tuple)) and (len(s) > 0):
+            names = list(s)
+        else:
+            raise TypeError('String or list of strings expected.')
+        if not all(isinstance(n, str) for n in names):
             raise TypeError('String expected.')
-        self._stokes = s.lower()
-        if self._stokes not in allowed_stokes:
+        self._stokes_list = [n.lower() for n in names]
+        if not all(st in allowed_stokes for st in self._stokes_list):
             raise ValueError('Wrong Stokes parameter.')
+        self._names = names
+        self._stokes = s.lower() if isinstance(s, str) else self._stokes_list
+
+
+    def extract(self, blocks, beamlets, samples, columns, out=None,
+            dtype=None, gain=None):
+        """ Extract a time-frequency selection.
+
+            Without bandpass correction, with the Kaiser
+            correction (`bp_corr` is `False` or `True`) or with a
+            precomputed `gain`, the raw data are converted by
+            :func:`fused_stokes`, without any intermediate
+            array. The `'fft'` correction filters whole beamlets
+            by chunks of time samples (see :func:`fft_filter`).
+            Otherwise (`'median'` correction without `gain`), the
+            whole blocks and beamlets go through :meth:`correct`.
+
+            Parameters
+            ----------
+            blocks : tuple
+                `(b0, b1)` range of time blocks
+            beamlets : tuple
+                `(c0, c1)` range of beamlets
+            samples : tuple
+                `(t0, t1)` range of time samples, relative to
+                the first block
+            columns : tuple
+                `(v0, v1)` range of channels, relative to the
+                first beamlet
+            out : np.ndarray or dict
+                `(t1 - t0, v1 - v0)` output array (dictionary of
+                arrays if `stokes` is a list).
+                Default: `None`, new arrays are allocated.
+            dtype : str
+                Data type of the allocated arrays.
+                Default: `None`, `'float64'` if `bp_corr` is
+                `'fft'`, `'float32'` otherwise.
+            gain : np.ndarray
+                Bandpass gain of each channel of the `beamlets`
+                range (e.g. from :meth:`.Lane.bandpass`), it
+                replaces the `bp_corr` correction.
+                Default: `None`.
+
+            Returns
+            -------
+            data : np.ndarray or dict
+                Selected data, a dictionary of arrays if
+                `stokes` is a list
+        """
+        b0, b1 = blocks
+        c0, c1 = beamlets
+        t0, t1 = samples
+        v0, v1 = columns
+        if dtype is None:
+            dtype = 'float64' if self.bp_corr == 'fft' else 'float32'
+        if out is None:
+            out = {
+                name: np.empty((t1 - t0, v1 - v0), dtype=dtype)
+                for name in self._names
+                }
+        elif isinstance(self._stokes, str):
+            out = {self._names[0]: out}
+
+        if (gain is not None) or isinstance(self.bp_corr, bool):
+            if (gain is None) and self.bp_corr:
+                dtype = next(iter(out.values())).dtype
+                gain = _gain(self.fftlen, dtype.str)
+            raw = {
+                f: self.data[f][b0:b1, c0:c1]
+                for f in ('fft0', 'fft1')
+                }
+            for name, st in zip(self._names, self._stokes_list):
+                fused_stokes(
+                    stokes=st,
+                    samples=samples,
+                    columns=columns,
+                    out=out[name],
+                    gain=gain,
+                    **raw
+                    )
+        elif self.bp_corr == 'fft':
+            raw = {
+                f: self.data[f][b0:b1, c0:c1]
+                for f in ('fft0', 'fft1')
+                }
+            ncols = (c1 - c0) * self.fftlen
+            step = max(1, chunk_bytes // (ncols * 16))
+            buf = np.empty((min(step, t1 - t0), ncols))
+            for r0 in range(t0, t1, step):
+                r1 = min(r0 + step, t1)
+                for name, st in zip(self._names, self._stokes_list):
+                    fused_stokes(
+                        stokes=st,
+                        samples=(r0, r1),
+                        columns=(0, ncols),
+                        out=buf[:r1 - r0],
+                        **raw
+                        )
+                    out[name][r0 - t0:r1 - t0] = fft_filter(
+                        data=buf[:r1 - r0],
+                        fftlen=self.fftlen
+                        )[:, v0:v1]
+        else:
+            data = self[b0:b1, c0:c1]
+            if isinstance(self._stokes, str):
+                data = {self._names[0]: data}
+            for name in self._names:
+                out[name][...] = data[name][t0:t1, v0:v1]
+
+        if isinstance(self._stokes, str):
+            return out[self._names[0]]
+        return out
+
+
+    def kurtosis(self, blocks, beamlets, columns, nfft2int, out=None):
+        """ Spectral kurtosis of each time block, see
+            :func:`spectral_kurtosis`.
+
+            Parameters
+            ----------
+            blocks : tuple
+                `(b0, b1)` range of time blocks
+            beamlets : tuple
+                `(c0, c1)` range of beamlets
+            columns : tuple
+                `(v0, v1)` range of channels, relative to the
+                first beamlet
+            nfft2int : int
+                Number of FFTs integrated per time sample
+            out : np.ndarray
+                `(b1 - b0, v1 - v0, 2)` output array.
+                Default: `None`, a new array is allocated.
+
+            Returns
+            -------
+            sk : np.ndarray
+                Spectral kurtosis per block, channel and
+                polarization
+        """
+        b0, b1 = blocks
+        c0, c1 = beamlets
+        return spectral_kurtosis(
+            fft0=self.data['fft0'][b0:b1, c0:c1],
+            nfft2int=nfft2int,
+            columns=columns,
+            out=out
+            )
 
 
     def correct(self, data, bandpass=True):
@@ -147,20 +306,7 @@ class NenuStokes(object):
                 return data / spectrum * broadband
 
             elif bandpass == 'fft':
-                from scipy.signal import find_peaks
-                bp_fft = np.fft.fft(data)
-                # Find peaks
-                avg_fft = np.mean(np.abs(bp_fft), axis=0)
-                p_idx, meta = find_peaks(
-                    x=avg_fft,
-                    height=np.median(avg_fft) * 2.
-                )
-                # Put to zero peaks and neighbouring slices
-                p_idx = np.concatenate(
-                    (p_idx, p_idx + 1, p_idx - 1)
-                )
-                bp_fft[:, p_idx] = 0.
-                return np.abs(np.fft.ifft(bp_fft))
+                return fft_filter(data, self.fftlen)
 
             else:
                 bp = compute_bandpass(self.fftlen)
@@ -179,6 +325,401 @@ class NenuStokes(object):
 # ============================================================= #
 
 
+# ============================================================= #
+# ---------------------- stokes_from_fft ---------------------- #
+# ============================================================= #
+# Raw fields needed by each Stokes parameter
+stokes_fields = {
+    'i': ('fft0',),
+    'q': ('fft0',),
+    'u': ('fft1',),
+    'v': ('fft1',),
+    'fracv': ('fft0', 'fft1'),
+    'xx': ('fft0',),
+    'yy': ('fft0',),
+    'argxy': ('fft1',),
+    'phasexy': ('fft1',)
+    }
+
+
+def stokes_from_fft(stokes, fft0=None, fft1=None):
+    """ Compute a Stokes parameter from raw beamlet data.
+
+        Parameters
+        ----------
+        stokes : str
+            Stokes parameter (lower case)
+        fft0 : np.ndarray
+            `fft0` raw data (XX, YY powers in the last axis)
+        fft1 : np.ndarray
+            `fft1` raw data (XY real and imaginary parts in the
+            last axis)
+
+        Returns
+        -------
+        data : np.ndarray
+            Stokes parameter, with one less dimension
+    """
+    if stokes == 'i':
+        return np.sum(fft0, axis=-1)
+    elif stokes == 'q':
+        return fft0[..., 0] - fft0[..., 1]
+    elif stokes == 'u':
+        return fft1[..., 0] * 2
+    elif stokes == 'v':
+        return fft1[..., 1] * (-2)
+    elif stokes == 'fracv':
+        return (fft1[..., 1] * (-2)) / np.sum(fft0, axis=-1)
+    elif stokes == 'xx':
+        return fft0[..., 0] * 2
+    elif stokes == 'yy':
+        return fft0[..., 1] * 2
+    elif stokes == 'argxy':
+        return np.abs(fft1[..., 0] * 2 + 1j * fft1[..., 1] * (-2))
+    elif stokes == 'phasexy':
+        return np.angle(fft1[..., 0] * 2 + 1j * fft1[..., 1] * (-2))
+    raise ValueError('Wrong Stokes parameter.')
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ fused_stokes ----------------------- #
+# ============================================================= #
+def fused_stokes(stokes, samples, columns, out, fft0=None, fft1=None,
+        gain=None):
+    """ Convert raw beamlets into a Stokes parameter, written
+        directly into a `(time, frequency)` array.
+
+        The raw data are laid out as `(block, beamlet, nffte,
+        fftlen, 2)` whereas the output is `(block * nffte,
+        beamlet * fftlen)` with the two halves of each beamlet
+        swapped. Both layouts are split into rectangles (whole
+        blocks or part of a single block, whole beamlets or part
+        of a half beamlet) in which the output is a strided view
+        of the same shape as the reversed-halves raw view. Each
+        rectangle is then computed by a couple of ufuncs writing
+        in `out`, no temporary array is created and the bandpass
+        is applied as a gain vector.
+
+        Parameters
+        ----------
+        stokes : str
+            Stokes parameter (lower case)
+        samples : tuple
+            `(t0, t1)` range of time samples, relative to the
+            first block of the raw data
+        columns : tuple
+            `(v0, v1)` range of channels, relative to the first
+            beamlet of the raw data
+        out : np.ndarray
+            `(t1 - t0, v1 - v0)` output array, its data type
+            sets the computation precision
+        fft0 : np.ndarray
+            `fft0` raw data (may be a memmap view)
+        fft1 : np.ndarray
+            `fft1` raw data (may be a memmap view)
+        gain : np.ndarray
+            Bandpass gain, either of `fftlen` channels (same for
+            every beamlet, e.g. Kaiser coefficients) or of every
+            channel of the raw beamlets. Default: `None`, no
+            correction.
+
+        Returns
+        -------
+        out : np.ndarray
+            Output array
+    """
+    raw = fft0 if fft0 is not None else fft1
+    nffte, fftlen = raw.shape[2], raw.shape[3]
+    half = fftlen // 2
+    t0, t1 = samples
+    v0, v1 = columns
+    if out.shape != (t1 - t0, v1 - v0):
+        raise ValueError('Wrong output shape.')
+    per_beamlet = (gain is not None) and (gain.size == fftlen)
+
+    for r0, r1 in _pieces(t0, t1, nffte):
+        k0 = r0 // nffte
+        off = r0 % nffte
+        nk = r1 - r0 if r1 - r0 < nffte else nffte
+        nb = (r1 - r0) // nk
+        rows = out[r0 - t0:r1 - t0]
+        for q0, q1 in _pieces(v0, v1, fftlen):
+            if q1 - q0 < fftlen:
+                cpieces = _pieces(q0, q1, half)
+            else:
+                cpieces = [(q0, q1)]
+            for p0, p1 in cpieces:
+                c = p0 // fftlen
+                if p1 - p0 >= fftlen:
+                    # Whole beamlets, halves swapped
+                    nc = (p1 - p0) // fftlen
+                    shape = (nc, 2, half)
+                    src = (slice(c, c + nc), slice(off, off + nk))
+                    flip = True
+                    if gain is None:
+                        g = None
+                    elif per_beamlet:
+                        g = gain.reshape((2, half))
+                    else:
+                        g = gain[p0:p1].reshape((nc, 1, 2, half))
+                else:
+                    # Part of a single half beamlet
+                    f0 = p0 % fftlen
+                    s0 = (f0 + half) % fftlen
+                    shape = (1, 1, p1 - p0)
+                    src = (slice(c, c + 1), slice(off, off + nk),
+                        slice(s0, s0 + p1 - p0))
+                    flip = False
+                    if gain is None:
+                        g = None
+                    elif per_beamlet:
+                        g = gain[f0:f0 + p1 - p0]
+                    else:
+                        g = gain[p0:p1]
+                # (block, beamlet, sample, half, channel) views
+                o = rows[:, p0 - v0:p1 - v0].reshape(
+                    (nb, nk) + shape
+                    ).transpose(0, 2, 1, 3, 4)
+                views = []
+                for fft in (fft0, fft1):
+                    if fft is None:
+                        views.append(None)
+                        continue
+                    v = fft[(slice(k0, k0 + nb),) + src]
+                    v = v.reshape(v.shape[:3] + shape[1:] + (2,))
+                    views.append(v[..., ::-1, :, :] if flip else v)
+                _stokes_into(stokes, o, *views)
+                if g is not None:
+                    np.multiply(o, g, out=o)
+    return out
+
+
+def _pieces(start, stop, unit):
+    """ Split `[start, stop)` into ranges either covering
+        whole units or lying within a single unit.
+    """
+    pieces = []
+    a = start
+    if start % unit:
+        a = min(stop, (start // unit + 1) * unit)
+        pieces.append((start, a))
+    b = stop // unit * unit
+    if b > a:
+        pieces.append((a, b))
+        a = b
+    if stop > a:
+        pieces.append((a, stop))
+    return pieces
+
+
+@lru_cache(maxsize=8)
+def _gain(fftlen, dtype):
+    """ Kaiser bandpass gain vector, in the output data type.
+    """
+    gain = compute_bandpass(fftlen).astype(dtype)
+    gain.flags.writeable = False
+    return gain
+
+
+def _stokes_into(stokes, out, fft0=None, fft1=None):
+    """ Same as :func:`stokes_from_fft` but writing in `out`.
+    """
+    if stokes == 'i':
+        np.add(fft0[..., 0], fft0[..., 1], out=out)
+    elif stokes == 'q':
+        np.subtract(fft0[..., 0], fft0[..., 1], out=out)
+    elif stokes == 'u':
+        np.multiply(fft1[..., 0], 2, out=out)
+    elif stokes == 'v':
+        np.multiply(fft1[..., 1], -2, out=out)
+    elif stokes == 'fracv':
+        np.add(fft0[..., 0], fft0[..., 1], out=out)
+        np.divide(fft1[..., 1], out, out=out)
+        np.multiply(out, -2, out=out)
+    elif stokes == 'xx':
+        np.multiply(fft0[..., 0], 2, out=out)
+    elif stokes == 'yy':
+        np.multiply(fft0[..., 1], 2, out=out)
+    elif stokes == 'argxy':
+        np.hypot(fft1[..., 0], fft1[..., 1], out=out)
+        np.multiply(out, 2, out=out)
+    elif stokes == 'phasexy':
+        np.subtract(0, fft1[..., 1], out=out)
+        np.arctan2(out, fft1[..., 0], out=out)
+    else:
+        raise ValueError('Wrong Stokes parameter.')
+    return out
+# ============================================================= #
+
+
+# ============================================================= #
+# ------------------------ fft_filter ------------------------- #
+# ============================================================= #
+def fft_filter(data, fftlen):
+    """ Correct the bandpass ripple in the Fourier domain.
+
+        Each spectrum (row of `data`) is transformed by a real
+        FFT along frequency, the Fourier bins of the ripple
+        are cancelled and the spectrum is transformed back.
+        With at least `min_notch_period` beamlets, the ripple
+        bins only depend on the channel layout (see
+        :func:`fft_notch`) and rows are independent, `data` may
+        therefore be processed by chunks of time samples.
+        Narrower selections fall back on the detection of the
+        peaks of the time-averaged Fourier amplitude.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            `(time, frequency)` data
+        fftlen : int
+            Number of channels per beamlet
+
+        Returns
+        -------
+        data : np.ndarray
+            Corrected data
+    """
+    nchans = data.shape[1]
+    spectrum = np.fft.rfft(data, axis=1)
+    if nchans / fftlen >= min_notch_period:
+        spectrum *= fft_notch(nchans, fftlen)
+    else:
+        spectrum *= _peak_notch(np.abs(spectrum).mean(axis=0))
+    return np.fft.irfft(spectrum, n=nchans, axis=1)
+
+
+# Minimal number of beamlets of :func:`fft_notch`, and of its
+# neighbouring bins notching
+min_notch_period = 4
+min_neighbour_period = 8
+
+
+@lru_cache(maxsize=8)
+def fft_notch(nchans, fftlen):
+    """ Mask of the real FFT bins kept by :func:`fft_filter`.
+
+        The polyphase filter response repeats itself every
+        `fftlen` channels, its ripple therefore lies at the
+        harmonics of the `nchans / fftlen` period in Fourier
+        bins, which only depend on the channel layout. The
+        neighbouring bins of the harmonics are notched as well
+        if the period is at least `min_neighbour_period` bins.
+
+        Parameters
+        ----------
+        nchans : int
+            Number of channels
+        fftlen : int
+            Number of channels per beamlet
+
+        Returns
+        -------
+        keep : np.ndarray
+            Boolean mask of `nchans // 2 + 1` bins
+    """
+    period = nchans / fftlen
+    if period < min_notch_period:
+        raise ValueError(
+            'At least {} beamlets expected.'.format(min_notch_period)
+            )
+    keep = np.ones(nchans // 2 + 1, dtype=bool)
+    harmonics = np.round(
+        np.arange(1, int(keep.size / period) + 1) * period
+        ).astype(int)
+    shifts = (-1, 0, 1) if period >= min_neighbour_period else (0,)
+    for shift in shifts:
+        notch = harmonics + shift
+        keep[notch[notch < keep.size]] = False
+    # Keep the mean level
+    keep[0] = True
+    keep.flags.writeable = False
+    return keep
+
+
+def _peak_notch(amplitude):
+    """ Mask of the real FFT bins kept by :func:`fft_filter`
+        when there are too few beamlets for :func:`fft_notch`:
+        the local maxima of the time-averaged Fourier
+        `amplitude` above twice its median, and their
+        neighbouring bins, are notched.
+    """
+    keep = np.ones(amplitude.size, dtype=bool)
+    inner = amplitude[1:-1]
+    peaks = 1 + np.flatnonzero(
+        (inner > amplitude[:-2]) &
+        (inner >= amplitude[2:]) &
+        (inner > np.median(amplitude) * 2.)
+        )
+    for shift in (-1, 0, 1):
+        notch = peaks + shift
+        keep[notch[notch < keep.size]] = False
+    # Keep the mean level
+    keep[0] = True
+    return keep
+# ============================================================= #
+
+
+# ============================================================= #
+# --------------------- spectral_kurtosis --------------------- #
+# ============================================================= #
+def spectral_kurtosis(fft0, nfft2int, columns, out=None):
+    """ Generalized spectral kurtosis estimator of the `nffte`
+        spectra of each time block (Nita & Gary 2010).
+
+        Each time sample integrates `N = nfft2int` power
+        spectra, the estimator of the `M = nffte` samples of a
+        block is::
+
+            SK = (M N + 1) / (M - 1) * (M S2 / S1^2 - 1)
+
+        with `S1` and `S2` the sums of the powers and of their
+        squares. It is computed for both polarizations (`XX`
+        and `YY`), to be flagged against their own bounds (see
+        :func:`.sk_flags`).
+
+        Parameters
+        ----------
+        fft0 : np.ndarray
+            `fft0` raw data `(block, beamlet, nffte, fftlen, 2)`
+            (may be a memmap view)
+        nfft2int : int
+            Number of FFTs integrated per time sample
+        columns : tuple
+            `(v0, v1)` range of channels, relative to the first
+            beamlet of the raw data
+        out : np.ndarray
+            `(block, v1 - v0, 2)` output array.
+            Default: `None`, a new `float32` array is allocated.
+
+        Returns
+        -------
+        sk : np.ndarray
+            Spectral kurtosis per block, channel and
+            polarization
+    """
+    nb, nc, m, fftlen = fft0.shape[:4]
+    v0, v1 = columns
+    if out is None:
+        out = np.empty((nb, v1 - v0, 2), dtype='float32')
+    if m < 2:
+        raise ValueError('At least two spectra per block expected.')
+    # Beamlets covering the columns, halves swapped as in the output
+    c0, c1 = v0 // fftlen, (v1 - 1) // fftlen + 1
+    raw = fft0[:, c0:c1]
+    s1 = raw.sum(axis=2, dtype='float64')
+    s2 = np.einsum('abcde,abcde->abde', raw, raw, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sk = m * s2 / s1**2
+    sk -= 1
+    sk *= (m * nfft2int + 1) / (m - 1)
+    sk = np.roll(sk, fftlen // 2, axis=2).reshape((nb, -1, 2))
+    out[...] = sk[:, v0 - c0 * fftlen:v1 - c0 * fftlen]
+    return out
+# ============================================================= #
+
+
 # ============================================================= #
 # ------------------------- LaneDSpec ------------------------- #
 # ============================================================= #
@@ -0,0 +1,111 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Synthetic *UnDySPuTeD* observations shared by the tests.
+
+    :func:`write_spectra` writes a '*.spectra' lane file of
+    random `fft0` / `fft1` blocks, with the header layout of
+    :data:`.header_struct`.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.other import header_struct, max_bsn
+
+
+def write_spectra(fname, lane=0, ntb=50, beams=((0, range(200, 216)),),
+        fftlen=16, nffte=64, nfft2int=16, t0=1570951255, gaps=(), seed=0):
+    """ Write a synthetic lane file.
+
+        Parameters
+        ----------
+        fname : str
+            Output '*.spectra' file
+        lane : int
+            Lane index
+        ntb : int
+            Number of time blocks
+        beams : tuple
+            `(beam, beamlets)` pairs
+        gaps : tuple
+            Block indices preceded by a missing block
+
+        Returns
+        -------
+        blocks : np.ndarray
+            Written blocks
+    """
+    rng = np.random.default_rng(seed + lane)
+    chans = [(b, c) for b, cs in beams for c in cs]
+    beamlet = np.dtype([
+        ('lane', 'int32'),
+        ('beam', 'int32'),
+        ('channel', 'int32'),
+        ('fft0', 'float32', (nffte, fftlen, 2)),
+        ('fft1', 'float32', (nffte, fftlen, 2))
+        ])
+    dtype = np.dtype(header_struct + [('data', beamlet, (len(chans),))])
+    blocks = np.zeros(ntb, dtype=dtype)
+
+    # Block start times, in units of the 200 MHz / 1024 clock
+    k = np.arange(ntb)
+    for g in gaps:
+        k[g:] += 1
+    sec = k * fftlen * nfft2int * nffte / max_bsn
+    blocks['TIMESTAMP'] = t0 + np.floor(sec).astype('uint64')
+    blocks['BLOCKSEQNUMBER'] = np.round((sec - np.floor(sec)) * max_bsn).astype('uint64')
+    blocks['idx'] = k
+    blocks['fftlen'] = fftlen
+    blocks['nfft2int'] = nfft2int
+    blocks['nffte'] = nffte
+    blocks['nbchan'] = len(chans)
+
+    data = blocks['data']
+    data['lane'] = lane
+    data['beam'] = [b for b, _ in chans]
+    data['channel'] = [c for _, c in chans]
+    data['fft0'] = rng.random(data['fft0'].shape, dtype='float32') + 1
+    data['fft1'] = rng.random(data['fft1'].shape, dtype='float32') - 0.5
+    blocks.tofile(fname)
+    return blocks
+
+
+@pytest.fixture(params=[None, 'pread'])
+def backend(request):
+    """ I/O backends reading the lane files.
+    """
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def observation(tmp_path_factory):
+    """ Two lanes recording two beams.
+    """
+    obs = tmp_path_factory.mktemp('obs')
+    write_spectra(
+        str(obs / 'OBS_TEST_0.spectra'),
+        lane=0,
+        beams=((0, range(200, 208)), (1, range(300, 304)))
+        )
+    write_spectra(
+        str(obs / 'OBS_TEST_1.spectra'),
+        lane=1,
+        beams=((0, range(208, 216)), (1, range(304, 308)))
+        )
+    return str(obs)
+
+
+@pytest.fixture(scope='session')
+def gapped_observation(tmp_path_factory):
+    """ Single lane with two recording gaps.
+    """
+    obs = tmp_path_factory.mktemp('gap')
+    write_spectra(
+        str(obs / 'OBS_GAP_0.spectra'),
+        gaps=(17, 31)
+        )
+    return str(obs)
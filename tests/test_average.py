@@ -0,0 +1,72 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the streaming averages against a brute force
+    average of the selected data.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.read import Spectrum, Lane
+
+
+def _bin_average(spec, start, stop, dt, nt, fslices):
+    """ Brute force average of a selected `SpecData` on `nt`
+        time bins of `dt` from `start` (samples after `stop`
+        being discarded) and frequency bins between
+        `fslices`.
+    """
+    times = spec.unix
+    keep = times < stop
+    tbins = np.floor((times[keep] - start) / dt).astype(int)
+    sums = np.zeros((nt, spec.data.shape[1]))
+    counts = np.zeros(nt)
+    np.add.at(sums, tbins, spec.data[keep].astype('float64'))
+    np.add.at(counts, tbins, 1)
+    sums = np.add.reduceat(sums[:, :fslices[-1]], fslices[:-1], axis=1)
+    with np.errstate(invalid='ignore'):
+        return sums / (counts[:, np.newaxis] * np.diff(fslices))
+
+
+@pytest.mark.parametrize('n_procs', [1, 2])
+def test_spectrum_average(observation, backend, n_procs):
+    dt, df = 0.05, 0.5
+    avg = Spectrum(observation, backend=backend).average(
+        stokes=['I', 'V'],
+        dt=dt,
+        df=df,
+        n_procs=n_procs
+        )
+    s = Spectrum(observation)
+    sel = s.select(stokes=['I', 'V'])
+    start, stop = s.time
+    nfreqs = sel['I'].freq.size
+    nf = min(max(int((s.freq[1] - s.freq[0]) / df), 1), nfreqs)
+    fslices = np.linspace(0, nfreqs, nf + 1).astype(int)
+    nt = int(np.ceil((stop - start) / dt))
+    for st in ('I', 'V'):
+        expected = _bin_average(sel[st], start, stop, dt, nt, fslices)
+        assert np.allclose(avg[st].data, expected, rtol=1e-5, equal_nan=True)
+    assert np.array_equal(avg['I'].weights[:, 0] > 0, ~np.isnan(expected[:, 0]))
+
+
+def test_lane_average(observation, backend):
+    lane = Lane(Spectrum(observation).files[0], backend=backend)
+    dt, df = 0.05, 0.2
+    avg = lane.average(stokes='I', dt=dt, df=df)
+    ref = Lane(lane.sfile)
+    sel = ref.select(stokes='I')
+    start, stop = lane.time
+    nt = int((stop - start) // dt)
+    nfreqs = sel.freq.size
+    nf = min(max(int((lane.freq[1] - lane.freq[0]) // df), 1), nfreqs)
+    fslices = np.arange(nf + 1) * (nfreqs // nf)
+    expected = _bin_average(sel, start, start + nt * dt, dt, nt, fslices)
+    assert avg.data.shape == (nt, nf)
+    assert np.allclose(avg.data, expected, rtol=1e-5, equal_nan=True)
+    lane.close()
+    ref.close()
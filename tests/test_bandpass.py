@@ -0,0 +1,113 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the median bandpass calibration.
+"""
+
+
+import os.path as path
+import numpy as np
+import pytest
+
+from conftest import write_spectra
+from test_average import _bin_average
+from nenupytf.read import Spectrum, Lane
+
+
+beams = (
+    ((0, range(200, 208)), (1, range(300, 304))),
+    ((0, range(208, 216)), (1, range(304, 308)))
+    )
+
+
+@pytest.fixture
+def obs(tmp_path):
+    """ Two lanes, in a directory of their own since the
+        bandpasses are cached next to the lane files.
+    """
+    for lane, b in enumerate(beams):
+        write_spectra(
+            str(tmp_path / 'OBS_BP_{}.spectra'.format(lane)),
+            lane=lane,
+            beams=b
+            )
+    return str(tmp_path)
+
+
+def _median_gain(lane, beam, blocks=None):
+    """ Brute force median bandpass of a lane, over the time
+        blocks `blocks` (all of them if `None`).
+    """
+    spec = lane.select(stokes='I', beam=beam, bp_corr=False)
+    data = spec.data.reshape((-1, lane.nffte, spec.data.shape[1]))
+    if blocks is not None:
+        data = data[blocks]
+    median = np.median(np.median(data, axis=1), axis=0)
+    broadband = np.median(median.reshape((-1, lane.fftlen)), axis=1)
+    return np.repeat(broadband, lane.fftlen) / median
+
+
+@pytest.mark.parametrize('beam', [0, 1])
+def test_bandpass(obs, beam):
+    lane = Lane(Spectrum(obs).files[0])
+    current = lane.beam
+    gain = lane.bandpass(beam=beam)
+    assert lane.beam == current
+    assert np.allclose(gain, _median_gain(lane, beam), rtol=1e-5)
+    assert path.isfile(lane.bandpass_file)
+
+    # Reloaded from the cache file
+    cached = Lane(lane.sfile).bandpass(beam=beam)
+    assert np.array_equal(cached, gain)
+
+    # Not the same blocks sampled
+    blocks = np.unique(np.linspace(0, lane._ntb - 1, 2).astype(int))
+    gain2 = lane.bandpass(beam=beam, n_blocks=2)
+    assert np.allclose(gain2, _median_gain(lane, beam, blocks), rtol=1e-5)
+    gain256 = lane.bandpass(beam=beam, n_blocks=256)
+    assert np.allclose(gain256, gain, rtol=1e-5)
+
+
+def test_median_correction(obs, backend):
+    s = Spectrum(obs, backend=backend)
+    s.calibrate()
+    raw = s.select(stokes='I', beam=0, bp_corr=False)
+    gain = np.concatenate([
+        _median_gain(Lane(f), 0) for f in np.unique(s.files)
+        ])
+    corrected = s.select(stokes='I', beam=0, bp_corr='median')
+    assert np.allclose(corrected.data, raw.data * gain, rtol=1e-5)
+
+    dt, df = 0.05, 0.5
+    start, stop = s.time
+    nfreqs = corrected.freq.size
+    nf = min(max(int((s.freq[1] - s.freq[0]) / df), 1), nfreqs)
+    fslices = np.linspace(0, nfreqs, nf + 1).astype(int)
+    nt = int(np.ceil((stop - start) / dt))
+    expected = _bin_average(corrected, start, stop, dt, nt, fslices)
+    for n_procs in (1, 2):
+        avg = s.average(
+            stokes='I',
+            dt=dt,
+            df=df,
+            bp_corr='median',
+            n_procs=n_procs
+            )
+        assert np.allclose(avg.data, expected, rtol=1e-5, equal_nan=True)
+
+
+def test_bandpass_growing_file(tmp_path):
+    fname = str(tmp_path / 'OBS_GROW_0.spectra')
+    blocks = write_spectra(fname, ntb=20)
+    blocks[:10].tofile(fname)
+    lane = Lane(fname)
+    lane.bandpass()
+    with open(fname, 'ab') as wf:
+        wf.write(blocks[10:].tobytes())
+    # New lane on the grown file, stale cache file
+    assert np.allclose(Lane(fname).bandpass(), _median_gain(Lane(fname), 0), rtol=1e-5)
+    # Refreshed lane, stale memory cache
+    assert lane.refresh() == 10
+    assert np.allclose(lane.bandpass(), _median_gain(lane, 0), rtol=1e-5)
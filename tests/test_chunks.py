@@ -0,0 +1,81 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the chunk iterators.
+"""
+
+
+import glob
+import os.path as path
+import numpy as np
+import pytest
+
+from nenupytf.read import Lane, Spectrum
+
+
+@pytest.fixture
+def gapped_lane(gapped_observation, backend):
+    lane = Lane(
+        glob.glob(path.join(gapped_observation, '*.spectra'))[0],
+        backend=backend
+        )
+    yield lane
+    lane.close()
+
+
+def test_chunks_equal_select(observation, backend):
+    expected = Spectrum(observation).select(stokes=['I', 'V'], beam=0)
+    s = Spectrum(observation, backend=backend)
+    chunks = [
+        {st: c.data.copy() for st, c in chunk.items()}
+        for chunk in s.iter_chunks(stokes=['I', 'V'], beam=0, time_chunk=0.5)
+        ]
+    assert len(chunks) > 1
+    for st in ('I', 'V'):
+        data = np.concatenate([c[st] for c in chunks])
+        assert np.array_equal(data, expected[st].data)
+
+
+def test_chunks_overlap(observation, backend):
+    expected = Spectrum(observation).select(stokes='I', beam=0).data
+    s = Spectrum(observation, backend=backend)
+    ovl = 10
+    overlap = ovl * s.pool.get(s.files[0]).dt
+    n = 0
+    for chunk in s.iter_chunks(stokes='I', beam=0, time_chunk=0.5, overlap=overlap):
+        start = max(0, n - ovl)
+        assert np.array_equal(chunk.data, expected[start:start + chunk.data.shape[0]])
+        n = start + chunk.data.shape[0]
+    assert n == expected.shape[0]
+
+
+@pytest.mark.parametrize('overlap', [0., 0.01])
+def test_chunks_split_at_gaps(gapped_lane, gapped_observation, backend, overlap):
+    dt = gapped_lane.dt
+    bounds = gapped_lane.segments['block'][1:] * gapped_lane.nffte
+    spec = Spectrum(gapped_observation, backend=backend)
+    for it in (gapped_lane.iter_chunks, spec.iter_chunks):
+        n = 0
+        ends = []
+        for chunk in it(stokes='I', time_chunk=1., overlap=overlap):
+            # Regular time axis: no chunk spans a gap
+            assert np.allclose(np.diff(chunk.unix), dt, rtol=1e-3)
+            if n not in bounds:
+                n -= min(n, int(round(overlap / dt)))
+            n += chunk.data.shape[0]
+            ends.append(n)
+        assert set(bounds) <= set(ends)
+
+
+def test_gapped_select(gapped_lane, gapped_observation):
+    ref_lane = Lane(gapped_lane.sfile)
+    spec = gapped_lane.select(stokes=['I', 'V'])
+    ref = ref_lane.select(stokes=['I', 'V'])
+    for st in ('I', 'V'):
+        assert np.array_equal(spec[st].data, ref[st].data)
+        assert np.array_equal(spec[st].unix, ref[st].unix)
+    chunks = [c.data.copy() for c in gapped_lane.iter_chunks(time_chunk=0.3)]
+    assert np.array_equal(np.concatenate(chunks), ref['I'].data)
+    ref_lane.close()
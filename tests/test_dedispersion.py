@@ -0,0 +1,110 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the streaming dedispersion.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.read import Spectrum
+from nenupytf.stokes import SpecData
+from nenupytf.process import Dedisperser, DMSearch, dedisperse, dm_shifts, dm_trials
+
+
+dm = 0.1
+
+
+def _chunks(spec, sizes):
+    """ Consecutive `SpecData` chunks of `spec` of the given
+        numbers of samples.
+    """
+    edges = np.cumsum([0] + list(sizes))
+    for t0, t1 in zip(edges[:-1], edges[1:]):
+        yield SpecData(
+            data=spec.data[t0:t1],
+            time=spec.unix[t0:t1],
+            freq=spec.freq,
+            stokes='I'
+            )
+
+
+@pytest.fixture(scope='module')
+def dispersed():
+    """ Noise with a dispersed pulse.
+    """
+    rng = np.random.default_rng(0)
+    freq = np.linspace(39., 42., 64)
+    dt = 1e-3
+    data = rng.random((1000, freq.size), dtype='float32')
+    shifts = dm_shifts(freq, dm, dt)
+    data[300 + shifts, np.arange(freq.size)] += 10.
+    return SpecData(
+        data=data,
+        time=1570951255. + np.arange(data.shape[0]) * dt,
+        freq=freq,
+        stokes='I'
+        )
+
+
+def test_dedisperse(dispersed):
+    dynspec, timeseries = dedisperse(dispersed, dm)
+    shifts = dm_shifts(dispersed.freq, dm, 1e-3)
+    nout = dispersed.data.shape[0] - shifts.max()
+    cols = np.arange(dispersed.freq.size)
+    expected = dispersed.data[np.arange(nout)[:, np.newaxis] + shifts, cols]
+    assert np.array_equal(dynspec.data, expected)
+    assert np.argmax(timeseries.data[:, 0]) == 300
+
+
+@pytest.mark.parametrize('sizes', [[1000], [100] * 10, [7] * 142 + [6], [3, 500, 1, 496]])
+def test_stream_equals_whole(dispersed, sizes):
+    dynspec, timeseries = dedisperse(dispersed, dm)
+    dd = Dedisperser(freq=dispersed.freq, dm=dm, dt=1e-3)
+    res = list(dd.stream(_chunks(dispersed, sizes)))
+    assert np.array_equal(np.concatenate([d.data for d, _ in res]), dynspec.data)
+    assert np.allclose(np.concatenate([t.data for _, t in res]), timeseries.data)
+    assert np.allclose(np.concatenate([d.unix for d, _ in res]), dynspec.unix)
+
+
+def test_stream_iter_chunks(observation):
+    s = Spectrum(observation)
+    whole = s.select(stokes='I', beam=0)
+    dynspec, _ = dedisperse(whole, dm)
+    dd = Dedisperser(freq=whole.freq, dm=dm, dt=whole.taxis.step)
+    res = list(dd.stream(s.iter_chunks(stokes='I', beam=0, time_chunk=0.3)))
+    assert len(res) > 1
+    assert np.array_equal(np.concatenate([d.data for d, _ in res]), dynspec.data)
+
+
+@pytest.mark.parametrize('sizes', [[100] * 10, [3, 500, 1, 496]])
+def test_dmsearch_stream_equals_whole(dispersed, sizes):
+    dms = dm_trials(0., 0.2, dispersed.freq, 1e-3)
+    whole = DMSearch(freq=dispersed.freq, dms=dms, dt=1e-3)
+    times, plane = whole.process(dispersed)
+    search = DMSearch(freq=dispersed.freq, dms=dms, dt=1e-3)
+    ctimes, cplane = search.run(_chunks(dispersed, sizes))
+    assert np.array_equal(cplane, plane)
+    assert np.allclose(ctimes.unix, times.unix)
+    stats, expected = search.stats, whole.stats
+    assert np.array_equal(stats['max'], expected['max'])
+    assert np.allclose(stats['tmax'], expected['tmax'], rtol=0, atol=1e-6)
+    assert np.allclose(stats['snr'], expected['snr'])
+
+
+def test_dmsearch_single_channel_subbands(dispersed):
+    # One channel per subband: no intra-subband approximation
+    search = DMSearch(
+        freq=dispersed.freq,
+        dms=[0., dm],
+        dt=1e-3,
+        nsub=dispersed.freq.size
+        )
+    _, plane = search.process(dispersed)
+    _, timeseries = dedisperse(dispersed, dm)
+    n = plane.shape[0]
+    assert np.allclose(plane[:, 1], timeseries.data[:n, 0], rtol=1e-5)
+    assert search.stats['snr'].argmax() == 1
@@ -0,0 +1,84 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the live mode, following lane files being written.
+"""
+
+
+import os.path as path
+import threading
+import time
+import numpy as np
+
+from conftest import write_spectra
+from nenupytf.read import Spectrum
+
+
+beams = (
+    ((0, range(200, 208)), (1, range(300, 304))),
+    ((0, range(208, 216)), (1, range(304, 308)))
+    )
+
+
+def _record(files, blocks, n0, step):
+    """ Append the blocks after the `n0` first ones to the lane
+        files, `step` blocks at a time, each write being split
+        so that half-written blocks are seen by the reader.
+    """
+    n = blocks[0].size
+    for k in range(n0, n, step):
+        for fname, b in zip(files, blocks):
+            raw = b[k:k + step].tobytes()
+            cut = len(raw) // 2 + 7
+            with open(fname, 'ab') as wf:
+                wf.write(raw[:cut])
+                wf.flush()
+                time.sleep(0.02)
+                wf.write(raw[cut:])
+        time.sleep(0.03)
+
+
+def test_follow_equals_select(tmp_path, backend):
+    complete = tmp_path / 'complete'
+    live = tmp_path / 'live'
+    complete.mkdir()
+    live.mkdir()
+    blocks = [
+        write_spectra(str(complete / 'OBS_0.spectra'), lane=0, beams=beams[0]),
+        write_spectra(str(complete / 'OBS_1.spectra'), lane=1, beams=beams[1])
+        ]
+    files = [str(live / 'OBS_0.spectra'), str(live / 'OBS_1.spectra')]
+    n0 = 5
+    for fname, b in zip(files, blocks):
+        b[:n0].tofile(fname)
+    expected = Spectrum(str(complete)).select(stokes=['I', 'V'], beam=0)
+
+    s = Spectrum(str(live), backend=backend)
+    writer = threading.Thread(target=_record, args=(files, blocks, n0, 3))
+    writer.start()
+    try:
+        res = [
+            {st: (spec.data.copy(), spec.unix.copy()) for st, spec in chunk.items()}
+            for chunk in s.follow(
+                stokes=['I', 'V'],
+                beam=0,
+                poll=0.01,
+                timeout=1.,
+                max_blocks=4,
+                from_start=True
+                )
+            ]
+    finally:
+        writer.join()
+    assert len(res) > 2
+    assert all(r['I'][0].shape[0] <= 4 * 64 for r in res)
+    for st in ('I', 'V'):
+        data = np.concatenate([r[st][0] for r in res])
+        unix = np.concatenate([r[st][1] for r in res])
+        assert np.array_equal(data, expected[st].data)
+        # Each chunk starts on its block timestamp, rounded to
+        # the 5.12 us sequence number period
+        assert np.allclose(unix, expected[st].unix, rtol=0, atol=1e-5)
+    assert path.getsize(files[0]) == blocks[0].nbytes
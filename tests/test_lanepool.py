@@ -0,0 +1,54 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the pool of open lane files.
+"""
+
+
+import numpy as np
+
+from nenupytf.read import Spectrum, LanePool
+
+
+def test_pinned_lanes_not_evicted(observation):
+    s = Spectrum(observation)
+    files = list(np.unique(s.files))
+    pool = LanePool(max_lanes=1)
+    with pool.pinned(files) as lanes:
+        assert len(pool) == 2
+        assert all(l.memdata is not None for l in lanes)
+        # Opening another lane does not close the pinned ones
+        with pool.pinned(files[:1]):
+            pass
+        assert all(l.memdata is not None for l in lanes)
+    # Bounds are enforced once unpinned
+    assert len(pool) == 1
+    pool.close()
+
+
+def test_select_with_small_pool(observation):
+    ref = Spectrum(observation)
+    expected = ref.select(stokes='I', beam=0)
+    s = Spectrum(observation)
+    s.pool.max_lanes = 1
+    s.pool.max_bytes = 1
+    for _ in range(2):
+        spec = s.select(stokes='I', beam=0)
+        assert np.array_equal(spec.data, expected.data)
+    avg = s.average(stokes='I', beam=0, dt=0.1, df=0.1)
+    exp = ref.average(stokes='I', beam=0, dt=0.1, df=0.1)
+    assert np.allclose(avg.data, exp.data, equal_nan=True)
+    # Chunks are views of reused buffers
+    chunks = [c.data.copy() for c in s.iter_chunks(time_chunk=1., beam=0)]
+    data = np.concatenate(chunks)
+    assert np.array_equal(data, expected.data)
+    assert len(s.pool) == 1
+
+
+def test_default_pool_does_not_bound_mapped_bytes(observation):
+    s = Spectrum(observation)
+    s.select(stokes='I', beam=0)
+    assert s.pool.max_bytes is None
+    assert len(s.pool) == 2
@@ -0,0 +1,57 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the memory planner.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.other import set_memory_budget, allocate, reserved_bytes
+from nenupytf.read import Lane, Spectrum
+
+
+@pytest.fixture
+def budget():
+    yield set_memory_budget
+    set_memory_budget()
+
+
+def test_allocate_reserved(budget):
+    budget(nbytes=1000)
+    first = allocate(['a'], (100,), dtype='float64')
+    assert not isinstance(first['a'], np.memmap)
+    second = allocate(['b'], (100,), dtype='float64', reserved=reserved_bytes(first))
+    assert isinstance(second['b'], np.memmap)
+
+
+def _recording(monkeypatch, module):
+    """ Record the arrays allocated by `module`.
+    """
+    arrays = []
+    def recorder(*args, **kwargs):
+        res = allocate(*args, **kwargs)
+        arrays.extend(res.values())
+        return res
+    monkeypatch.setattr(module, 'allocate', recorder)
+    return arrays
+
+
+@pytest.mark.parametrize('reader', ['spectrum', 'lane'])
+def test_average_working_set_within_budget(observation, budget, monkeypatch, reader):
+    from nenupytf.read import lane, spectrum
+    s = Spectrum(observation)
+    obj = s if reader == 'spectrum' else Lane(s.files[0])
+    module = spectrum if reader == 'spectrum' else lane
+    expected = obj.average(stokes='I', beam=0, dt=0.01, df=0.05)
+    # Sums fit alone, not with the counts
+    budget(nbytes=int(1.5 * expected.data.size * 8))
+    arrays = _recording(monkeypatch, module)
+    spec = obj.average(stokes='I', beam=0, dt=0.01, df=0.05)
+    in_memory = sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+    assert in_memory <= 1.5 * expected.data.size * 8
+    assert any(isinstance(a, np.memmap) for a in arrays)
+    assert np.allclose(spec.data, expected.data, equal_nan=True)
@@ -0,0 +1,107 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the header-only observation index and of its
+    sidecar file.
+"""
+
+
+import os
+import os.path as path
+import json
+import numpy as np
+import pytest
+
+from conftest import write_spectra
+from nenupytf.other import max_bsn
+from nenupytf.read import Spectrum
+from nenupytf.read import obsindex
+
+
+def _tmax(blocks):
+    """ End time of the last of `blocks`.
+    """
+    last = blocks[-1]
+    block_dt = 5.12e-6 * last['fftlen'] * last['nfft2int'] * last['nffte']
+    return last['TIMESTAMP'] + last['BLOCKSEQNUMBER'] / max_bsn + block_dt
+
+
+def _no_scan(sfile):
+    raise AssertionError('{} rescanned'.format(sfile))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """ User cache directory of the test.
+    """
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+def test_growing_file(tmp_path, cache, monkeypatch):
+    obs = tmp_path / 'obs'
+    obs.mkdir()
+    fname = str(obs / 'OBS_GROW_0.spectra')
+    blocks = write_spectra(fname, ntb=20)
+    blocks[:10].tofile(fname)
+
+    s = Spectrum(str(obs))
+    assert s.index.sidecar == str(obs / obsindex.sidecar_name)
+    assert np.allclose(s.desctab['tmax'], _tmax(blocks[:10]))
+
+    # Unchanged file, read from the sidecar
+    with monkeypatch.context() as m:
+        m.setattr(obsindex, 'index_lane', _no_scan)
+        assert np.allclose(Spectrum(str(obs)).desctab['tmax'], _tmax(blocks[:10]))
+
+    with open(fname, 'ab') as wf:
+        wf.write(blocks[10:].tobytes())
+    assert np.allclose(Spectrum(str(obs)).desctab['tmax'], _tmax(blocks))
+    s.refresh()
+    assert np.allclose(s.desctab['tmax'], _tmax(blocks))
+    with open(s.index.sidecar) as rf:
+        entry = json.load(rf)['entries']['OBS_GROW_0.spectra']
+    assert entry['n_blocks'] == 20
+    assert entry['size'] == path.getsize(fname)
+
+
+def test_cache_fallback(tmp_path, cache, monkeypatch):
+    obs = tmp_path / 'obs'
+    obs.mkdir()
+    blocks = write_spectra(str(obs / 'OBS_RO_0.spectra'))
+    # The sidecar can neither be written nor read
+    (obs / obsindex.sidecar_name).mkdir()
+
+    s = Spectrum(str(obs))
+    assert path.dirname(s.index.sidecar) == str(cache / 'nenupytf')
+    assert path.isfile(s.index.sidecar)
+    assert sorted(os.listdir(str(obs))) == [obsindex.sidecar_name, 'OBS_RO_0.spectra']
+    assert np.allclose(s.desctab['tmax'], _tmax(blocks))
+
+    with monkeypatch.context() as m:
+        m.setattr(obsindex, 'index_lane', _no_scan)
+        s2 = Spectrum(str(obs))
+    assert s2.index.sidecar == s.index.sidecar
+    assert np.array_equal(s2.desctab, s.desctab)
+
+
+def test_version_mismatch(tmp_path, cache):
+    obs = tmp_path / 'obs'
+    obs.mkdir()
+    blocks = write_spectra(str(obs / 'OBS_VER_0.spectra'))
+    sidecar = Spectrum(str(obs)).index.sidecar
+
+    # Older index with the same size and mtime but wrong times
+    with open(sidecar) as rf:
+        content = json.load(rf)
+    content['version'] = obsindex.index_version - 1
+    content['entries']['OBS_VER_0.spectra']['last'] = [0, 0]
+    with open(sidecar, 'w') as wf:
+        json.dump(content, wf)
+
+    s = Spectrum(str(obs))
+    assert np.allclose(s.desctab['tmax'], _tmax(blocks))
+    with open(sidecar) as rf:
+        assert json.load(rf)['version'] == obsindex.index_version
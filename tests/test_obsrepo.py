@@ -0,0 +1,77 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the per-beam segment table of an observation.
+"""
+
+
+import numpy as np
+
+from conftest import write_spectra
+from nenupytf.other import max_bsn
+from nenupytf.read import Spectrum
+
+
+# Channel width in MHz
+df = max_bsn * 1e-6
+
+
+def _tmax(blocks):
+    """ End time of the last of `blocks`.
+    """
+    last = blocks[-1]
+    block_dt = 5.12e-6 * last['fftlen'] * last['nfft2int'] * last['nffte']
+    return last['TIMESTAMP'] + last['BLOCKSEQNUMBER'] / max_bsn + block_dt
+
+
+def test_desctab(observation):
+    s = Spectrum(observation)
+    tab = s.desctab
+    assert s.desctab is tab
+    # (lane, beam, first channel, number of channels, cmin)
+    expected = [
+        (0, 0, 200, 8, 0),
+        (1, 0, 208, 8, 0),
+        (0, 1, 300, 4, 8),
+        (1, 1, 304, 4, 8)
+        ]
+    assert tab.size == len(expected)
+    for row, (lane, beam, chan, nchan, cmin) in zip(tab, expected):
+        assert (row['lane'], row['beam']) == (lane, beam)
+        assert np.isclose(row['fmin'], chan * df)
+        assert np.isclose(row['fmax'], (chan + nchan) * df)
+        assert (row['cmin'], row['cmax']) == (cmin, cmin + nchan)
+        assert row['file'].endswith('_{}.spectra'.format(lane))
+    assert np.array_equal(tab, np.sort(tab, order=['beam', 'fmin', 'tmin']))
+    # Same time range for both beams of a lane
+    for lane in (0, 1):
+        rows = tab[tab['lane'] == lane]
+        assert np.unique(rows['tmin']).size == 1
+        assert np.unique(rows['tmax']).size == 1
+
+
+def test_desctab_refresh(tmp_path):
+    beams = ((0, range(200, 208)), (1, range(300, 304)))
+    fname = str(tmp_path / 'OBS_GROW_0.spectra')
+    blocks = write_spectra(fname, ntb=30, beams=beams)
+    blocks[:10].tofile(fname)
+
+    s = Spectrum(str(tmp_path))
+    tab = s.desctab
+    assert np.allclose(tab['tmax'], _tmax(blocks[:10]))
+    s.beam = 1
+    s.freq = None
+    s.select()
+    with open(fname, 'ab') as wf:
+        wf.write(blocks[10:].tobytes())
+    # Kept until refreshed
+    assert s.desctab is tab
+    s.refresh()
+    assert s.desctab is not tab
+    assert np.allclose(s.desctab['tmax'], _tmax(blocks))
+    assert np.array_equal(s.desctab['tmin'], tab['tmin'])
+    assert np.array_equal(s.desctab['cmin'], tab['cmin'])
+    s.time = None
+    assert s.select().data.shape[0] == 30 * blocks[0]['nffte']
@@ -0,0 +1,83 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the multi-resolution pyramid.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.read import Spectrum, Pyramid, build_pyramid, convert
+
+
+@pytest.fixture(scope='module')
+def pyramid(observation, tmp_path_factory):
+    output = str(tmp_path_factory.mktemp('pyramid'))
+    return build_pyramid(
+        observation,
+        output=output,
+        stokes=['I', 'V'],
+        levels=3,
+        minmax=True
+        )
+
+
+@pytest.mark.parametrize('beam', [0, 1])
+def test_pyramid_matches_lanes(observation, pyramid, beam):
+    spec = Spectrum(observation)
+    tab = spec.desctab
+    bmask = tab['beam'] == beam
+    sel = spec.select(
+        stokes=['I', 'V'],
+        beam=beam,
+        freq=[tab['fmin'][bmask].min(), tab['fmax'][bmask].max()]
+        )
+    lane = spec.pool.get(spec.files[0])
+    nffte = lane.nffte
+    levels = pyramid.levels(beam)
+    assert len(levels) == 3
+    for k, info in enumerate(levels):
+        nt, nf = info['nt'], info['nf']
+        n = 2**k
+        for st in ('I', 'V'):
+            data = sel[st].data[:nt * n * nffte, :nf * n]
+            cube = data.reshape((nt, n * nffte, nf, n))
+            for stat, reducer in (('mean', np.mean), ('min', np.min), ('max', np.max)):
+                level = pyramid.query(
+                    stokes=st,
+                    beam=beam,
+                    dt=info['dt'],
+                    df=info['df'],
+                    stat=stat
+                    )
+                assert level.data.shape == (nt, nf)
+                assert np.allclose(
+                    level.data,
+                    reducer(cube.astype('float64'), axis=(1, 3)),
+                    rtol=1e-5,
+                    atol=1e-6
+                    )
+        times = sel['I'].unix[:nt * n * nffte].reshape((nt, -1)).mean(axis=1)
+        assert np.allclose(level.unix, times, atol=1e-4)
+
+
+def test_pyramid_find_ignores_store(observation, tmp_path):
+    output = str(tmp_path / 'store')
+    convert(observation, output=output, tile=(256, 100))
+    assert Pyramid.find(output) is None
+    with pytest.raises(ValueError):
+        Pyramid(output)
+    s = Spectrum(output)
+    assert s.pyramid is None
+    assert s.store is not None
+
+
+def test_pyramid_stokes_case_insensitive(pyramid):
+    a = pyramid.query(stokes='V', beam=0)
+    b = pyramid.query(stokes='v', beam=0)
+    assert np.array_equal(a.data, b.data)
+    with pytest.raises(ValueError):
+        pyramid.query(stokes='q', beam=0)
@@ -0,0 +1,176 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the RFI flagging.
+"""
+
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from nenupytf.read import Spectrum
+from nenupytf.stokes import SpecData, spectral_kurtosis
+from nenupytf.process.rfi import (
+    sk_bounds,
+    sk_flags,
+    sumthreshold,
+    flag,
+    iter_flags,
+    _window_flags
+    )
+
+
+def _gamma_sk(m, n, size, seed=0):
+    """ Spectral kurtosis of Gaussian noise power spectra,
+        `(size, 2)` (two polarizations).
+    """
+    rng = np.random.default_rng(seed)
+    power = rng.gamma(n, 1., size=(size, m, 2))
+    s1 = power.sum(axis=1)
+    s2 = (power**2).sum(axis=1)
+    return (m * n + 1.) / (m - 1.) * (m * s2 / s1**2 - 1.)
+
+
+@pytest.mark.parametrize('m, n', [(16, 4), (64, 16), (64, 1)])
+def test_sk_false_alarm_rate(m, n):
+    sk = _gamma_sk(m, n, 400000)
+    lower, upper = sk_bounds(m, n, sigma=3.)
+    # 0.135 % on each side
+    assert 0.0005 < (sk[:, 0] < lower).mean() < 0.0025
+    assert 0.0005 < (sk[:, 0] > upper).mean() < 0.0025
+    single = sk_flags(sk[:, 0], m, n, axis=None).mean()
+    both = sk_flags(sk, m, n).mean()
+    assert single < 0.004
+    assert both < 2 * single + 0.001
+
+
+def test_sk_flags_polarizations():
+    lower, upper = sk_bounds(16, 4)
+    sk = np.ones((3, 2))
+    sk[1, 0] = upper + 0.1
+    sk[2, 1] = lower - 0.1
+    assert sk_flags(sk, 16, 4).tolist() == [False, True, True]
+
+
+def test_spectral_kurtosis_per_polarization():
+    rng = np.random.default_rng(0)
+    m, n, fftlen = 32, 4, 16
+    fft0 = rng.gamma(n, 1., size=(5, 3, m, fftlen, 2)).astype('float32')
+    sk = spectral_kurtosis(fft0, n, (3, 40))
+    assert sk.shape == (5, 37, 2)
+    # Reference: halves of the beamlets swapped, channels stacked
+    raw = np.roll(fft0.astype('float64'), fftlen // 2, axis=3)
+    raw = raw.transpose(0, 2, 1, 3, 4).reshape((5, m, -1, 2))[:, :, 3:40]
+    s1 = raw.sum(axis=1)
+    s2 = (raw**2).sum(axis=1)
+    ref = (m * n + 1.) / (m - 1.) * (m * s2 / s1**2 - 1.)
+    assert np.allclose(sk, ref, rtol=1e-5)
+
+
+def _noise(nt=2000, nf=256, seed=0):
+    """ Gaussian noise dynamic spectrum over a bandpass.
+    """
+    rng = np.random.default_rng(seed)
+    bandpass = 10. + np.linspace(0., 5., nf)
+    data = bandpass * (1. + 0.1 * rng.standard_normal((nt, nf)))
+    return SpecData(
+        data=data.astype('float32'),
+        time=1570951255. + np.arange(nt) * 0.01,
+        freq=30. + np.arange(nf) * 0.01,
+        stokes='I'
+        ), bandpass
+
+
+def _window_reference(work, m, limit, axis):
+    w = np.moveaxis(work, axis, 0)
+    covered = np.zeros(w.shape, dtype=bool)
+    for i in range(w.shape[0] - m + 1):
+        covered[i:i + m] |= w[i:i + m].sum(axis=0) > limit
+    return np.moveaxis(covered, 0, axis)
+
+
+@pytest.mark.parametrize('shape, axis', [((300, 40), 1), ((300, 40), 0), ((50, 300), 0)])
+@pytest.mark.parametrize('m', [2, 5, 16])
+def test_window_flags(shape, axis, m):
+    rng = np.random.default_rng(m)
+    work = rng.standard_normal(shape).astype('float32')
+    limit = 1.5 * np.sqrt(m)
+    assert np.array_equal(
+        _window_flags(work, m, limit, axis),
+        _window_reference(work, m, limit, axis)
+        )
+
+
+def test_sumthreshold_noise():
+    rng = np.random.default_rng(0)
+    mask = sumthreshold(rng.standard_normal((2000, 256)))
+    assert mask.mean() < 0.002
+
+
+def test_flag_injected_rfi():
+    spec, bandpass = _noise()
+    # Narrow-band: 2 sigma in one channel for 200 samples
+    spec.data[800:1000, 40] += 0.2 * bandpass[40]
+    # Broadband: 1.5 sigma in every channel for 3 samples
+    spec.data[1500:1503] += 0.15 * bandpass
+    # Strong spike
+    spec.data[100, 200] += 2. * bandpass[200]
+    mask = flag(spec)
+    assert mask[800:1000, 40].mean() > 0.9
+    assert mask[1500:1503].mean() > 0.9
+    assert mask[100, 200]
+    clean = np.ones(mask.shape, dtype=bool)
+    clean[800:1000, 40] = clean[1500:1503] = clean[100, 200] = False
+    assert mask[clean].mean() < 0.002
+
+
+def test_flag_noise_false_alarm():
+    spec, _ = _noise(seed=1)
+    assert flag(spec).mean() < 0.002
+
+
+def test_flag_sk():
+    spec, _ = _noise(nt=200, nf=16)
+    lower, upper = sk_bounds(16, 4)
+    sk = np.ones((200, 16, 2), dtype='float32')
+    sk[50:60, 3, 1] = upper + 0.5
+    spec.meta['sk'] = sk
+    spec.meta['sk_mn'] = (16, 4)
+    mask = flag(spec)
+    assert mask[50:60, 3].all()
+
+
+def test_iter_flags_overlap():
+    spec, bandpass = _noise()
+    spec.data[990:1010] += 0.15 * bandpass
+    whole = flag(spec)
+    ovl = 64
+    chunks = [
+        SpecData(
+            data=spec.data[max(0, k - ovl):k + 500],
+            time=spec.taxis[max(0, k - ovl):k + 500],
+            freq=spec.freq,
+            stokes='I'
+            )
+        for k in range(0, 2000, 500)
+        ]
+    res = list(iter_flags(chunks))
+    unix = np.concatenate([c.unix for c, _ in res])
+    mask = np.concatenate([m for _, m in res])
+    assert np.allclose(unix, spec.unix, rtol=0, atol=1e-4)
+    assert mask.shape == whole.shape
+    assert mask[990:1010].mean() > 0.9
+    assert abs(mask.mean() - whole.mean()) < 0.002
+
+
+def test_iter_flags_spectrum(observation):
+    s = Spectrum(observation)
+    expected = s.select(stokes='I', beam=0)
+    chunks = s.iter_chunks(stokes='I', beam=0, time_chunk=1., overlap=0.2)
+    res = [(c.unix.copy(), m) for c, m in iter_flags(chunks)]
+    assert np.allclose(np.concatenate([u for u, _ in res]), expected.unix)
+    assert sum(m.shape[0] for _, m in res) == expected.data.shape[0]
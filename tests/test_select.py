@@ -0,0 +1,50 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the multi-lane selection.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.read import Spectrum, Lane
+
+
+all_stokes = ['I', 'Q', 'U', 'V', 'fracV', 'XX', 'YY', 'argXY', 'phaseXY']
+
+
+@pytest.mark.parametrize('n_workers', [2, None])
+@pytest.mark.parametrize('bp_corr', [True, 'fft'])
+def test_parallel_select(observation, backend, n_workers, bp_corr):
+    expected = Spectrum(observation).select(
+        stokes=['I', 'V'],
+        bp_corr=bp_corr,
+        n_workers=1
+        )
+    specs = Spectrum(observation, backend=backend).select(
+        stokes=['I', 'V'],
+        bp_corr=bp_corr,
+        n_workers=n_workers
+        )
+    for st in ('I', 'V'):
+        assert np.array_equal(specs[st].data, expected[st].data)
+        assert np.array_equal(specs[st].freq, expected[st].freq)
+        assert np.allclose(specs[st].unix, expected[st].unix)
+
+
+@pytest.mark.parametrize('bp_corr', [False, True, 'fft'])
+def test_multi_stokes_select(observation, backend, bp_corr):
+    s = Spectrum(observation, backend=backend)
+    lane = Lane(s.files[0], backend=backend)
+    for reader, kwargs in [(s, {}), (lane, {'beam': 1})]:
+        specs = reader.select(stokes=all_stokes, bp_corr=bp_corr, **kwargs)
+        assert list(specs) == all_stokes
+        for st in all_stokes:
+            single = reader.select(stokes=st, bp_corr=bp_corr, **kwargs)
+            assert specs[st].meta['stokes'] == st
+            assert np.array_equal(specs[st].data, single.data)
+            assert np.array_equal(specs[st].freq, single.freq)
+            assert np.array_equal(specs[st].unix, single.unix)
@@ -0,0 +1,111 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the single pulse search.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.stokes import SpecData
+from nenupytf.process import DMSearch, SinglePulseSearch, dm_shifts, dm_trials
+
+
+dt = 1e-3
+t0 = 1570951255.
+
+
+def _series(n=20000, ndm=1, pulses=(), seed=0):
+    """ Gaussian noise time series `(n, ndm)` with boxcar
+        pulses `(start, width, snr, column)`.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n, ndm)).astype('float32')
+    for start, width, snr, col in pulses:
+        data[start:start + width, col] += snr / np.sqrt(width)
+    return data, t0 + np.arange(n) * dt
+
+
+def _chunked(data, unix, size):
+    for k in range(0, data.shape[0], size):
+        yield unix[k:k + size], data[k:k + size]
+
+
+def test_injected_pulse_recovered():
+    rng = np.random.default_rng(1)
+    freq = np.linspace(39., 42., 64)
+    dm, start, width = 0.15, 3000, 8
+    data = rng.standard_normal((8000, freq.size)).astype('float32')
+    shifts = dm_shifts(freq, dm, dt)
+    cols = np.arange(freq.size)
+    for k in range(width):
+        data[start + k + shifts, cols] += 3.
+    spec = SpecData(data=data, time=t0 + np.arange(data.shape[0]) * dt, freq=freq)
+    dms = dm_trials(0., 0.3, freq, dt)
+    search = DMSearch(freq=freq, dms=dms, dt=dt)
+    sp = SinglePulseSearch(dms=dms, threshold=8., window=1000)
+    cands = sp.run(search.stream([spec]))
+    assert cands.size == 1
+    best = cands[0]
+    assert abs(best['time'] - (t0 + start * dt)) <= 2 * dt
+    assert best['width'] == width
+    assert abs(best['dm'] - dm) <= 2 * np.diff(dms).max()
+    assert best['members'] > 1
+
+
+@pytest.mark.parametrize('size', [64, 300, 1000, 1500])
+def test_chunked_equals_whole(size):
+    # Pulses across window and chunk boundaries, the last
+    # window of the stream being incomplete
+    pulses = [(4990, 32, 15., 0), (11900, 200, 20., 1), (16000, 4, 12., 2)]
+    data, unix = _series(n=20500, ndm=3, pulses=pulses)
+    kwargs = dict(dms=[0., 1., 2.], threshold=7., window=1000)
+    whole = SinglePulseSearch(**kwargs).run([(unix, data)])
+    chunked = SinglePulseSearch(**kwargs).run(_chunked(data, unix, size))
+    assert whole.size == len(pulses)
+    for key in ('time', 'dm', 'width', 'members'):
+        assert np.array_equal(chunked[key], whole[key])
+    assert np.allclose(chunked['snr'], whole['snr'], rtol=1e-5)
+    assert np.allclose(whole['time'], unix[[p[0] for p in pulses]], atol=4 * dt)
+    assert np.array_equal(whole['width'], [32, 256, 4])
+
+
+@pytest.mark.parametrize('size', [64, 256, 5000])
+def test_chunked_noise(size):
+    # Short chunks must not be normalized on their own
+    data, unix = _series(ndm=16, seed=1)
+    kwargs = dict(threshold=6.)
+    whole = SinglePulseSearch(**kwargs).run([(unix, data)])
+    chunked = SinglePulseSearch(**kwargs).run(_chunked(data, unix, size))
+    assert whole.size == 0
+    assert chunked.size == 0
+
+
+def test_duplicates_clustered():
+    # A single pulse seen at every DM and many widths / starts
+    data, unix = _series(ndm=4, pulses=[(5000, 16, 30., c) for c in range(4)])
+    cands = SinglePulseSearch(threshold=6., window=1000).run([(unix, data)])
+    assert cands.size == 1
+    assert cands['members'][0] > 4
+    # Two separate pulses stay separate
+    data, unix = _series(pulses=[(5000, 16, 30., 0), (5400, 16, 30., 0)])
+    cands = SinglePulseSearch(threshold=6., window=1000).run([(unix, data)])
+    assert cands.size == 2
+
+
+@pytest.mark.parametrize('size', [20000, 3000])
+def test_end_of_stream_searched(size):
+    n = 20000
+    data, unix = _series(n=n, pulses=[(n - 100, 4, 20., 0)])
+    cands = SinglePulseSearch(window=1000).run(_chunked(data, unix, size))
+    assert cands.size == 1
+    assert np.isclose(cands['time'][0], unix[n - 100], atol=2 * dt)
+    assert cands['width'][0] == 4
+    # Even within the last narrowest boxcar
+    data, unix = _series(n=n, pulses=[(n - 1, 1, 20., 0)])
+    cands = SinglePulseSearch(window=1000).run(_chunked(data, unix, size))
+    assert cands.size == 1
+    assert np.isclose(cands['time'][0], unix[n - 1])
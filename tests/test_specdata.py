@@ -0,0 +1,160 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the masks and weights of SpecData.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.stokes import SpecData
+
+
+t0 = 1570951255.
+
+
+def _spec(nt=40, nf=37, mask=True, weights=True, seed=0, tstart=t0, fstart=30.):
+    """ Random `SpecData` with (optionally) a random mask,
+        NaN under some flags, and random weights.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.random((nt, nf)).astype('float32')
+    m = None
+    if mask:
+        m = rng.random((nt, nf)) < 0.2
+        m[:, 3] = True
+        m[5] = True
+        data[m & (rng.random((nt, nf)) < 0.5)] = np.nan
+    return SpecData(
+        data=data,
+        time=tstart + np.arange(nt) * 0.1,
+        freq=fstart + np.arange(nf) * 0.2,
+        mask=m,
+        weights=rng.integers(1, 5, (nt, nf)).astype('float64') if weights else None,
+        stokes='I'
+        )
+
+
+def _masked(spec):
+    """ `numpy.ma` array and weights of a `SpecData`
+    """
+    mask = np.zeros(spec.data.shape, bool) if spec.mask is None else spec.mask
+    w = spec._weights_or_ones()
+    return np.ma.masked_array(spec.data.astype('float64'), mask=mask), w
+
+
+@pytest.mark.parametrize('mask, weights', [(True, True), (True, False), (False, True)])
+def test_tmean_fmean(mask, weights):
+    spec = _spec(mask=mask, weights=weights)
+    data, w = _masked(spec)
+    for method, axis in ((spec.tmean, 0), (spec.fmean, 1)):
+        avg = method()
+        expected, wsum = np.ma.average(data, axis=axis, weights=w, returned=True)
+        result = avg.data[0] if axis == 0 else avg.data[:, 0]
+        assert np.allclose(result, expected.filled(np.nan), equal_nan=True)
+        assert np.allclose(np.ravel(avg.weights), np.where(expected.mask, 0, wsum))
+        if mask:
+            assert np.array_equal(np.ravel(avg.mask), np.ma.getmaskarray(expected))
+
+
+def test_masked_column_flagged():
+    avg = _spec().tmean()
+    assert avg.mask[0, 3]
+    assert avg.weights[0, 3] == 0
+    assert avg.fmean().data.shape == (1, 1)
+
+
+@pytest.mark.parametrize('bins', [1, 5, 37])
+def test_frebin(bins):
+    spec = _spec()
+    data, w = _masked(spec)
+    reb = spec.frebin(bins)
+    slices = np.linspace(0, spec.freq.size, bins + 1).astype(int)
+    for b, (c0, c1) in enumerate(zip(slices[:-1], slices[1:])):
+        expected, wsum = np.ma.average(
+            data[:, c0:c1],
+            axis=1,
+            weights=w[:, c0:c1],
+            returned=True
+            )
+        assert np.allclose(reb.data[:, b], expected.filled(np.nan), equal_nan=True)
+        assert np.allclose(reb.weights[:, b], np.where(expected.mask, 0, wsum))
+        assert np.array_equal(reb.mask[:, b], np.ma.getmaskarray(expected))
+    assert np.allclose(reb.freq, np.add.reduceat(spec.freq, slices[:-1]) / np.diff(slices))
+
+
+@pytest.mark.parametrize('nf', [1, 7, 8, 9, 37])
+def test_mask_roundtrip(nf):
+    rng = np.random.default_rng(nf)
+    mask = rng.random((11, nf)) < 0.3
+    spec = SpecData(
+        data=np.zeros((11, nf)),
+        time=t0 + np.arange(11),
+        freq=np.arange(nf, dtype='float64'),
+        mask=mask,
+        stokes='I'
+        )
+    assert spec._mask_bits.shape == (11, (nf + 7) // 8)
+    assert spec.mask.dtype == bool
+    assert np.array_equal(spec.mask, mask)
+    assert spec.nflagged == mask.sum()
+    spec.mask = None
+    assert spec.mask is None and spec.nflagged == 0
+    # Broadcast masks, e.g. whole flagged channels
+    spec.mask = mask[0]
+    assert np.array_equal(spec.mask, np.broadcast_to(mask[0], (11, nf)))
+
+
+@pytest.mark.parametrize('shape', [(40, 37), (37,), (40, 1), ()])
+def test_weights_broadcast(shape):
+    spec = _spec(weights=False)
+    spec.weights = np.ones(shape)
+    assert spec.weights.shape == shape
+    for bad in [(40,), (2, 40, 37), (41, 37)]:
+        with pytest.raises(ValueError):
+            spec.weights = np.ones(bad)
+
+
+def test_concatenate_frequency():
+    low = _spec(nf=13, seed=1)
+    high = _spec(nf=6, mask=False, weights=False, seed=2, fstart=40.)
+    for spec in (low & high, high & low):
+        assert np.array_equal(spec.freq, np.concatenate((low.freq, high.freq)))
+        assert np.array_equal(
+            spec.mask,
+            np.hstack((low.mask, np.zeros(high.data.shape, bool)))
+            )
+        assert np.array_equal(
+            spec.weights,
+            np.hstack((low.weights, np.ones(high.data.shape)))
+            )
+        assert spec.nflagged == low.nflagged
+    plain = _spec(nf=13, mask=False, weights=False) & high
+    assert (plain.mask is None) and (plain.weights is None)
+
+
+def test_concatenate_time():
+    first = _spec(nt=10, nf=13, seed=1)
+    second = _spec(nt=7, nf=13, mask=False, seed=2, tstart=t0 + 1.)
+    for spec in (first | second, second | first):
+        assert np.allclose(spec.unix, np.concatenate((first.unix, second.unix)))
+        assert np.array_equal(
+            spec.mask,
+            np.vstack((first.mask, np.zeros(second.data.shape, bool)))
+            )
+        assert np.array_equal(spec.weights, np.vstack((first.weights, second.weights)))
+        assert spec.nflagged == first.nflagged
+        # Reductions of the concatenation use both parts
+        data, w = _masked(spec)
+        expected = np.ma.average(data, axis=0, weights=w)
+        assert np.allclose(spec.tmean().data[0], expected.filled(np.nan), equal_nan=True)
+
+
+def test_arithmetic_merges_masks():
+    a = _spec(seed=1, weights=False)
+    b = _spec(seed=2, weights=False)
+    assert np.array_equal((a - b).mask, a.mask | b.mask)
+    assert np.array_equal((a * 2.).mask, a.mask)
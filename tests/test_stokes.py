@@ -0,0 +1,107 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the Stokes conversion and bandpass corrections.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.other import allowed_stokes, compute_bandpass
+from nenupytf.stokes import NenuStokes, fft_filter, fft_notch
+
+
+def _rippled(nchans, fftlen=16, ntimes=200, ripple=True, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.random((ntimes, nchans)) + 1.
+    if ripple:
+        gain = np.tile(1. / compute_bandpass(fftlen), nchans // fftlen + 1)
+        data *= gain[:nchans]
+    return data
+
+
+def _raw(nblocks=5, nbeamlets=6, nffte=32, fftlen=16, seed=0):
+    """ Random raw `fft0` / `fft1` beamlets.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (nblocks, nbeamlets, nffte, fftlen, 2)
+    return {
+        'fft0': rng.random(shape, dtype='float32') + 1,
+        'fft1': rng.random(shape, dtype='float32') - 0.5
+        }
+
+
+@pytest.mark.parametrize('stokes', allowed_stokes)
+@pytest.mark.parametrize('bp_corr', [False, True])
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+@pytest.mark.parametrize('blocks, beamlets, samples, columns', [
+    # Whole blocks and beamlets
+    ((0, 5), (0, 6), (0, 160), (0, 96)),
+    # Partial blocks, partial beamlets and halves
+    ((1, 4), (1, 5), (3, 91), (5, 59)),
+    # Within a single block and half beamlet
+    ((2, 3), (3, 4), (10, 20), (9, 14))
+    ])
+def test_extract_equals_correct(stokes, bp_corr, dtype, blocks, beamlets,
+        samples, columns):
+    raw = _raw()
+    ns = NenuStokes(data=raw, stokes=stokes, nffte=32, fftlen=16, bp_corr=bp_corr)
+    (b0, b1), (c0, c1) = blocks, beamlets
+    (t0, t1), (v0, v1) = samples, columns
+    expected = ns[b0:b1, c0:c1][t0:t1, v0:v1]
+    data = ns.extract(
+        blocks=blocks,
+        beamlets=beamlets,
+        samples=samples,
+        columns=columns,
+        dtype=dtype
+        )
+    assert data.dtype == dtype
+    assert data.shape == expected.shape
+    assert np.allclose(data, expected, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('nchans', [16, 32, 48, 61, 64, 77, 200, 256])
+def test_fft_filter_keeps_variance(nchans):
+    data = _rippled(nchans, ripple=False)
+    filtered = fft_filter(data, 16)
+    ratio = filtered.std(axis=1).mean() / data.std(axis=1).mean()
+    assert ratio > 0.85
+
+
+@pytest.mark.parametrize('nchans', [16, 32, 48, 61])
+def test_fft_filter_narrow_not_flattened(nchans):
+    data = _rippled(nchans)
+    filtered = fft_filter(data, 16)
+    ratio = filtered.std(axis=1).mean() / data.std(axis=1).mean()
+    assert ratio > 0.9
+
+
+@pytest.mark.parametrize('nchans, residual', [
+    (64, 0.15),
+    (128, 0.15),
+    (256, 0.15),
+    (200, 0.4)
+    ])
+def test_fft_filter_removes_ripple(nchans, residual):
+    data = _rippled(nchans)
+    filtered = fft_filter(data, 16)
+    ripple = filtered.mean(axis=0).std()
+    assert ripple < residual * data.mean(axis=0).std()
+
+
+def test_fft_notch_harmonics():
+    keep = fft_notch(200, 16)
+    period = 200 / 16
+    harmonics = np.round(np.arange(1, 9) * period).astype(int)
+    assert not keep[harmonics].any()
+    assert keep[0]
+    # Neighbours are not notched below `min_neighbour_period`
+    keep = fft_notch(64, 16)
+    assert not keep[[4, 8, 12]].any()
+    assert keep[[1, 2, 3, 5, 6, 7]].all()
+    with pytest.raises(ValueError):
+        fft_notch(48, 16)
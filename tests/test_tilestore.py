@@ -0,0 +1,128 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the tiled time-frequency store.
+"""
+
+
+import os.path as path
+import numpy as np
+import pytest
+
+from conftest import write_spectra
+from nenupytf.read import Spectrum, TileStore, convert, build_pyramid
+from nenupytf.read.tilestore import store_name
+
+
+@pytest.fixture(scope='module')
+def store(observation, tmp_path_factory):
+    output = str(tmp_path_factory.mktemp('store'))
+    return convert(observation, output=output, stokes=['I', 'V'], tile=(256, 100))
+
+
+def test_store_matches_lanes(observation, store):
+    spec = Spectrum(observation)
+    tab = spec.desctab
+    for beam in (0, 1):
+        bmask = tab['beam'] == beam
+        expected = spec.select(
+            stokes=['I', 'V'],
+            beam=beam,
+            freq=[tab['fmin'][bmask].min(), tab['fmax'][bmask].max()]
+            )
+        time = [expected['I'].unix[0], expected['I'].unix[-1] + 1e-3]
+        freq = [expected['I'].freq[0], expected['I'].freq[-1] + 1e-6]
+        stored = store.select(stokes=['I', 'V'], time=time, freq=freq, beam=beam)
+        for st in ('I', 'V'):
+            assert np.array_equal(stored[st].data, expected[st].data)
+            assert np.allclose(stored[st].unix, expected[st].unix)
+            assert np.allclose(stored[st].freq, expected[st].freq)
+
+
+def test_store_stokes_case_insensitive(observation, store):
+    assert store.covers('i', 0)
+    assert store.covers(['v', 'I'], 1)
+    assert not store.covers('q', 0)
+    a = store.select(stokes='I', time=[0, 2e9], freq=[0, 100], beam=0)
+    b = store.select(stokes='i', time=[0, 2e9], freq=[0, 100], beam=0)
+    assert np.array_equal(a.data, b.data)
+
+
+def test_store_find_ignores_pyramid(observation, tmp_path):
+    output = str(tmp_path / 'pyramid')
+    build_pyramid(observation, output=output, levels=2)
+    assert TileStore.find(output) is None
+    with pytest.raises(ValueError):
+        TileStore(output)
+
+
+def test_store_default_ranges(observation, store):
+    whole = store.select(stokes='I', time=[0, 2e9], freq=[0, 100], beam=1)
+    spec = store.select(stokes='I', beam=1)
+    assert np.array_equal(spec.data, whole.data)
+    assert np.array_equal(spec.freq, whole.freq)
+    avg = store.average(stokes=['I', 'V'], beam=1, dt=0.1, df=0.2)
+    start, stop = store._time_range(1)
+    assert avg['I'].data.shape[0] == int(np.ceil((stop - start) / 0.1))
+    assert np.isclose(np.nanmean(avg['I'].data), whole.data.mean(), rtol=1e-3)
+
+
+def test_spectrum_served_from_zlib_store(tmp_path, monkeypatch):
+    beams = (
+        ((0, range(200, 208)), (1, range(300, 304))),
+        ((0, range(208, 216)), (1, range(304, 308)))
+        )
+    for lane, b in enumerate(beams):
+        write_spectra(
+            str(tmp_path / 'OBS_Z_{}.spectra'.format(lane)),
+            lane=lane,
+            beams=b,
+            gaps=(17, 31)
+            )
+    obs = str(tmp_path)
+    stokes = ['I', 'V']
+
+    def _results(s):
+        sel = s.select(stokes=stokes)
+        avg = s.average(stokes=stokes, dt=0.1, df=0.5)
+        # Chunk buffers are reused, keep copies
+        chunks = [
+            {st: (c[st].data.copy(), c[st].unix, c[st].freq.copy()) for st in stokes}
+            for c in s.iter_chunks(time_chunk=0.5, overlap=0.1, stokes=stokes)
+            ]
+        return sel, avg, chunks
+
+    s = Spectrum(obs)
+    assert s.store is None
+    expected = _results(s)
+
+    store = convert(obs, stokes=stokes, tile=(256, 100), compression='zlib')
+    assert store.manifest['compression'] == 'zlib'
+    assert path.isdir(path.join(obs, store_name))
+
+    reads = []
+    read_tile = TileStore._read_tile
+    def _read(self, fname, *args, **kwargs):
+        reads.append(fname)
+        return read_tile(self, fname, *args, **kwargs)
+    monkeypatch.setattr(TileStore, '_read_tile', _read)
+
+    s = Spectrum(obs)
+    assert s.store is not None
+    sel, avg, chunks = _results(s)
+    assert len(reads) > 0
+    for st in stokes:
+        assert np.array_equal(sel[st].data, expected[0][st].data)
+        assert np.allclose(sel[st].unix, expected[0][st].unix)
+        assert np.array_equal(sel[st].freq, expected[0][st].freq)
+        assert np.allclose(avg[st].data, expected[1][st].data, rtol=1e-6, equal_nan=True)
+        assert np.allclose(avg[st].unix, expected[1][st].unix)
+        assert np.allclose(avg[st].freq, expected[1][st].freq)
+    assert len(chunks) == len(expected[2])
+    for chunk, ref in zip(chunks, expected[2]):
+        for st in stokes:
+            assert np.array_equal(chunk[st][0], ref[st][0])
+            assert np.allclose(chunk[st][1], ref[st][1])
+            assert np.array_equal(chunk[st][2], ref[st][2])
@@ -0,0 +1,164 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the compact time axis.
+"""
+
+
+import numpy as np
+import pytest
+from astropy.time import Time
+
+from nenupytf.other import TimeAxis
+from nenupytf.other.timeaxis import regular_atol
+
+
+t0 = 1570951255.
+dt = 0.04194304
+
+
+def _irregular(n=100):
+    """ Unix times with a recording gap.
+    """
+    unix = t0 + np.arange(n) * dt
+    unix[n // 2:] += 3.
+    return unix
+
+
+def test_from_unix_regular():
+    unix = t0 + np.arange(1000) * dt
+    # Rounding noise below the tolerance
+    noisy = unix + np.random.default_rng(0).uniform(-0.1, 0.1, unix.size) * regular_atol
+    for u in (unix, noisy):
+        axis = TimeAxis.from_unix(u)
+        assert axis.regular
+        assert axis._unix is None
+        assert len(axis) == u.size
+        assert np.isclose(axis.step, dt, rtol=1e-9)
+        assert np.allclose(axis.unix, u, rtol=0, atol=regular_atol)
+    single = TimeAxis.from_unix(t0)
+    assert single.regular and (single.size == 1) and (single[0] == t0)
+    assert TimeAxis.from_unix([]).size == 0
+
+
+def test_from_unix_irregular():
+    unix = _irregular()
+    axis = TimeAxis.from_unix(unix)
+    assert not axis.regular
+    assert np.array_equal(axis.unix, unix)
+    # Not increasing
+    assert not TimeAxis.from_unix(unix[::-1]).regular
+    # Deviation above the tolerance
+    jitter = t0 + np.arange(10) * dt
+    jitter[4] += 10 * regular_atol
+    assert not TimeAxis.from_unix(jitter).regular
+
+
+@pytest.mark.parametrize('regular', [True, False])
+@pytest.mark.parametrize('key', [
+    slice(None),
+    slice(3, 40),
+    slice(5, 90, 7),
+    slice(None, None, -1),
+    slice(80, 10, -3),
+    slice(-20, None),
+    slice(60, 20),
+    ])
+def test_slice(regular, key):
+    unix = t0 + np.arange(100) * dt if regular else _irregular()
+    axis = TimeAxis.from_unix(unix)
+    sub = axis[key]
+    assert isinstance(sub, TimeAxis)
+    assert len(sub) == unix[key].size
+    assert np.allclose(sub.unix, unix[key], rtol=0, atol=regular_atol)
+    if regular:
+        assert sub.regular
+        assert sub._unix is None
+
+
+@pytest.mark.parametrize('regular', [True, False])
+def test_getitem(regular):
+    unix = t0 + np.arange(100) * dt if regular else _irregular()
+    axis = TimeAxis.from_unix(unix)
+    for k in (0, 17, 99, -1, -100):
+        assert np.isclose(axis[k], unix[k], rtol=0, atol=regular_atol)
+    for k in (100, -101):
+        with pytest.raises(IndexError):
+            axis[k]
+    # Fancy indexing
+    idx = np.array([3, 1, 50, 51])
+    assert np.allclose(axis[idx].unix, unix[idx], rtol=0, atol=regular_atol)
+    assert np.allclose(axis[unix > unix[80]].unix, unix[81:], rtol=0, atol=regular_atol)
+    assert axis.min() == axis[0]
+    assert axis.max() == axis[-1]
+    assert axis[::-1].min() == axis.min()
+    assert axis[::-1].max() == axis.max()
+
+
+def test_equality():
+    axis = TimeAxis(start=t0, step=dt, size=1000)
+    assert axis == TimeAxis(start=t0 + 0.5 * regular_atol, step=dt, size=1000)
+    assert axis != TimeAxis(start=t0 + 2 * regular_atol, step=dt, size=1000)
+    # Step differences accumulate over the axis
+    assert axis == TimeAxis(start=t0, step=dt + 0.5 * regular_atol / 1000, size=1000)
+    assert axis != TimeAxis(start=t0, step=dt + 2 * regular_atol / 1000, size=1000)
+    assert axis != TimeAxis(start=t0, step=dt, size=999)
+    # Regular against irregular representations
+    explicit = TimeAxis(unix=axis.unix + 0.5 * regular_atol)
+    assert not explicit.regular
+    assert axis == explicit
+    assert explicit == axis
+    explicit._unix[10] += 2 * regular_atol
+    assert axis != explicit
+    assert axis.__eq__(axis.unix) is NotImplemented
+    assert axis != 'axis'
+
+
+def test_concatenate():
+    first = TimeAxis(start=t0, step=dt, size=50)
+    second = TimeAxis(start=t0 + 50 * dt, step=dt, size=30)
+    gapped = TimeAxis(start=t0 + 100 * dt, step=dt, size=20)
+    irregular = TimeAxis(unix=_irregular(40) + 200 * dt)
+
+    axis = TimeAxis.concatenate([first, second])
+    assert axis.regular
+    assert axis == TimeAxis(start=t0, step=dt, size=80)
+
+    parts = [first, second, gapped, irregular]
+    axis = TimeAxis.concatenate(parts)
+    assert not axis.regular
+    assert np.array_equal(axis.unix, np.concatenate([p.unix for p in parts]))
+
+    # Irregular parts making a regular axis
+    unix = t0 + np.arange(60) * dt
+    axis = TimeAxis.concatenate([TimeAxis(unix=unix[:25]), TimeAxis(unix=unix[25:])])
+    assert axis.regular
+    assert axis == TimeAxis(start=t0, step=dt, size=60)
+
+
+def test_lazy_time():
+    axis = TimeAxis(start=t0, step=dt, size=10**7)
+    assert axis._unix is None
+    assert axis._time is None
+    # No Time object for the MJD / JD
+    assert np.isclose(axis.mjd[0], Time(t0, format='unix').mjd, rtol=0, atol=1e-9)
+    assert np.isclose(axis.jd[-1], Time(axis[-1], format='unix').jd, rtol=0, atol=1e-9)
+    assert axis._time is None
+
+    sub = axis[:1000]
+    assert sub._time is None
+    time = sub.time
+    assert isinstance(time, Time)
+    assert sub.time is time
+    assert np.allclose(time.unix, sub.unix, rtol=0, atol=1e-6)
+    assert sub.isot[0] == Time(t0, format='unix', precision=7).isot
+
+    # Time objects are kept by from_any
+    time = Time(t0 + np.arange(10) * dt, format='unix')
+    axis = TimeAxis.from_any(time)
+    assert axis.regular and (axis.time is time)
+    assert TimeAxis.from_any(axis) is axis
+    with pytest.raises(TypeError):
+        TimeAxis.from_any('2019-10-13T07:20:55')
@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+
+"""
+    Tests of the axis index resolver against :func:`idx_of`.
+"""
+
+
+import numpy as np
+import pytest
+
+from nenupytf.other import AxisIndex, idx_of
+
+
+def _axes():
+    """ `(array, regular)` test axes.
+    """
+    rng = np.random.default_rng(0)
+    # Block time stamps, with rounding noise
+    times = 1570951255. + np.arange(500) * 0.04194304
+    times += rng.uniform(-1e-7, 1e-7, times.size)
+    # Same with two recording gaps
+    gapped = np.concatenate((times[:100], times[120:300] + 5., times[300:] + 9.))
+    return [
+        (np.arange(64) * 0.1953125 + 30., True),
+        (times, True),
+        (gapped, False),
+        (np.sort(rng.uniform(10., 80., 300)), False),
+        (np.array([42.]), False)
+        ]
+
+
+def _queries(array):
+    """ Exact values, values in between, outside of the axis
+        and random values.
+    """
+    rng = np.random.default_rng(1)
+    span = max(array[-1] - array[0], 1.)
+    mid = (array[1:] + array[:-1]) / 2
+    return np.concatenate((
+        array,
+        mid,
+        [array[0] - span, array[0] - 1e-9, array[-1] + 1e-9, array[-1] + span],
+        rng.uniform(array[0] - 0.1 * span, array[-1] + 0.1 * span, 200)
+        ))
+
+
+@pytest.mark.parametrize('array, regular', _axes())
+@pytest.mark.parametrize('order', ['low', 'high'])
+def test_axis_index(array, regular, order):
+    index = AxisIndex(array)
+    assert index.regular == regular
+    values = _queries(array)
+    expected = np.array([idx_of(array, v, order=order) for v in values])
+    # Array query
+    idx = index(values, order=order)
+    assert isinstance(idx, np.ndarray)
+    assert np.array_equal(idx, expected)
+    # Scalar queries
+    for v, e in zip(values[::7], expected[::7]):
+        i = index(v, order=order)
+        assert isinstance(i, int)
+        assert i == e
+
+
+def test_axis_index_errors():
+    with pytest.raises(ValueError):
+        AxisIndex([])
+    with pytest.raises(ValueError):
+        AxisIndex([1., 3., 2.])
+    with pytest.raises(ValueError):
+        AxisIndex([1., 2.])(1.5, order='middle')